@@ -0,0 +1,231 @@
+# authVectors.py
+import argparse
+import os
+import pickle
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+import crypto
+
+# Every protocol field mixed by XOR (RAND, K, SQN and AK) is this many bytes
+FIELD_SIZE = 256
+# Size of MAC, HXRES*, K_SEAF and XRES*
+DIGEST_SIZE = 32
+
+
+class AuthVectorBatch:
+    def __init__(self, supis, sqns, rand, conc, mac, hxres_star, k_seaf, xres_star):
+        """
+        Initialize the AuthVectorBatch class.
+
+        Vectors are stored column by column: one list per integer field and
+        one bytes object per binary field, holding every vector's value back
+        to back.
+
+        Parameters:
+            supis (list): SUPI of every vector
+            sqns (list): Sequence number of every vector
+            rand (bytes): RAND values, FIELD_SIZE bytes each
+            conc (bytes): SQN xor AK values, FIELD_SIZE bytes each
+            mac (bytes): MAC values, DIGEST_SIZE bytes each
+            hxres_star (bytes): HXRES* values, DIGEST_SIZE bytes each
+            k_seaf (bytes): K_SEAF values, DIGEST_SIZE bytes each
+            xres_star (bytes): XRES* values, DIGEST_SIZE bytes each
+        """
+        self.supis = supis
+        self.sqns = sqns
+        self.rand = rand
+        self.conc = conc
+        self.mac = mac
+        self.hxres_star = hxres_star
+        self.k_seaf = k_seaf
+        self.xres_star = xres_star
+
+    def __len__(self):
+        return len(self.sqns)
+
+    def __getitem__(self, i):
+        """
+        Get one vector in the format of HomeNetwork.challengeSubscriber.
+
+        Parameters:
+            i (int): Index of the vector
+
+        Returns:
+            tuple: Random value (r), Authentication token (autn), Hashed response (hxres_star), Session key (k_seaf), Expected response (xres_star)
+        """
+        field = slice(i * FIELD_SIZE, (i + 1) * FIELD_SIZE)
+        digest = slice(i * DIGEST_SIZE, (i + 1) * DIGEST_SIZE)
+        return (self.rand[field], (self.conc[field], self.mac[digest]), self.hxres_star[digest], self.k_seaf[digest], self.xres_star[digest])
+
+    def nbytes(self):
+        """
+        Memory held by the binary columns.
+
+        Returns:
+            int: Number of bytes
+        """
+        return sum(len(column) for column in (self.rand, self.conc, self.mac, self.hxres_star, self.k_seaf, self.xres_star))
+
+
+def xorBytes(a, b):
+    """
+    XOR two equally long byte strings as big integers, in one C-level operation.
+
+    Parameters:
+        a (bytes): First operand
+        b (bytes): Second operand
+
+    Returns:
+        bytes: a xor b
+    """
+    return (int.from_bytes(a, 'little') ^ int.from_bytes(b, 'little')).to_bytes(len(a), 'little')
+
+
+def _digests(keys, sqns, rand, salt, sqnSalt, sname, start, stop):
+    # Hashes and KDFs of the vectors [start, stop), run on a pool thread
+    mac, ak, xres_star, hxres_star, k_seaf = [], [], [], [], []
+    for i in range(start, stop):
+        k, r = keys[i], rand[i * FIELD_SIZE:(i + 1) * FIELD_SIZE]
+        mac.append(crypto.fun1(k, sqns[i], r))
+        ak.append(crypto.fun5(k, r))
+        xres = crypto.deriveKey(salt[i * FIELD_SIZE:(i + 1) * FIELD_SIZE], sname)
+        xres_star.append(xres)
+        hxres_star.append(crypto.getsha256(r, xres))
+        k_seaf.append(crypto.deriveKey(sqnSalt[i * FIELD_SIZE:(i + 1) * FIELD_SIZE], sname))
+    return mac, ak, xres_star, hxres_star, k_seaf
+
+
+def generateAVs(records, sname="sname_100", threads=4, executor=None):
+    """
+    Generate authentication vectors in bulk.
+
+    RAND for the whole batch comes from one os.urandom call, the XOR
+    salts of every vector are computed with a single big-integer XOR over
+    the concatenated fields, and the hashes and KDFs run on a thread pool
+    in contiguous chunks.
+
+    Parameters:
+        records (list): (supi, k, sqn) of every vector to generate, k being FIELD_SIZE bytes
+        sname (str): Serving network name
+        threads (int): Pool threads, 1 to compute inline
+        executor (ThreadPoolExecutor): Pool to use instead of a new one
+
+    Returns:
+        AuthVectorBatch: The vectors, in the order of records
+    """
+    n = len(records)
+    supis = [supi for (supi, k, sqn) in records]
+    keys = [k for (supi, k, sqn) in records]
+    sqns = [sqn for (supi, k, sqn) in records]
+    if any(len(k) != FIELD_SIZE for k in keys):
+        raise ValueError("subscriber keys must be %d bytes" % FIELD_SIZE)
+
+    rand = os.urandom(n * FIELD_SIZE)
+    bsqns = b"".join(sqn.to_bytes(FIELD_SIZE, byteorder='little') for sqn in sqns)
+    salt = xorBytes(b"".join(keys), rand)
+    sqnSalt = xorBytes(bsqns, salt)
+
+    chunk = max(1, -(-n // (threads * 4)))
+    bounds = [(start, min(n, start + chunk)) for start in range(0, n, chunk)]
+    if threads <= 1 and executor is None:
+        parts = [_digests(keys, sqns, rand, salt, sqnSalt, sname, start, stop) for (start, stop) in bounds]
+    else:
+        pool = executor or ThreadPoolExecutor(threads)
+        try:
+            parts = list(pool.map(lambda bound: _digests(keys, sqns, rand, salt, sqnSalt, sname, *bound), bounds))
+        finally:
+            if executor is None:
+                pool.shutdown()
+
+    columns = [b"".join(value for part in parts for value in part[field]) for field in range(5)]
+    (mac, ak, xres_star, hxres_star, k_seaf) = columns
+    conc = xorBytes(bsqns, ak)
+    return AuthVectorBatch(supis, sqns, rand, conc, mac, hxres_star, k_seaf, xres_star)
+
+
+def sendVectors(conn, vectors):
+    """
+    Send a list of vectors as one length-prefixed message.
+
+    Parameters:
+        conn (socket): Connection
+        vectors (list): Vectors (r, autn, hxres_star, k_seaf)
+    """
+    data = pickle.dumps(vectors)
+    conn.sendall(struct.pack(">I", len(data)) + data)
+
+
+def recvVectors(conn):
+    """
+    Receive a list of vectors sent by sendVectors.
+
+    Parameters:
+        conn (socket): Connection
+
+    Returns:
+        list: Vectors (r, autn, hxres_star, k_seaf)
+    """
+    (length,) = struct.unpack(">I", _recvExactly(conn, 4))
+    return pickle.loads(_recvExactly(conn, length))
+
+
+def _recvExactly(conn, n):
+    data = bytearray()
+    while len(data) < n:
+        chunk = conn.recv(n - len(data))
+        if not chunk:
+            raise EOFError("connection closed in the middle of a message")
+        data += chunk
+    return bytes(data)
+
+
+def measure(subscribers, perSub, threadCounts, repeat=3):
+    """
+    Measure vector generation throughput against the number of threads.
+
+    Parameters:
+        subscribers (int): Number of subscribers
+        perSub (int): Vectors per subscriber
+        threadCounts (list): Thread counts to try
+        repeat (int): Runs per thread count, the best one is kept
+
+    Returns:
+        list: (label, AVs/s) rows, starting with one-at-a-time HomeNetwork.challengeSubscriber
+    """
+    from homeNetwork import HomeNetwork
+    k = crypto.getKey()
+    hn = HomeNetwork(k, "supi-0", 100, None, b"", b"")
+    for i in range(1, subscribers):
+        hn.addSubscriber("supi-%d" % i, k, 100)
+    supis = list(hn.subscribers)
+
+    rows = []
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for supi in supis:
+            for _ in range(perSub):
+                hn.challengeSubscriber(supi)
+        best = min(best, time.perf_counter() - start)
+    rows.append(("challengeSubscriber", subscribers * perSub / best))
+    for threads in threadCounts:
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            hn.generate_avs(supis, perSub, threads=threads)
+            best = min(best, time.perf_counter() - start)
+        rows.append(("generate_avs, %d thread(s)" % threads, subscribers * perSub / best))
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure bulk authentication vector generation")
+    parser.add_argument("--subscribers", type=int, default=200)
+    parser.add_argument("--per-sub", type=int, default=5, help="vectors per subscriber")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--repeat", type=int, default=3, help="runs per configuration, the best one is reported")
+    args = parser.parse_args()
+    print("%d CPU(s), %d vectors per run" % (os.cpu_count(), args.subscribers * args.per_sub))
+    for (label, rate) in measure(args.subscribers, args.per_sub, args.threads, args.repeat):
+        print("%-28s %10.0f AVs/s" % (label, rate))
@@ -0,0 +1,118 @@
+# avCache.py
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+class AVCache:
+    def __init__(self, capacity=10000, lifetime=300.0, clock=time.monotonic):
+        """
+        Initialize the AVCache class.
+
+        Unused authentication vectors are kept per SUPI, oldest first, and
+        handed out in the order the Home Network generated them. Vectors
+        expire lifetime seconds after they were stored. When more than
+        capacity vectors are held, the oldest vectors of the least recently
+        used subscribers are evicted.
+
+        Parameters:
+            capacity (int): Largest number of vectors held
+            lifetime (float): Time in seconds after which a vector is discarded
+            clock (function): Time source in seconds
+        """
+        self.capacity = capacity
+        self.lifetime = lifetime
+        self.clock = clock
+        self.vectors = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "stored": 0, "expired": 0, "evicted": 0, "invalidated": 0}
+
+    def put(self, supi, vectors):
+        """
+        Store unused vectors of a subscriber behind the ones already held.
+
+        Parameters:
+            supi (str): Subscriber Permanent Identifier
+            vectors (list): Vectors (r, autn, hxres_star, k_seaf)
+        """
+        if not vectors:
+            return
+        expiry = self.clock() + self.lifetime
+        with self.lock:
+            queue = self.vectors.setdefault(supi, deque())
+            self.vectors.move_to_end(supi)
+            queue.extend((expiry, vector) for vector in vectors)
+            self.size += len(vectors)
+            self.counters["stored"] += len(vectors)
+            while self.size > self.capacity:
+                oldest = next(iter(self.vectors))
+                self.drop(oldest, 1)
+                self.counters["evicted"] += 1
+
+    def pop(self, supi):
+        """
+        Take the oldest fresh vector of a subscriber.
+
+        Parameters:
+            supi (str): Subscriber Permanent Identifier
+
+        Returns:
+            tuple: Vector (r, autn, hxres_star, k_seaf), None if no fresh vector is held
+        """
+        now = self.clock()
+        with self.lock:
+            queue = self.vectors.get(supi)
+            while queue and queue[0][0] <= now:
+                self.drop(supi, 1)
+                self.counters["expired"] += 1
+            if not queue:
+                self.counters["misses"] += 1
+                return None
+            self.counters["hits"] += 1
+            self.vectors.move_to_end(supi)
+            (expiry, vector) = queue[0]
+            self.drop(supi, 1)
+            return vector
+
+    def invalidate(self, supi):
+        """
+        Discard every vector of a subscriber, after a resynchronization made them stale.
+
+        Parameters:
+            supi (str): Subscriber Permanent Identifier
+
+        Returns:
+            int: Number of vectors discarded
+        """
+        with self.lock:
+            n = len(self.vectors.get(supi, ()))
+            self.drop(supi, n)
+            self.counters["invalidated"] += n
+            return n
+
+    def drop(self, supi, n):
+        # Remove the n oldest vectors of a subscriber, the lock must be held
+        queue = self.vectors.get(supi)
+        if queue is None:
+            return
+        for _ in range(min(n, len(queue))):
+            queue.popleft()
+            self.size -= 1
+        if not queue:
+            del self.vectors[supi]
+
+    def stats(self):
+        """
+        Report the cache counters.
+
+        Returns:
+            dict: Hits, misses, hit rate, vectors stored, expired, evicted and invalidated, and the current size
+        """
+        with self.lock:
+            stats = dict(self.counters)
+            stats["vectors"] = self.size
+            stats["subscribers"] = len(self.vectors)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
@@ -5,6 +5,7 @@ from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives.kdf.x963kdf import X963KDF
 import datetime
 import time
+import instrumentation
 
 
 def getKey(macFailure=False):
@@ -17,6 +18,7 @@ def getRandom(n):
     return os.urandom(n)
 
 
+@instrumentation.counted("sha3_256")
 def fun1(k, sqn_hn, r):
     digest = hashes.Hash(hashes.SHA3_256(),  backend=default_backend())
     digest.update(k)
@@ -26,6 +28,7 @@ def fun1(k, sqn_hn, r):
     return digest.finalize()
 
 
+@instrumentation.counted("shake256")
 def fun5(k, r):
     digest = hashes.Hash(hashes.SHAKE256(256),  backend=default_backend())
     digest.update(k)
@@ -37,9 +40,8 @@ def getXOR(a, b):
     return bytes([x ^ y for x, y in zip(a, b)])
 
 
-def challenge(k, r, sname):
-    salt = getXOR(k, r)
-    # derive
+@instrumentation.counted("kdf")
+def deriveKey(salt, sname):
     kdf = X963KDF(
         algorithm=hashes.SHA256(),
         length=32,
@@ -50,6 +52,12 @@ def challenge(k, r, sname):
     return kdf.derive(bsname)
 
 
+def challenge(k, r, sname):
+    salt = getXOR(k, r)
+    return deriveKey(salt, sname)
+
+
+@instrumentation.counted("sha256")
 def getsha256(r, res):
     digest = hashes.Hash(hashes.SHA256(), backend=default_backend())
     digest.update(r)
@@ -60,17 +68,10 @@ def getsha256(r, res):
 def keySeed(k, r, sqn_hn, sname):
     bsqn_hn = sqn_hn.to_bytes(256, byteorder='little')
     salt = getXOR(bsqn_hn, getXOR(k, r))
-    # derive
-    kdf = X963KDF(
-        algorithm=hashes.SHA256(),
-        length=32,
-        sharedinfo=salt,
-        backend=default_backend()
-    )
-    bsname = sname.encode()
-    return kdf.derive(bsname)
+    return deriveKey(salt, sname)
 
 
+@instrumentation.counted("sha3_256")
 def fun1_star(k, sqn_hn, r):
     digest = hashes.Hash(hashes.SHA3_256(), backend=default_backend())
     digest.update(k)
@@ -80,6 +81,7 @@ def fun1_star(k, sqn_hn, r):
     return digest.finalize()
 
 
+@instrumentation.counted("shake256")
 def fun5_star(k, r):
     digest = hashes.Hash(hashes.SHAKE256(256),  backend=default_backend())
     digest.update(k)
@@ -0,0 +1,212 @@
+# deconcealment.py
+import asyncio
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from ecies import decrypt
+
+# Secret key of the Home Network, installed once per worker process
+_worker_sk_hn = None
+
+
+def _init_worker(sk_hn):
+    global _worker_sk_hn
+    _worker_sk_hn = sk_hn
+
+
+def _decrypt_batch(sucis):
+    """
+    Decrypt a batch of SUCIs inside a worker process.
+
+    Parameters:
+        sucis (list): Subscriber Concealed Identifiers
+
+    Returns:
+        list: (ok, value) pairs, value is the SUPI or the error message
+    """
+    results = []
+    for suci in sucis:
+        try:
+            results.append((True, decrypt(_worker_sk_hn, suci).decode('utf-8')))
+        except Exception as exc:
+            results.append((False, repr(exc)))
+    return results
+
+
+class DeconcealmentError(Exception):
+    pass
+
+
+class DeconcealmentEngine:
+    def __init__(self, sk_hn, workers=None, batch_size=32, max_delay=0.002, window=10000):
+        """
+        Initialize the DeconcealmentEngine class.
+
+        SUCIs submitted from any number of sessions are collected into batches
+        of at most batch_size (or whatever arrived within max_delay seconds)
+        and decrypted on a process pool.
+
+        Parameters:
+            sk_hn (bytes): Secret key for Home Network
+            workers (int): Number of worker processes (default: CPU count)
+            batch_size (int): Maximum number of SUCIs per batch
+            max_delay (float): Maximum time in seconds to wait for a batch to fill
+            window (int): Number of latency samples kept for the percentiles
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+
+        self._queue = queue.Queue()
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(sk_hn,))
+        # Keep at most two batches per worker outstanding so that backlog shows up as queue depth
+        self._slots = threading.Semaphore(2 * self.workers)
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self._completed = 0
+        self._failed = 0
+        self._batches = 0
+        self._in_flight = 0
+        self._closed = False
+
+        self._collector = threading.Thread(target=self._collect, name="suci-collector", daemon=True)
+        self._collector.start()
+
+    def submit(self, suci):
+        """
+        Queue a SUCI for deconcealment.
+
+        Parameters:
+            suci (bytes): Subscriber Concealed Identifier
+
+        Returns:
+            Future: Resolves to the decrypted SUPI (str)
+        """
+        future = Future()
+        # Checked and queued under the lock, so nothing can be queued after the sentinel of close()
+        with self._lock:
+            if self._closed:
+                raise DeconcealmentError("engine is closed")
+            self._queue.put((suci, future, time.perf_counter()))
+        return future
+
+    def submit_async(self, suci):
+        """
+        Queue a SUCI for deconcealment from an asyncio server.
+
+        Parameters:
+            suci (bytes): Subscriber Concealed Identifier
+
+        Returns:
+            asyncio.Future: Resolves to the decrypted SUPI (str)
+        """
+        return asyncio.wrap_future(self.submit(suci))
+
+    def stats(self):
+        """
+        Report the engine metrics.
+
+        Returns:
+            dict: Queue depth, in-flight batches, counters and p50/p99 latency in milliseconds
+        """
+        with self._lock:
+            samples = sorted(self._latencies)
+            stats = {
+                "queue_depth": self._queue.qsize(),
+                "in_flight_batches": self._in_flight,
+                "completed": self._completed,
+                "failed": self._failed,
+                "batches": self._batches,
+                "mean_batch_size": (self._completed + self._failed) / self._batches if self._batches else 0.0,
+            }
+        stats["p50_ms"] = _percentile(samples, 50) * 1000
+        stats["p99_ms"] = _percentile(samples, 99) * 1000
+        return stats
+
+    def close(self):
+        """
+        Stop accepting SUCIs, finish the queued ones and shut the pool down.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._collector.join()
+        self._pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _collect(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.perf_counter() + self.max_delay
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.perf_counter()
+                try:
+                    item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        self._slots.acquire()
+        with self._lock:
+            self._in_flight += 1
+            self._batches += 1
+        try:
+            job = self._pool.submit(_decrypt_batch, [suci for suci, _, _ in batch])
+        except Exception as exc:
+            self._complete(batch, None, exc)
+            return
+        job.add_done_callback(lambda done: self._complete(batch, done))
+
+    def _complete(self, batch, job, error=None):
+        if error is None:
+            try:
+                results = job.result()
+            except Exception as exc:
+                error = exc
+        if error is not None:
+            results = [(False, repr(error))] * len(batch)
+        now = time.perf_counter()
+        with self._lock:
+            self._in_flight -= 1
+            for _, _, submitted in batch:
+                self._latencies.append(now - submitted)
+            ok = sum(1 for result in results if result[0])
+            self._completed += ok
+            self._failed += len(batch) - ok
+        self._slots.release()
+
+        # Resolve outside the lock, done-callbacks may submit new SUCIs. A future
+        # cancelled by its caller is skipped, the others in the batch still resolve
+        for (_, future, _), (success, value) in zip(batch, results):
+            if not future.set_running_or_notify_cancel():
+                continue
+            if success:
+                future.set_result(value)
+            else:
+                future.set_exception(DeconcealmentError(value))
+
+
+def _percentile(samples, q):
+    if not samples:
+        return 0.0
+    index = min(len(samples) - 1, int(round(q / 100 * (len(samples) - 1))))
+    return samples[index]
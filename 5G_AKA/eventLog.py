@@ -0,0 +1,276 @@
+# eventLog.py
+import atexit
+import datetime
+import hashlib
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+DEBUG, INFO, WARNING, ERROR, OFF = 10, 20, 30, 40, 100
+LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR, "off": OFF}
+
+# Byte values longer than this are shown as a prefix plus their length and digest
+MAX_BYTES = 16
+
+_level = INFO
+_sinks = []
+_writer = None
+_lock = threading.Lock()
+
+
+class Event:
+    __slots__ = ("time", "level", "source", "message", "fields")
+
+    def __init__(self, level, source, message, fields):
+        """
+        Initialize the Event class. Nothing is formatted until a sink consumes the event.
+
+        Parameters:
+            level (int): Severity of the event
+            source (str): Component emitting the event
+            message (str): Short description of the protocol step
+            fields (dict): Values attached to the step
+        """
+        self.time = time.time()
+        self.level = level
+        self.source = source
+        self.message = message
+        self.fields = fields
+
+
+def formatValue(value):
+    """
+    Render a field value, shortening large byte strings.
+
+    Parameters:
+        value: Field value
+
+    Returns:
+        str: Printable value
+    """
+    if isinstance(value, (bytes, bytearray)):
+        if len(value) <= MAX_BYTES:
+            return value.hex()
+        return f"{value[:8].hex()}..(len={len(value)}, sha256={hashlib.sha256(value).hexdigest()[:16]})"
+    if isinstance(value, tuple):
+        return "(" + ", ".join(formatValue(item) for item in value) + ")"
+    return str(value)
+
+
+class ConsoleSink:
+    def __init__(self, stream=None, color=True):
+        """
+        Initialize the ConsoleSink class.
+
+        Parameters:
+            stream (file): Output stream (default: sys.stdout at write time)
+            color (bool): Colour the timestamp green, or red for warnings and errors
+        """
+        self.stream = stream
+        self.color = color
+
+    def format(self, event):
+        stamp = datetime.datetime.fromtimestamp(event.time).strftime("%F %T")
+        fields = ", ".join(f"{name}: {formatValue(value)}" for name, value in event.fields.items())
+        line = f" [{event.message}] {fields}" if fields else f" [{event.message}]"
+        if self.color:
+            code = "1;31" if event.level >= WARNING else "1;32"
+            return f"\033[{code}m {stamp} \033[0m {line}\n"
+        return f"{stamp} {event.source} {line}\n"
+
+    def write(self, events):
+        stream = self.stream or sys.stdout
+        stream.write("".join(self.format(event) for event in events))
+        stream.flush()
+
+
+class JsonSink:
+    def __init__(self, path):
+        """
+        Initialize the JsonSink class, appending one JSON object per event.
+
+        Parameters:
+            path (str): Output file
+        """
+        self.file = open(path, 'a')
+
+    def format(self, event):
+        return json.dumps({
+            "time": event.time,
+            "level": event.level,
+            "source": event.source,
+            "message": event.message,
+            "fields": {name: formatValue(value) for name, value in event.fields.items()},
+        })
+
+    def write(self, events):
+        self.file.write("".join(self.format(event) + "\n" for event in events))
+        self.file.flush()
+
+
+class EventWriter:
+    def __init__(self, capacity=65536, batch_size=256):
+        """
+        Initialize the EventWriter class.
+
+        Events are queued without blocking and written by a background thread
+        in batches of at most batch_size. When the queue is full new events
+        are dropped and counted instead of stalling the caller.
+
+        Parameters:
+            capacity (int): Maximum number of queued events
+            batch_size (int): Maximum number of events written at once
+        """
+        self.pid = os.getpid()
+        self.batch_size = batch_size
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=capacity)
+        self._thread = threading.Thread(target=self._run, name="event-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout=5.0):
+        """
+        Wait until every event queued so far has been written.
+
+        Parameters:
+            timeout (float): Maximum time to wait in seconds
+        """
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            events = [item for item in batch if isinstance(item, Event)]
+            if events:
+                for sink in list(_sinks):
+                    try:
+                        sink.write(events)
+                    except Exception:
+                        pass
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.set()
+
+
+def _getWriter():
+    global _writer
+    writer = _writer
+    # A forked process does not inherit the writer thread
+    if writer is None or writer.pid != os.getpid():
+        with _lock:
+            if _writer is None or _writer.pid != os.getpid():
+                _writer = EventWriter()
+            writer = _writer
+    return writer
+
+
+class Logger:
+    __slots__ = ("source",)
+
+    def __init__(self, source):
+        """
+        Initialize the Logger class.
+
+        Parameters:
+            source (str): Component emitting the events
+        """
+        self.source = source
+
+    def log(self, level, message, /, **fields):
+        if level < _level:
+            return
+        _getWriter().put(Event(level, self.source, message, fields))
+
+    def debug(self, message, /, **fields):
+        if DEBUG >= _level:
+            _getWriter().put(Event(DEBUG, self.source, message, fields))
+
+    def info(self, message, /, **fields):
+        if INFO >= _level:
+            _getWriter().put(Event(INFO, self.source, message, fields))
+
+    def warning(self, message, /, **fields):
+        if WARNING >= _level:
+            _getWriter().put(Event(WARNING, self.source, message, fields))
+
+    def error(self, message, /, **fields):
+        if ERROR >= _level:
+            _getWriter().put(Event(ERROR, self.source, message, fields))
+
+
+def getLogger(source):
+    return Logger(source)
+
+
+def setLevel(level):
+    """
+    Set the minimum level of the events that are kept.
+
+    Parameters:
+        level (int or str): Level value or name ("debug", "info", "warning", "error", "off")
+    """
+    global _level
+    _level = LEVELS[level] if isinstance(level, str) else level
+
+
+def getLevel():
+    return _level
+
+
+def isEnabledFor(level):
+    return level >= _level
+
+
+def addSink(sink):
+    _sinks.append(sink)
+
+
+def setSinks(sinks):
+    _sinks[:] = sinks
+
+
+def configure(level="info", json_path=None):
+    """
+    Configure the level and the sinks: the console, plus a JSON lines file if requested.
+
+    Parameters:
+        level (int or str): Minimum level of the events that are kept
+        json_path (str): Optional file receiving every event as JSON
+    """
+    setLevel(level)
+    sinks = [ConsoleSink()]
+    if json_path:
+        sinks.append(JsonSink(json_path))
+    setSinks(sinks)
+
+
+def flush(timeout=5.0):
+    """
+    Write every queued event.
+
+    Parameters:
+        timeout (float): Maximum time to wait in seconds
+    """
+    writer = _writer
+    if writer is not None and writer.pid == os.getpid():
+        writer.flush(timeout)
+
+
+_sinks.append(ConsoleSink())
+atexit.register(flush)
@@ -0,0 +1,519 @@
+# hnCluster.py
+import argparse
+import hashlib
+import multiprocessing
+import os
+import pickle
+import select
+import shutil
+import signal
+import socket
+import struct
+import sys
+import tempfile
+import threading
+import time
+import eventLog
+import sqnArray
+from homeNetwork import HomeNetwork
+
+log = eventLog.getLogger("hn")
+
+# Time in seconds a forwarded call is retried while its shard restarts
+FORWARD_TIMEOUT = 10.0
+# Time in seconds a stopping worker waits for its sessions to finish
+DRAIN_TIMEOUT = 10.0
+
+
+class ForwardingError(Exception):
+    pass
+
+
+def shardOf(supi, shards):
+    """
+    Shard owning the state of a subscriber.
+
+    Parameters:
+        supi (str): Subscriber Permanent Identifier
+        shards (int): Number of shards
+
+    Returns:
+        int: Shard number
+    """
+    return int.from_bytes(hashlib.sha256(supi.encode()).digest()[:8], byteorder='big') % shards
+
+
+def socketPath(runDir, shard):
+    return os.path.join(runDir, "shard-%d.sock" % shard)
+
+
+def statePath(runDir, shard):
+    return os.path.join(runDir, "shard-%d.state" % shard)
+
+
+def sendMessage(conn, message):
+    data = pickle.dumps(message)
+    conn.sendall(struct.pack(">I", len(data)) + data)
+
+
+def recvMessage(conn):
+    header = recvExactly(conn, 4)
+    return pickle.loads(recvExactly(conn, struct.unpack(">I", header)[0]))
+
+
+def recvExactly(conn, n):
+    data = bytearray()
+    while len(data) < n:
+        chunk = conn.recv(n - len(data))
+        if not chunk:
+            raise EOFError("connection closed in the middle of a message")
+        data += chunk
+    return bytes(data)
+
+
+class ShardedHomeNetwork(HomeNetwork):
+    def __init__(self, shard, shards, records, port, pk_hn, sk_hn, runDir, ind_bits=sqnArray.IND_BITS, state=None):
+        """
+        Initialize the ShardedHomeNetwork class.
+
+        One worker of a HNCluster. Every worker accepts SN sessions on the
+        shared port and decrypts their SUCIs, but the key and SQN of a
+        subscriber are only held by the worker of its shard. Operations
+        on the SQN of another shard (challenges, vectors and resyncs) are
+        forwarded to its worker over a Unix socket in runDir.
+
+        Parameters:
+            shard (int): Shard of this worker
+            shards (int): Number of shards
+            records (list): (supi, k, sqn_hn) of every subscriber of the cluster
+            port (int): Port number shared by the workers
+            pk_hn (bytes): Public key for Home Network
+            sk_hn (bytes): Secret key for Home Network
+            runDir (str): Directory of the forwarding sockets and saved shard states
+            ind_bits (int): Number of IND bits in SQN
+            state (dict): Subscriber records saved by the previous worker of the shard, None to start from records
+        """
+        super().__init__(None, None, None, port, pk_hn, sk_hn, None, ind_bits, reuse_port=True)
+        self.shard = shard
+        self.shards = shards
+        self.runDir = runDir
+        self.directory = set(supi for supi, k, sqn_hn in records)
+        if state is None:
+            state = {supi: {"k": k, "sqn_hn": sqn_hn} for supi, k, sqn_hn in records if shardOf(supi, shards) == shard}
+        self.subscribers.update(state)
+
+        self.stopping = False
+        self.released = False
+        self.sessions = 0
+        self.calls = 0
+        self.idle = threading.Condition()
+        self.peers = threading.local()
+        self.forwarded = 0
+
+        path = socketPath(runDir, shard)
+        if os.path.exists(path):
+            os.unlink(path)
+        self.sckt_fwd = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sckt_fwd.bind(path)
+        self.sckt_fwd.listen(socket.SOMAXCONN)
+
+    def knows(self, supi):
+        return supi in self.directory
+
+    def owns(self, supi):
+        return shardOf(supi, self.shards) == self.shard
+
+    def challengeSubscriber(self, supi, sname="sname_100"):
+        if self.owns(supi):
+            return super().challengeSubscriber(supi, sname)
+        return self.forward(supi, "challenge", supi, sname)
+
+    def resynchronize(self, supi, r, auts):
+        if self.owns(supi):
+            return super().resynchronize(supi, r, auts)
+        return self.forward(supi, "resync", supi, r, auts)
+
+    def vectors(self, supi, n, sname):
+        if self.owns(supi):
+            return super().vectors(supi, n, sname)
+        return self.forward(supi, "vectors", supi, n, sname)
+
+    def forward(self, supi, op, *args):
+        """
+        Run an operation on the worker owning a subscriber.
+
+        The connection to every peer is kept per thread. A call that fails
+        because the peer is restarting is retried for FORWARD_TIMEOUT
+        seconds; a retried challenge may skip a SQN, which the subscribers
+        accept.
+
+        Parameters:
+            supi (str): Subscriber Permanent Identifier
+            op (str): "challenge", "resync" or "vectors"
+            args (tuple): Arguments of the operation
+
+        Returns:
+            object: Result of the operation
+        """
+        shard = shardOf(supi, self.shards)
+        connections = self.peers.__dict__.setdefault("connections", {})
+        deadline = time.monotonic() + FORWARD_TIMEOUT
+        while True:
+            try:
+                conn = connections.get(shard)
+                if conn is None:
+                    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                    conn.connect(socketPath(self.runDir, shard))
+                    connections[shard] = conn
+                sendMessage(conn, (op, args))
+                status, result = recvMessage(conn)
+                break
+            except (OSError, EOFError) as msg:
+                conn = connections.pop(shard, None)
+                if conn is not None:
+                    conn.close()
+                if time.monotonic() > deadline:
+                    raise ForwardingError(f"shard {shard} unreachable: {msg}")
+                time.sleep(0.05)
+        if status != "ok":
+            raise ForwardingError(result)
+        return result
+
+    def serveForwarding(self):
+        """
+        Serve the operations forwarded by the other workers until released, one thread per peer connection.
+        """
+        while True:
+            try:
+                conn, addr = self.sckt_fwd.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.handlePeer, args=(conn,), daemon=True).start()
+
+    def handlePeer(self, conn):
+        operations = {
+            "challenge": super().challengeSubscriber,
+            "resync": super().resynchronize,
+            "vectors": super().vectors,
+        }
+        try:
+            while True:
+                # Wake up regularly so that a released worker lets its peers go
+                if not select.select([conn], [], [], 0.2)[0]:
+                    if self.released:
+                        return
+                    continue
+                with self.idle:
+                    if self.released:
+                        return
+                    self.calls += 1
+                try:
+                    op, args = recvMessage(conn)
+                    try:
+                        reply = ("ok", operations[op](*args))
+                    except Exception as msg:
+                        reply = ("error", f"{op} failed: {msg!r}")
+                    self.forwarded += 1
+                finally:
+                    with self.idle:
+                        self.calls -= 1
+                        self.idle.notify_all()
+                sendMessage(conn, reply)
+        except (OSError, EOFError):
+            return
+        finally:
+            conn.close()
+
+    def handleSN(self, conn):
+        try:
+            super().handleSN(conn)
+        except ForwardingError as msg:
+            log.error("Forwarding failed", error=msg)
+            conn.close()
+        finally:
+            with self.idle:
+                self.sessions -= 1
+                self.idle.notify_all()
+
+    def startSession(self, conn):
+        with self.idle:
+            self.sessions += 1
+        threading.Thread(target=self.handleSN, args=(conn,), daemon=True).start()
+
+    def serve(self):
+        """
+        Serve SN connections until stop() is called, one thread per session.
+        """
+        self.sckt_hn.settimeout(0.2)
+        while not self.stopping:
+            try:
+                conn, addr = self.sckt_hn.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            conn.settimeout(None)
+            self.startSession(conn)
+        # Take the connections already queued on this listener before closing it, the
+        # kernel only hands them to the other workers with net.ipv4.tcp_migrate_req
+        self.sckt_hn.setblocking(False)
+        while True:
+            try:
+                conn, addr = self.sckt_hn.accept()
+            except OSError:
+                break
+            conn.setblocking(True)
+            self.startSession(conn)
+        self.sckt_hn.close()
+
+    def stop(self):
+        """
+        Stop accepting SN sessions; serve() returns once the queued connections are taken.
+        """
+        self.stopping = True
+
+    def drain(self, timeout=DRAIN_TIMEOUT):
+        """
+        Wait for the running SN sessions, then stop serving the other workers once the
+        forwarded calls in progress are answered. Calls arriving later are retried by
+        the peers until the next worker of the shard is up.
+
+        Parameters:
+            timeout (float): Longest time in seconds to wait for the running sessions
+
+        Returns:
+            bool: True if every session finished in time
+        """
+        deadline = time.monotonic() + timeout
+        with self.idle:
+            # Own sessions may still need the other shards, and the other shards this one
+            while self.sessions and time.monotonic() < deadline:
+                self.idle.wait(0.1)
+            drained = self.sessions == 0
+            self.released = True
+            while self.calls:
+                self.idle.wait(0.1)
+        self.sckt_fwd.close()
+        os.unlink(socketPath(self.runDir, self.shard))
+        return drained
+
+    def saveState(self):
+        """
+        Save the subscriber records of the shard for the next worker.
+        """
+        path = statePath(self.runDir, self.shard)
+        with self.lock:
+            data = pickle.dumps(self.subscribers)
+        with open(path + ".tmp", 'wb') as file:
+            file.write(data)
+        os.replace(path + ".tmp", path)
+
+
+def loadState(runDir, shard):
+    path = statePath(runDir, shard)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as file:
+        return pickle.load(file)
+
+
+def runWorker(shard, shards, port, records, pk_hn, sk_hn, runDir, ind_bits, log_level, ready):
+    """
+    Run one worker until SIGTERM, then drain it and save the state of its shard.
+
+    Parameters:
+        shard (int): Shard of the worker
+        shards (int): Number of shards
+        port (int): Port number shared by the workers
+        records (list): (supi, k, sqn_hn) of every subscriber
+        pk_hn (bytes): Public key for Home Network
+        sk_hn (bytes): Secret key for Home Network
+        runDir (str): Directory of the forwarding sockets and saved shard states
+        ind_bits (int): Number of IND bits in SQN
+        log_level (str): Minimum level of the logged protocol events
+        ready (Event): Set once the worker serves
+    """
+    eventLog.setLevel(log_level)
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    hn = ShardedHomeNetwork(shard, shards, records, port, pk_hn, sk_hn, runDir, ind_bits, loadState(runDir, shard))
+    threading.Thread(target=hn.serveForwarding, daemon=True).start()
+    server = threading.Thread(target=hn.serve)
+    server.start()
+    ready.set()
+    log.info("Worker started", shard=shard, subscribers=len(hn.subscribers))
+    while not stopping.wait(0.5):
+        pass
+    hn.stop()
+    server.join()
+    drained = hn.drain()
+    if not drained:
+        # Sessions still running may issue SQNs after the save, and those are lost on restart
+        log.warning("Saving the state of a shard with sessions still running, unsafe", shard=shard, sessions=hn.sessions)
+    hn.saveState()
+    log.info("Worker stopped", shard=shard, drained=drained, forwarded=hn.forwarded)
+    eventLog.flush()
+
+
+class HNCluster:
+    def __init__(self, port, records, pk_hn, sk_hn, workers=None, ind_bits=sqnArray.IND_BITS, log_level="off", runDir=None):
+        """
+        Initialize the HNCluster class.
+
+        The cluster runs one ShardedHomeNetwork process per worker, all
+        listening on port through SO_REUSEPORT so that the kernel spreads
+        the SN connections over them. Subscriber state is sharded by a hash
+        of the SUPI.
+
+        Parameters:
+            port (int): Port number for Home Network
+            records (list): (supi, k, sqn_hn) of every subscriber
+            pk_hn (bytes): Public key for Home Network
+            sk_hn (bytes): Secret key for Home Network
+            workers (int): Number of worker processes (default: one per CPU)
+            ind_bits (int): Number of IND bits in SQN
+            log_level (str): Minimum level of the logged protocol events
+            runDir (str): Directory of the forwarding sockets and saved shard states (default: a new temporary directory)
+        """
+        self.port = port
+        self.records = records
+        self.pk_hn = pk_hn
+        self.sk_hn = sk_hn
+        self.workers = workers or os.cpu_count() or 1
+        self.ind_bits = ind_bits
+        self.log_level = log_level
+        self.ownRunDir = runDir is None
+        self.runDir = runDir
+        self.processes = []
+        self.restarts = 0
+        self.context = multiprocessing.get_context("fork")
+
+    def start(self):
+        """
+        Start every worker and wait until they serve.
+        """
+        if self.ownRunDir:
+            self.runDir = tempfile.mkdtemp(prefix="hn-cluster-")
+        for shard in range(self.workers):
+            path = statePath(self.runDir, shard)
+            if os.path.exists(path):
+                os.unlink(path)
+        self.processes = [self.spawn(shard) for shard in range(self.workers)]
+
+    def spawn(self, shard):
+        ready = self.context.Event()
+        process = self.context.Process(target=runWorker, args=(shard, self.workers, self.port, self.records, self.pk_hn, self.sk_hn,
+                                                               self.runDir, self.ind_bits, self.log_level, ready))
+        process.start()
+        if not ready.wait(30):
+            raise RuntimeError(f"worker of shard {shard} did not start")
+        return process
+
+    def restart(self, shard=None):
+        """
+        Restart workers one at a time. Each worker finishes its sessions and saves its shard,
+        and its successor loads the shard, while the other workers keep serving.
+
+        Parameters:
+            shard (int): Shard of the worker to restart, None for every worker
+        """
+        for i in range(self.workers) if shard is None else [shard]:
+            process = self.processes[i]
+            process.terminate()
+            process.join()
+            self.processes[i] = self.spawn(i)
+            self.restarts += 1
+            log.info("Worker restarted", shard=i)
+
+    def supervise(self):
+        """
+        Replace the workers that died. Their shard restarts from the last saved state, or
+        from the initial records; subscribers whose SQN went back are resynchronized.
+
+        Returns:
+            int: Number of workers replaced
+        """
+        replaced = 0
+        for i, process in enumerate(self.processes):
+            if not process.is_alive():
+                log.warning("Worker died", shard=i, exitcode=process.exitcode)
+                self.processes[i] = self.spawn(i)
+                replaced += 1
+        return replaced
+
+    def stop(self):
+        """
+        Stop every worker and remove the temporary directory.
+        """
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join()
+        self.processes = []
+        if self.ownRunDir and self.runDir is not None:
+            shutil.rmtree(self.runDir, ignore_errors=True)
+
+
+def runCluster(port, records, pk_hn, sk_hn, workers, log_level="off", ind_bits=sqnArray.IND_BITS):
+    """
+    Run a Home Network cluster until SIGTERM, restarting every worker on SIGHUP.
+
+    Parameters:
+        port (int): Port number for Home Network
+        records (list): (supi, k, sqn_hn) of every subscriber
+        pk_hn (bytes): Public key for Home Network
+        sk_hn (bytes): Secret key for Home Network
+        workers (int): Number of worker processes
+        log_level (str): Minimum level of the logged protocol events
+        ind_bits (int): Number of IND bits in SQN
+    """
+    eventLog.setLevel(log_level)
+    restart = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    signal.signal(signal.SIGHUP, lambda signum, frame: restart.set())
+    cluster = HNCluster(port, records, pk_hn, sk_hn, workers, ind_bits, log_level)
+    cluster.start()
+    try:
+        while True:
+            if restart.wait(1.0):
+                restart.clear()
+                cluster.restart()
+            cluster.supervise()
+    finally:
+        cluster.stop()
+
+
+def benchmark(processCounts, subscribers, attaches, restart=False):
+    """
+    Measure attach throughput against the number of HN worker processes.
+
+    Parameters:
+        processCounts (list): Numbers of worker processes to try
+        subscribers (int): Concurrent simulated subscribers
+        attaches (int): Attaches per run
+        restart (bool): Restart every worker once in the middle of each run
+
+    Returns:
+        list: Load generator report of every run
+    """
+    from loadGenerator import LoadGenerator
+    reports = []
+    for processes in processCounts:
+        generator = LoadGenerator(subscribers, attaches, 0, 0.0, 0.0, 1070, 8080, hn_processes=processes, restart_hn=restart)
+        report = generator.run()
+        reports.append(report)
+        print(f"{processes} HN process(es): {report['attaches_per_s']} attaches/s, "
+              f"outcomes {report['outcomes']}, errors {report['errors']}")
+    return reports
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="5G AKA Home Network cluster")
+    parser.add_argument("--benchmark", type=int, nargs="+", metavar="N", help="measure attaches/s with each number of worker processes")
+    parser.add_argument("--subscribers", type=int, default=20, help="concurrent simulated subscribers in benchmark mode")
+    parser.add_argument("--attaches", type=int, default=1000, help="attaches per benchmark run")
+    parser.add_argument("--restart", action="store_true", help="restart every worker in the middle of each benchmark run")
+    args = parser.parse_args()
+    print(f"{os.cpu_count()} CPU(s)")
+    benchmark(args.benchmark or [1, 2, 4], args.subscribers, args.attaches, args.restart)
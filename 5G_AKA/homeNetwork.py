@@ -1,90 +1,248 @@
 import socket
 import sys
 import pickle
+import threading
 import crypto
-import datetime
+import authVectors
+import sqnArray
 from ecies.utils import generate_key
 from ecies import decrypt
-import time
+import argparse
+import instrumentation
+import eventLog
+from deconcealment import DeconcealmentEngine, DeconcealmentError
+
+log = eventLog.getLogger("hn")
 
 class HomeNetwork:
-    def __init__(self, k, supi, sqn_hn, port, pk_hn, sk_hn):
+    def __init__(self, k, supi, sqn_hn, port, pk_hn, sk_hn, engine=None, ind_bits=sqnArray.IND_BITS, reuse_port=False):
         """
         Initialize the HomeNetwork class.
 
         Parameters:
             k (bytes): Key for cryptographic operations
-            supi (str): Subscriber Permanent Identifier
+            supi (str): Subscriber Permanent Identifier, None to register every subscriber with addSubscriber
             sqn_hn (int): Sequence number for Home Network
-            port (int): Port number for communication
+            port (int): Port number for communication, None for an offline instance
             pk_hn (bytes): Public key for Home Network
             sk_hn (bytes): Secret key for Home Network
+            engine (DeconcealmentEngine): Optional parallel SUCI deconcealment engine
+            ind_bits (int): Number of IND bits in SQN, must match the subscribers
+            reuse_port (bool): Share the port with other processes through SO_REUSEPORT
         """
-        self.k = k
         self.supi = supi
-        self.sqn_hn = sqn_hn
         self.port = port
         self.pk_hn = pk_hn
         self.sk_hn = sk_hn
+        self.engine = engine
+        self.ind_bits = ind_bits
+
+        # Subscriber records by SUPI: key and sequence number
+        self.subscribers = {}
+        self.lock = threading.Lock()
+        if supi is not None:
+            self.addSubscriber(supi, k, sqn_hn)
+        if port is None:
+            return
 
         # Establish socket and wait for SN connection
         try:
             self.sckt_hn = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.sckt_hn.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if reuse_port:
+                self.sckt_hn.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
             self.sckt_hn.bind(('127.0.0.1', port))
-            self.sckt_hn.listen(10)
+            self.sckt_hn.listen(socket.SOMAXCONN)
         except socket.error as msg:
-            print(msg)
+            log.error("Socket error", error=msg)
             sys.exit(1)
-        print("\033[1;32m", datetime.datetime.now().strftime("%F %T"), "\033[0m", " [Waiting for SN connection...]")
+        log.info("Waiting for SN connection...")
+
+    @property
+    def k(self):
+        return self.subscribers[self.supi]["k"]
+
+    @property
+    def sqn_hn(self):
+        return self.subscribers[self.supi]["sqn_hn"]
+
+    @sqn_hn.setter
+    def sqn_hn(self, sqn_hn):
+        self.subscribers[self.supi]["sqn_hn"] = sqn_hn
+
+    def addSubscriber(self, supi, k, sqn_hn):
+        """
+        Register a subscriber with the Home Network.
+
+        Parameters:
+            supi (str): Subscriber Permanent Identifier
+            k (bytes): Key of the subscriber
+            sqn_hn (int): Sequence number for Home Network
+        """
+        with self.lock:
+            self.subscribers[supi] = {"k": k, "sqn_hn": sqn_hn}
+
+    def knows(self, supi):
+        """
+        Check if a subscriber is registered with the Home Network.
+
+        Parameters:
+            supi (str): Subscriber Permanent Identifier
+
+        Returns:
+            bool: True if the subscriber is registered
+        """
+        return supi in self.subscribers
 
     def connectSN(self):
         """
         Connect to SN (Serving Network) and perform authentication.
         """
         conn, addr = self.sckt_hn.accept()
-        suci, sname = pickle.loads(conn.recv(1024 * 2))
-        print("\033[1;32m", datetime.datetime.now().strftime("%F %T"), "\033[0m", f" [Received suci, sname] suci: {suci}, sname: {sname}")
+        self.handleSN(conn)
+
+    def serve(self):
+        """
+        Serve SN connections until the listening socket is closed, one thread per session.
+        """
+        while True:
+            try:
+                conn, addr = self.sckt_hn.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.handleSN, args=(conn,), daemon=True).start()
+
+    def shutdown(self):
+        """
+        Stop serving by closing the listening socket.
+        """
+        self.sckt_hn.close()
+
+    def handleSN(self, conn):
+        """
+        Perform authentication for one SN session.
+
+        Parameters:
+            conn (socket): Connection from the Serving Network
+        """
+        try:
+            self.authenticate(conn)
+        except (EOFError, OSError) as msg:
+            log.warning("Connection interrupted", error=msg)
+        except (pickle.UnpicklingError, ValueError, IndexError, TypeError) as msg:
+            # A malformed SUCI or message only ends its own session
+            log.warning("Rejected session", error=repr(msg))
+        finally:
+            conn.close()
+
+    def authenticate(self, conn):
+        """
+        Run the authentication exchange of one SN session.
+
+        The SN opens a session with (suci, sname) for one vector, or with
+        one of the requests of an SN caching vectors:
+        ('AV_REQ', suci, sname, n) for n vectors of which the first is
+        confirmed as usual, ('AV_REQ_SUPI', supi, sname, n) for n vectors of
+        an already identified subscriber, and ('RESYNC', supi, r, auts) after
+        a Sync_Failure on a cached vector.
+
+        Parameters:
+            conn (socket): Connection from the Serving Network
+        """
+        request = pickle.loads(conn.recv(1024 * 2))
+        if request[0] == 'AV_REQ_SUPI':
+            _, supi, sname, n = request
+            log.info("Received AV request", supi=supi, sname=sname, n=n)
+            vectors = self.vectors(supi, n, sname) if self.knows(supi) else []
+            authVectors.sendVectors(conn, vectors)
+            return
+        if request[0] == 'RESYNC':
+            _, supi, r, auts = request
+            log.warning("'Sync_Failure' on a cached vector", supi=supi, AUTS=auts, R=r)
+            if self.knows(supi):
+                self.resynchronize(supi, r, auts)
+            return
+        if request[0] == 'AV_REQ':
+            _, suci, sname, n = request
+        else:
+            suci, sname = request
+            n = 1
+        log.info("Received suci, sname", suci=suci, sname=sname)
 
         # Get SUPI from SUCI
         supi = self.getSUPI(suci)
+        if supi is None:
+            return
 
         # Start authentication challenge
-        r, autn, hxres_star, k_seaf = self.authentication_challenge()
-        conn.send(pickle.dumps((r, autn, hxres_star, k_seaf)))
-        print("\033[1;32m", datetime.datetime.now().strftime("%F %T"), "\033[0m", f" [Sent R, AUTN, HXRES*, K_SEAF] R: {r}, \nAUTN: {autn}, \nHXRES*: {hxres_star}, \nK_SEAF: {k_seaf}")
+        r, autn, hxres_star, k_seaf, xres_star = self.challengeSubscriber(supi, sname)
+        if request[0] == 'AV_REQ':
+            # The extra vectors are only used once the SN has the SUPI, after this one is confirmed
+            authVectors.sendVectors(conn, [(r, autn, hxres_star, k_seaf)] + self.vectors(supi, n - 1, sname))
+        else:
+            conn.send(pickle.dumps((r, autn, hxres_star, k_seaf)))
+        log.info("Sent R, AUTN, HXRES*, K_SEAF", R=r, AUTN=autn, HXRES_star=hxres_star, K_SEAF=k_seaf)
 
         # Receive response
         try:
             package = pickle.loads(conn.recv(1024 * 2))
         except EOFError:
-            print("\033[1;31m", datetime.datetime.now().strftime("%F %T"), "\033[0m", " [Connection interrupted]")
-            conn.close()
+            log.warning("Connection interrupted")
             return
-        print("\033[1;32m", datetime.datetime.now().strftime("%F %T"), "\033[0m", f" [Received from sub] package: (message, content), message: {package[0]}")
+        log.info("Received from sub", message=package[0])
 
         # Handle response
         if package[0] == 'RES*':
             res_star = package[1]
-            print("\033[1;32m", datetime.datetime.now().strftime("%F %T"), "\033[0m", f" ['RES*'] RES*: {res_star}")
-            if res_star != self.xres_star:
-                print("\033[1;31m", datetime.datetime.now().strftime("%F %T"), "\033[0m", f" [RES* != HXRES*] Abort")
-                sys.exit(1)
+            log.info("'RES*'", RES_star=res_star)
+            if res_star != xres_star:
+                log.warning("RES* != HXRES*", action="Abort")
+                return
             else:
                 conn.send(pickle.dumps(supi))
-                print("\033[1;32m", datetime.datetime.now().strftime("%F %T"), "\033[0m", f" [Sent SUPI to SN] supi: {supi}")
+                log.info("Sent SUPI to SN", supi=supi)
 
         elif package[0] == 'Sync_Failure':
             auts = package[1]
             r = package[2]
-            print("\033[1;31m", datetime.datetime.now().strftime("%F %T"), "\033[0m", f" ['Sync_Failure'] AUTS: {auts}, \nR: {r}")
-            i, xsqn_ue = self.verify(self.k, r, auts)
-            if i:
-                print("\033[1;31m", datetime.datetime.now().strftime("%F %T"), "\033[0m", f" ['MACS == MAC']")
-                self.sqn_hn = xsqn_ue + 1
-                print("\033[1;31m", datetime.datetime.now().strftime("%F %T"), "\033[0m", f" [Resynchronized] sqn_hn: {self.sqn_hn}")
-        conn.close()
+            log.warning("'Sync_Failure'", AUTS=auts, R=r)
+            self.resynchronize(supi, r, auts)
+
+    def resynchronize(self, supi, r, auts):
+        """
+        Move the sequence number of a subscriber past the one in a valid AUTS.
 
+        Parameters:
+            supi (str): Subscriber Permanent Identifier
+            r (bytes): Random value of the rejected challenge
+            auts (tuple): AUTS value (conc_star, macs)
+        """
+        subscriber = self.subscribers[supi]
+        i, xsqn_ue = self.verify(subscriber["k"], r, auts)
+        if i:
+            log.warning("'MACS == MAC'")
+            with self.lock:
+                subscriber["sqn_hn"] = sqnArray.advance(xsqn_ue, 1, self.ind_bits)
+            log.warning("Resynchronized", sqn_hn=subscriber["sqn_hn"])
+
+    def vectors(self, supi, n, sname):
+        """
+        Generate vectors for an SN to cache.
+
+        Parameters:
+            supi (str): Subscriber Permanent Identifier
+            n (int): Number of vectors
+            sname (str): Serving network name
+
+        Returns:
+            list: Vectors (r, autn, hxres_star, k_seaf)
+        """
+        if n <= 0:
+            return []
+        batch = self.generate_avs([supi], n, sname, threads=1)
+        return [batch[i][:4] for i in range(len(batch))]
+
+    @instrumentation.timed("hn.getSUPI")
     def getSUPI(self, suci):
         """
         Decrypt SUCI to get SUPI.
@@ -95,21 +253,47 @@ class HomeNetwork:
         Returns:
             str: Subscriber Permanent Identifier
         """
-        test_suci = suci
-        start_time = time.time()
-        for _ in range(1000):
-            suci = decrypt(self.sk_hn, test_suci).decode('utf-8')
-        end_time = time.time()
-        total_elapsed_time = end_time - start_time
-        average_time_per_challenge = (total_elapsed_time / 1000) * 1000  # Convert to milliseconds
-        formatted_time = f"{average_time_per_challenge:.2f} ms"
-        print("\033[1;32m", datetime.datetime.now().strftime("%F %T"), "\033[0m", f"getSUPI execution time: {formatted_time}")
-
-        if suci == "supi":
-            return self.supi
+        instrumentation.count("ecies_decrypt")
+        if self.engine is not None:
+            try:
+                return self.checkSUPI(self.engine.submit(suci).result())
+            except DeconcealmentError as msg:
+                log.warning("dec error!", error=msg)
+                return None
+        return self.checkSUPI(decrypt(self.sk_hn, suci).decode('utf-8'))
+
+    async def getSUPIAsync(self, suci):
+        """
+        Decrypt SUCI to get SUPI without blocking the event loop.
+
+        The SUCI is handed to the deconcealment engine and the returned
+        future is awaited, so an asyncio server can keep serving other
+        sessions while the batch is decrypted.
+
+        Parameters:
+            suci (bytes): Subscriber Concealed Identifier
+
+        Returns:
+            str: Subscriber Permanent Identifier
+        """
+        instrumentation.count("ecies_decrypt")
+        return self.checkSUPI(await self.engine.submit_async(suci))
+
+    def checkSUPI(self, suci):
+        """
+        Map a decrypted SUCI to a SUPI registered with this Home Network.
+
+        Parameters:
+            suci (str): Decrypted Subscriber Concealed Identifier
+
+        Returns:
+            str: Subscriber Permanent Identifier, None if the subscriber is unknown
+        """
+        if self.knows(suci):
+            return suci
         else:
-            print("dec error!", suci)
-            sys.exit(1)
+            log.warning("dec error!", suci=suci)
+            return None
 
     def authentication_challenge(self):
         """
@@ -118,25 +302,65 @@ class HomeNetwork:
         Returns:
             tuple: Random value (r), Authentication token (autn), Hashed response (hxres_star), Session key (k_seaf)
         """
-        start_time = time.time()
-        for _ in range(1000):
-            r = crypto.getRandom(256)
-            bsqn_hn = self.sqn_hn.to_bytes(256, byteorder='little')
-            self.mac = crypto.fun1(self.k, self.sqn_hn, r)
-            ak = crypto.fun5(self.k, r)
-            conc = crypto.getXOR(bsqn_hn, ak)
-            autn = (conc, self.mac)
-            self.xres_star = crypto.challenge(self.k, r, "sname_100")
-            hxres_star = crypto.getsha256(r, self.xres_star)
-            k_seaf = crypto.keySeed(self.k, r, self.sqn_hn, "sname_100")
-        end_time = time.time()
-        total_elapsed_time = end_time - start_time
-        average_time_per_challenge = (total_elapsed_time / 1000) * 1000  # Convert to milliseconds
-        formatted_time = f"{average_time_per_challenge:.2f} ms"
-        print("\033[1;32m", datetime.datetime.now().strftime("%F %T"), "\033[0m", f"authentication execution time: {formatted_time}")
-        self.sqn_hn += 1
+        r, autn, hxres_star, k_seaf, self.xres_star = self.challengeSubscriber(self.supi)
+        self.mac = autn[1]
         return r, autn, hxres_star, k_seaf
 
+    @instrumentation.timed("hn.authentication_challenge")
+    def challengeSubscriber(self, supi, sname="sname_100"):
+        """
+        Perform the authentication challenge for a registered subscriber.
+
+        Parameters:
+            supi (str): Subscriber Permanent Identifier
+            sname (str): Serving network name
+
+        Returns:
+            tuple: Random value (r), Authentication token (autn), Hashed response (hxres_star), Session key (k_seaf), Expected response (xres_star)
+        """
+        subscriber = self.subscribers[supi]
+        k = subscriber["k"]
+        with self.lock:
+            sqn_hn = subscriber["sqn_hn"]
+            subscriber["sqn_hn"] = sqnArray.advance(sqn_hn, 1, self.ind_bits)
+        r = crypto.getRandom(256)
+        bsqn_hn = sqn_hn.to_bytes(256, byteorder='little')
+        mac = crypto.fun1(k, sqn_hn, r)
+        ak = crypto.fun5(k, r)
+        conc = crypto.getXOR(bsqn_hn, ak)
+        autn = (conc, mac)
+        xres_star = crypto.challenge(k, r, sname)
+        hxres_star = crypto.getsha256(r, xres_star)
+        k_seaf = crypto.keySeed(k, r, sqn_hn, sname)
+        return r, autn, hxres_star, k_seaf, xres_star
+
+    @instrumentation.timed("hn.generate_avs")
+    def generate_avs(self, subscribers, n_per_sub, sname="sname_100", threads=4):
+        """
+        Generate authentication vectors for many registered subscribers at once.
+
+        A block of n_per_sub sequence numbers is reserved for each subscriber
+        under the lock, then the vectors are computed by authVectors.generateAVs.
+
+        Parameters:
+            subscribers (list): SUPIs of the subscribers
+            n_per_sub (int): Vectors per subscriber
+            sname (str): Serving network name
+            threads (int): Threads computing the hashes and KDFs
+
+        Returns:
+            AuthVectorBatch: The vectors, n_per_sub consecutive ones per subscriber
+        """
+        records = []
+        with self.lock:
+            for supi in subscribers:
+                subscriber = self.subscribers[supi]
+                sqn_hn = subscriber["sqn_hn"]
+                subscriber["sqn_hn"] = sqnArray.advance(sqn_hn, n_per_sub, self.ind_bits)
+                records.extend((supi, subscriber["k"], sqnArray.advance(sqn_hn, i, self.ind_bits)) for i in range(n_per_sub))
+        return authVectors.generateAVs(records, sname, threads)
+
+    @instrumentation.timed("hn.verify")
     def verify(self, k, r, auts):
         """
         Verify the AUTS value.
@@ -149,26 +373,53 @@ class HomeNetwork:
         Returns:
             tuple: Verification result (bool) and sequence number (int)
         """
-        start_time = time.time()
-        for _ in range(1000):
-            conc_star = auts[0]
-            macs = auts[1]
-            xak_star = crypto.fun5(k, r)
-            bxsqn_ue = crypto.getXOR(xak_star, conc_star)
-            xsqn_ue = int.from_bytes(bxsqn_ue, byteorder='little')
-            xmacs = crypto.fun1(k, xsqn_ue, r)
-            if xmacs == macs:
-                i = True
-            else:
-                i = False
-        end_time = time.time()
-        total_elapsed_time = end_time - start_time
-        average_time_per_challenge = (total_elapsed_time / 1000) * 1000  # Convert to milliseconds
-        formatted_time = f"{average_time_per_challenge:.2f} ms"
-        print("\033[1;32m", datetime.datetime.now().strftime("%F %T"), "\033[0m", f"ShowVerify execution time: {formatted_time}")
+        conc_star = auts[0]
+        macs = auts[1]
+        xak_star = crypto.fun5(k, r)
+        bxsqn_ue = crypto.getXOR(xak_star, conc_star)
+        xsqn_ue = int.from_bytes(bxsqn_ue, byteorder='little')
+        xmacs = crypto.fun1(k, xsqn_ue, r)
+        if xmacs == macs:
+            i = True
+        else:
+            i = False
         return i, xsqn_ue
 
+def benchmark(iterations):
+    """
+    Benchmark mode: time each Home Network operation offline.
+
+    Parameters:
+        iterations (int): Number of runs per operation
+    """
+    from ecies import encrypt
+    k = crypto.getKey()
+    secp_k = generate_key()
+    hn = HomeNetwork(k, "supi", 100, None, secp_k.public_key.format(True), secp_k.secret)
+    suci = encrypt(hn.pk_hn, b"supi")
+    r = crypto.getRandom(256)
+    bsqn_ue = (99).to_bytes(256, byteorder='little')
+    auts = (crypto.getXOR(bsqn_ue, crypto.fun5_star(k, r)), crypto.fun1_star(k, 99, r))
+    instrumentation.benchmark(hn.getSUPI, suci, iterations=iterations)
+    instrumentation.benchmark(hn.authentication_challenge, iterations=iterations)
+    instrumentation.benchmark(hn.verify, k, r, auts, iterations=iterations)
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="5G AKA Home Network")
+    parser.add_argument("--workers", type=int, default=0, help="decrypt SUCIs on a pool of N processes")
+    parser.add_argument("--benchmark", action="store_true", help="time each operation offline instead of serving")
+    parser.add_argument("--iterations", type=int, default=1000, help="runs per operation in benchmark mode")
+    parser.add_argument("--metrics", help="record per-operation timings and write them to this JSON file")
+    parser.add_argument("--log-level", choices=eventLog.LEVELS, default="info", help="minimum level of the logged protocol events")
+    parser.add_argument("--log-json", help="also write the protocol events to this JSON lines file")
+    args = parser.parse_args()
+    eventLog.configure(args.log_level, args.log_json)
+    if args.benchmark:
+        benchmark(args.iterations)
+        sys.exit(0)
+    if args.metrics:
+        instrumentation.enable()
+
     k = crypto.getKey()
     # ECIES Key
     secp_k = generate_key()
@@ -180,6 +431,13 @@ if __name__ == '__main__':
     with open(file_path, 'wb') as file:
         file.write(pk_hn)
 
+    engine = DeconcealmentEngine(sk_hn, workers=args.workers) if args.workers else None
+
     sqn_hn = 100
-    hn = HomeNetwork(k, "supi", sqn_hn, 1070, pk_hn, sk_hn)
+    hn = HomeNetwork(k, "supi", sqn_hn, 1070, pk_hn, sk_hn, engine)
     hn.connectSN()
+    if engine is not None:
+        log.info("Deconcealment", **engine.stats())
+        engine.close()
+    if args.metrics:
+        instrumentation.export_json(args.metrics)
@@ -0,0 +1,288 @@
+# instrumentation.py
+import functools
+import json
+import threading
+import time
+
+# Instrumentation is opt-in, every hook below is a single flag check while disabled
+_enabled = False
+_lock = threading.Lock()
+_histograms = {}
+# Primitive counters are opt-in as well and independent of the timings
+_counting = False
+_counts = {}
+
+# Bucket upper bounds in microseconds: 1, 2, 5, 10, 20, 50, ... up to 500 s
+BUCKETS_US = [m * 10 ** e for e in range(9) for m in (1, 2, 5)]
+
+
+class Histogram:
+    def __init__(self, name):
+        """
+        Initialize the Histogram class.
+
+        Parameters:
+            name (str): Name of the timed operation
+        """
+        self.name = name
+        self.counts = [0] * (len(BUCKETS_US) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, seconds):
+        """
+        Record one sample.
+
+        Parameters:
+            seconds (float): Duration of the operation
+        """
+        us = seconds * 1e6
+        index = 0
+        while index < len(BUCKETS_US) and us > BUCKETS_US[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+
+    def percentile(self, q):
+        """
+        Estimate a percentile from the buckets.
+
+        Parameters:
+            q (float): Percentile between 0 and 100
+
+        Returns:
+            float: Upper bound of the bucket holding the percentile, in seconds
+        """
+        if not self.count:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= rank:
+                if index == len(BUCKETS_US):
+                    return self.max
+                return min(BUCKETS_US[index] / 1e6, self.max)
+        return self.max
+
+    def to_dict(self):
+        """
+        Summarize the histogram.
+
+        Returns:
+            dict: Count, mean, min, max and p50/p90/p99 in milliseconds plus the raw buckets
+        """
+        ms = lambda seconds: round((seconds or 0.0) * 1000, 4)
+        return {
+            "count": self.count,
+            "mean_ms": ms(self.total / self.count if self.count else 0.0),
+            "min_ms": ms(self.min),
+            "max_ms": ms(self.max),
+            "p50_ms": ms(self.percentile(50)),
+            "p90_ms": ms(self.percentile(90)),
+            "p99_ms": ms(self.percentile(99)),
+            "buckets_us": {str(bound): n for bound, n in zip(BUCKETS_US + ["inf"], self.counts) if n},
+        }
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def record(name, seconds):
+    """
+    Add a sample to the histogram called name.
+
+    Parameters:
+        name (str): Name of the timed operation
+        seconds (float): Duration of the operation
+    """
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram(name)
+        histogram.add(seconds)
+
+
+def timed(name):
+    """
+    Decorator timing every call of the wrapped function into the histogram name.
+
+    Parameters:
+        name (str): Name of the timed operation
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+def enable_counting():
+    global _counting
+    _counting = True
+
+
+def disable_counting():
+    global _counting
+    _counting = False
+
+
+def count(name, n=1):
+    """
+    Count n calls of the primitive name while counting is enabled.
+
+    Parameters:
+        name (str): Name of the primitive, e.g. 'sha256'
+        n (int): Number of calls
+    """
+    if not _counting:
+        return
+    with _lock:
+        _counts[name] = _counts.get(name, 0) + n
+
+
+def counted(name):
+    """
+    Decorator counting every call of the wrapped function as the primitive name.
+
+    Parameters:
+        name (str): Name of the primitive
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _counting:
+                count(name)
+            return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def counts():
+    """
+    Read the primitive counters.
+
+    Returns:
+        dict: Number of calls by primitive name since the last reset
+    """
+    with _lock:
+        return dict(sorted(_counts.items()))
+
+
+def reset_counts():
+    with _lock:
+        _counts.clear()
+
+
+class _Timer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.start)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timer(name):
+    """
+    Context manager timing the enclosed block into the histogram name.
+
+    Parameters:
+        name (str): Name of the timed operation
+    """
+    return _Timer(name) if _enabled else _NULL_TIMER
+
+
+def snapshot():
+    """
+    Summarize all histograms.
+
+    Returns:
+        dict: Histogram summaries by operation name
+    """
+    with _lock:
+        return {name: histogram.to_dict() for name, histogram in sorted(_histograms.items())}
+
+
+def export_json(path=None):
+    """
+    Export all histograms as JSON.
+
+    Parameters:
+        path (str): Optional file to write the JSON document to
+
+    Returns:
+        str: JSON document
+    """
+    document = json.dumps(snapshot(), indent=2)
+    if path is not None:
+        with open(path, 'w') as file:
+            file.write(document)
+    return document
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+
+
+def benchmark(func, *args, iterations=1000, name=None):
+    """
+    Benchmark mode: run a protocol operation repeatedly and print its average time.
+
+    Parameters:
+        func (function): The operation to measure
+        args: The arguments to pass to the operation
+        iterations (int): Number of runs
+        name (str): Label to print (default: function name)
+
+    Returns:
+        float: Average execution time in milliseconds
+    """
+    start_time = time.perf_counter()
+    for _ in range(iterations):
+        func(*args)
+    elapsed_time = (time.perf_counter() - start_time) / iterations * 1000  # Convert to milliseconds
+    print(f"{name or func.__name__} execution time: {elapsed_time:.2f} ms")
+    return elapsed_time
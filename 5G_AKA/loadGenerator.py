@@ -0,0 +1,388 @@
+# loadGenerator.py
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import random
+import signal
+import socket
+import sys
+import threading
+import time
+from ecies.utils import generate_key
+import crypto
+import eventLog
+import instrumentation
+import sqnArray
+from deconcealment import DeconcealmentEngine
+from avCache import AVCache
+from hnCluster import runCluster
+from homeNetwork import HomeNetwork
+from servingNetwork import ServingNetwork
+from subscriber import Subscriber
+
+PHASES = ["ue.phase.suci", "ue.phase.challenge", "ue.phase.response", "ue.phase.confirm", "attach.total", "attach.wait"]
+
+
+def runHN(port, records, pk_hn, sk_hn, workers, log_level="off", ind_bits=sqnArray.IND_BITS):
+    """
+    Run a Home Network serving every simulated subscriber.
+
+    Parameters:
+        port (int): Port number for Home Network
+        records (list): (supi, k, sqn_hn) of every subscriber
+        pk_hn (bytes): Public key for Home Network
+        sk_hn (bytes): Secret key for Home Network
+        workers (int): Number of SUCI deconcealment processes, 0 to decrypt inline
+        log_level (str): Minimum level of the logged protocol events
+        ind_bits (int): Number of IND bits in SQN
+    """
+    eventLog.setLevel(log_level)
+    # Terminating the HN must also stop the deconcealment processes
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    engine = DeconcealmentEngine(sk_hn, workers=workers) if workers else None
+    supi, k, sqn_hn = records[0]
+    hn = HomeNetwork(k, supi, sqn_hn, port, pk_hn, sk_hn, engine, ind_bits)
+    for supi, k, sqn_hn in records[1:]:
+        hn.addSubscriber(supi, k, sqn_hn)
+    try:
+        hn.serve()
+    finally:
+        if engine is not None:
+            engine.close()
+
+
+def runSN(port, port_hn, sname, log_level="off", av_batch=0, av_capacity=10000, av_lifetime=300.0, stats=None):
+    """
+    Run a Serving Network relaying to the Home Network.
+
+    Parameters:
+        port (int): Port number for Serving Network
+        port_hn (int): Port number for Home Network
+        sname (str): Serving network name
+        log_level (str): Minimum level of the logged protocol events
+        av_batch (int): Vectors requested from the HN at a time, 0 to relay every attach
+        av_capacity (int): Largest number of cached vectors
+        av_lifetime (float): Time in seconds after which a cached vector is discarded
+        stats (Queue): Queue receiving the SN statistics when it is terminated
+    """
+    eventLog.setLevel(log_level)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    cache = AVCache(av_capacity, av_lifetime) if av_batch else None
+    sn = ServingNetwork(sname, "suci", port, port_hn, cache, av_batch)
+    try:
+        sn.serve()
+    finally:
+        if stats is not None:
+            stats.put(sn.stats())
+
+
+def waitForPort(port, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"nothing is listening on port {port}")
+
+
+class LoadGenerator:
+    def __init__(self, subscribers, attaches, rate, sync_failure, mac_failure, port_hn, port_sn, sname="sname_100", seed=None,
+                 reorder=0.0, ind_bits=sqnArray.IND_BITS, age_limit=sqnArray.AGE_LIMIT,
+                 av_batch=0, av_capacity=10000, av_lifetime=300.0, hn_processes=0, restart_hn=False):
+        """
+        Initialize the LoadGenerator class.
+
+        Parameters:
+            subscribers (int): Number of simulated subscribers attaching concurrently
+            attaches (int): Total number of attaches to run
+            rate (float): Mean arrival rate in attaches/s (Poisson), 0 for a closed loop
+            sync_failure (float): Fraction of attaches forced into Sync_Failure
+            mac_failure (float): Fraction of attaches forced into Mac_Failure
+            port_hn (int): Port number for Home Network
+            port_sn (int): Port number for Serving Network
+            sname (str): Serving network name
+            seed (int): Seed for the arrival times and the failure mix
+            reorder (float): Fraction of arrivals running two interleaved attaches whose challenges are answered out of order
+            ind_bits (int): Number of IND bits in SQN, 0 for the plain increasing SQN
+            age_limit (int): Largest age in SEQ steps of an SQN accepted by the subscribers
+            av_batch (int): Vectors the SN requests from the HN at a time and caches, 0 to relay every attach
+            av_capacity (int): Largest number of vectors cached by the SN
+            av_lifetime (float): Time in seconds after which a cached vector is discarded
+            hn_processes (int): Number of HN worker processes sharing the port (see hnCluster.py), 0 for a single HomeNetwork
+            restart_hn (bool): Restart every HN worker once half of the attaches are done, with hn_processes
+        """
+        self.subscribers = subscribers
+        self.attaches = attaches
+        self.rate = rate
+        self.sync_failure = sync_failure
+        self.mac_failure = mac_failure
+        self.port_hn = port_hn
+        self.port_sn = port_sn
+        self.sname = sname
+        self.reorder = reorder
+        self.ind_bits = ind_bits
+        self.age_limit = age_limit
+        self.av_batch = av_batch
+        self.av_capacity = av_capacity
+        self.av_lifetime = av_lifetime
+        self.hn_processes = hn_processes
+        self.restart_hn = restart_hn
+        self.random = random.Random(seed)
+
+        self.outcomes = {}
+        self.unexpected = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    def run(self, workers=0, log_level="off"):
+        """
+        Start the HN and SN, run every attach and stop them again.
+
+        Parameters:
+            workers (int): Number of SUCI deconcealment processes in the HN
+            log_level (str): Minimum level of the protocol events logged by the HN, SN and subscribers
+
+        Returns:
+            dict: Throughput, outcome counts and per-phase latency histograms
+        """
+        secp_k = generate_key()
+        pk_hn = secp_k.public_key.format(True)
+        records = [(f"imsi-{i:010d}", crypto.getRandom(256), 100) for i in range(self.subscribers)]
+
+        if self.hn_processes:
+            hn = multiprocessing.Process(target=runCluster, args=(self.port_hn, records, pk_hn, secp_k.secret, self.hn_processes, log_level, self.ind_bits))
+        else:
+            hn = multiprocessing.Process(target=runHN, args=(self.port_hn, records, pk_hn, secp_k.secret, workers, log_level, self.ind_bits))
+        snStats = multiprocessing.Queue()
+        sn = multiprocessing.Process(target=runSN, args=(self.port_sn, self.port_hn, self.sname, log_level,
+                                                         self.av_batch, self.av_capacity, self.av_lifetime, snStats))
+        hn.start()
+        sn.start()
+        try:
+            waitForPort(self.port_hn)
+            waitForPort(self.port_sn)
+        except RuntimeError:
+            hn.terminate()
+            sn.terminate()
+            raise
+
+        ues = [Subscriber(k, supi, sqn_hn - 1, self.sname, None, pk_hn, self.ind_bits, self.age_limit) for supi, k, sqn_hn in records]
+        arrivals = queue.Queue()
+        threads = [threading.Thread(target=self.simulate, args=(ue, arrivals), daemon=True) for ue in ues]
+
+        level = eventLog.getLevel()
+        eventLog.setLevel(log_level)
+        instrumentation.reset()
+        instrumentation.enable()
+        try:
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            if self.hn_processes and self.restart_hn:
+                threading.Thread(target=self.restartHalfway, args=(hn.pid,), daemon=True).start()
+            self.schedule(arrivals, start)
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+        finally:
+            instrumentation.disable()
+            eventLog.flush()
+            eventLog.setLevel(level)
+            hn.terminate()
+            sn.terminate()
+            try:
+                servingNetwork = snStats.get(timeout=5)
+            except queue.Empty:
+                servingNetwork = {}
+            hn.join()
+            sn.join()
+
+        completed = sum(self.outcomes.values())
+        histograms = instrumentation.snapshot()
+        return {
+            "subscribers": self.subscribers,
+            "hn_processes": self.hn_processes,
+            "ind_bits": self.ind_bits,
+            "attaches": completed,
+            "elapsed_s": round(elapsed, 3),
+            "attaches_per_s": round(completed / elapsed, 2) if elapsed else 0.0,
+            "outcomes": dict(self.outcomes),
+            "unexpected_outcomes": self.unexpected,
+            "resyncs": self.outcomes.get('Sync_Failure', 0),
+            "errors": self.errors,
+            "serving_network": servingNetwork,
+            "phases": {name: histograms[name] for name in PHASES if name in histograms},
+        }
+
+    def restartHalfway(self, pid):
+        """
+        Ask the HN cluster to restart its workers once half of the attaches are done.
+
+        Parameters:
+            pid (int): Process of the HN cluster
+        """
+        while True:
+            with self.lock:
+                done = sum(self.outcomes.values()) + self.errors
+            if done >= self.attaches / 2:
+                os.kill(pid, signal.SIGHUP)
+                return
+            time.sleep(0.01)
+
+    def schedule(self, arrivals, start):
+        """
+        Release the attaches, Poisson arrivals at rate or all at once in a closed loop.
+
+        Parameters:
+            arrivals (Queue): Arrival times consumed by the subscribers
+            start (float): Start of the run (perf_counter)
+        """
+        at = start
+        for _ in range(self.attaches):
+            if self.rate > 0:
+                at += self.random.expovariate(self.rate)
+                delay = at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            arrivals.put(at)
+        for _ in range(self.subscribers):
+            arrivals.put(None)
+
+    def simulate(self, ue, arrivals):
+        """
+        Attach one simulated subscriber for every arrival it picks up.
+
+        Parameters:
+            ue (Subscriber): Simulated subscriber, keeps its SQN between attaches
+            arrivals (Queue): Arrival times, None to stop
+        """
+        while True:
+            arrival = arrivals.get()
+            if arrival is None:
+                return
+            with self.lock:
+                draw = self.random.random()
+            k = ue.k
+            if draw < self.mac_failure:
+                expected = 'Mac_Failure'
+                ue.k = crypto.getKey(True)
+            elif draw < self.mac_failure + self.sync_failure:
+                expected = 'Sync_Failure'
+                # Push the UE ahead of the HN, the HN resynchronizes to it
+                ue.sqn_ue += 1000
+            else:
+                expected = None
+            reordered = expected is None and draw < self.mac_failure + self.sync_failure + self.reorder
+
+            begin = time.perf_counter()
+            if self.rate > 0:
+                instrumentation.record("attach.wait", max(0.0, begin - arrival))
+            try:
+                outcomes = self.attachReordered(ue) if reordered else self.attach(ue)
+            except (OSError, EOFError):
+                with self.lock:
+                    self.errors += 1
+                continue
+            finally:
+                ue.k = k
+            instrumentation.record("attach.total", time.perf_counter() - begin)
+            with self.lock:
+                for outcome in outcomes:
+                    self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+                    if outcome != (expected or 'RES*'):
+                        self.unexpected += 1
+
+    def attach(self, ue):
+        """
+        Run one attach.
+
+        Parameters:
+            ue (Subscriber): Simulated subscriber
+
+        Returns:
+            list: Message sent by the subscriber at the end of the attach
+        """
+        ue.connect(self.port_sn)
+        return [ue.connectSN()]
+
+    def attachReordered(self, ue):
+        """
+        Run two interleaved attaches and answer the second challenge first, as
+        when vectors held by different SNs reach the subscriber out of order.
+
+        Parameters:
+            ue (Subscriber): Simulated subscriber
+
+        Returns:
+            list: Messages sent by the subscriber at the end of both attaches
+        """
+        ue.connect(self.port_sn)
+        first = ue.sckt2sn
+        try:
+            r1, autn1 = ue.challenge()
+            ue.connect(self.port_sn)
+            r2, autn2 = ue.challenge()
+            outcomes = [ue.respond(r2, autn2)]
+        finally:
+            ue.sckt2sn = first
+        outcomes.append(ue.respond(r1, autn1))
+        return outcomes
+
+
+def printReport(report):
+    print(f"{report['attaches']} attaches by {report['subscribers']} subscribers in {report['elapsed_s']} s: {report['attaches_per_s']} attaches/s")
+    print(f"outcomes: {report['outcomes']}, unexpected: {report['unexpected_outcomes']}, errors: {report['errors']}")
+    print(f"resyncs: {report['resyncs']} with {report['ind_bits']} IND bits")
+    sn = report["serving_network"]
+    if sn:
+        print(f"SN: {sn['full']} full and {sn['reauth']} GUTI attaches, {sn['hn_requests']} HN requests")
+    if "cache" in sn:
+        print(f"AV cache: {sn['cache']}")
+    print(f"{'phase':<20}{'count':>8}{'mean':>10}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}  (ms)")
+    for name, h in report["phases"].items():
+        print(f"{name:<20}{h['count']:>8}{h['mean_ms']:>10.2f}{h['p50_ms']:>10.2f}{h['p90_ms']:>10.2f}{h['p99_ms']:>10.2f}{h['max_ms']:>10.2f}")
+    for name, h in report["phases"].items():
+        print(f"\n{name}")
+        peak = max(h["buckets_us"].values())
+        for bound, n in h["buckets_us"].items():
+            label = f"<= {bound} us" if bound != "inf" else "> 500 s"
+            print(f"  {label:>16} {n:>7} {'#' * max(1, round(40 * n / peak))}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="End-to-end 5G AKA load generator")
+    parser.add_argument("--subscribers", type=int, default=10, help="concurrent simulated subscribers")
+    parser.add_argument("--attaches", type=int, default=200, help="total number of attaches")
+    parser.add_argument("--rate", type=float, default=0.0, help="Poisson arrival rate in attaches/s, 0 for a closed loop")
+    parser.add_argument("--sync-failure", type=float, default=0.0, help="fraction of attaches forced into Sync_Failure")
+    parser.add_argument("--mac-failure", type=float, default=0.0, help="fraction of attaches forced into Mac_Failure")
+    parser.add_argument("--reorder", type=float, default=0.0, help="fraction of arrivals answering two interleaved challenges out of order")
+    parser.add_argument("--ind-bits", type=int, default=sqnArray.IND_BITS, help="IND bits in SQN, 0 for the plain increasing SQN")
+    parser.add_argument("--age-limit", type=int, default=sqnArray.AGE_LIMIT, help="largest age in SEQ steps of an accepted SQN")
+    parser.add_argument("--av-batch", type=int, default=0, help="vectors the SN requests from the HN at a time and caches, 0 to relay every attach")
+    parser.add_argument("--av-capacity", type=int, default=10000, help="largest number of vectors cached by the SN")
+    parser.add_argument("--av-lifetime", type=float, default=300.0, help="seconds after which a cached vector is discarded")
+    parser.add_argument("--hn-processes", type=int, default=0, help="HN worker processes sharing the port, 0 for a single HomeNetwork")
+    parser.add_argument("--restart-hn", action="store_true", help="restart every HN worker once half of the attaches are done")
+    parser.add_argument("--workers", type=int, default=0, help="SUCI deconcealment processes in the HN")
+    parser.add_argument("--port-hn", type=int, default=1070)
+    parser.add_argument("--port-sn", type=int, default=8080)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", help="also write the report to this JSON file")
+    parser.add_argument("--log-level", choices=eventLog.LEVELS, default="off", help="minimum level of the logged protocol events")
+    args = parser.parse_args()
+
+    generator = LoadGenerator(args.subscribers, args.attaches, args.rate, args.sync_failure, args.mac_failure,
+                              args.port_hn, args.port_sn, seed=args.seed, reorder=args.reorder,
+                              ind_bits=args.ind_bits, age_limit=args.age_limit,
+                              av_batch=args.av_batch, av_capacity=args.av_capacity, av_lifetime=args.av_lifetime,
+                              hn_processes=args.hn_processes, restart_hn=args.restart_hn)
+    report = generator.run(args.workers, args.log_level)
+    printReport(report)
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(report, file, indent=2)
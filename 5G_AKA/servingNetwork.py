@@ -2,33 +2,56 @@
 import socket
 import sys
 import pickle
+import threading
+import argparse
+import os
 import crypto
-import datetime
+import authVectors
+import eventLog
+
+log = eventLog.getLogger("sn")
 
 class ServingNetwork:
-    def __init__(self, sname, suci, port):
+    def __init__(self, sname, suci, port, port_hn=1070, cache=None, batch=8):
         """
         Initialize the ServingNetwork class.
 
+        With a cache, the SN asks the Home Network for batch vectors on a full
+        authentication and keeps the unused ones. The subscriber then gets a
+        GUTI, and its next attaches with that GUTI are authenticated with a
+        cached vector without contacting the Home Network.
+
         Parameters:
             sname (str): Serving network name
             suci (str): Subscriber Concealed Identifier
             port (int): Port number for communication
+            port_hn (int): Port number for Home Network
+            cache (AVCache): Cache of unused authentication vectors, None to relay every attach
+            batch (int): Vectors requested from the Home Network at a time when caching
         """
         self.sname = sname
         self.suci = suci
         self.port = port
+        self.port_hn = port_hn
+        self.cache = cache
+        self.batch = batch
+
+        # GUTI assigned to every subscriber authenticated while caching, both ways
+        self.gutis = {}
+        self.gutiBySupi = {}
+        self.lock = threading.Lock()
+        self.counters = {"full": 0, "reauth": 0, "hn_requests": 0, "resyncs": 0}
 
         # Establish socket and wait for sub (subscriber) connection
         try:
             self.sckt_sn = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.sckt_sn.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             self.sckt_sn.bind(('127.0.0.1', port))
-            self.sckt_sn.listen(10)
+            self.sckt_sn.listen(socket.SOMAXCONN)
         except socket.error as msg:
-            print(msg)
+            log.error("Socket error", error=msg)
             sys.exit(1)
-        print("\033[1;32m", datetime.datetime.now().strftime("%F %T"), "\033[0m", " [Waiting for subscriber to connect...]")
+        log.info("Waiting for subscriber to connect...")
         
     def connectHN(self, port_hn):
         """
@@ -36,64 +59,256 @@ class ServingNetwork:
 
         Parameters:
             port_hn (int): Port number for Home Network
+
+        Returns:
+            socket: Connection to the Home Network
         """
         try:
             self.sckt2hn = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.sckt2hn.connect(('127.0.0.1', port_hn))
         except socket.error as msg:
-            print(msg)
+            log.error("Socket error", error=msg)
             sys.exit(1)
+        return self.sckt2hn
 
     def transfer(self):
         """
         Handle communication between the subscriber and the Home Network.
         """
-        # Receive SUCI from subscriber
         conn, addr = self.sckt_sn.accept()
-        suci = pickle.loads(conn.recv(1024 * 2))
-        print("\033[1;32m", datetime.datetime.now().strftime("%F %T"), "\033[0m", f" [Received SUCI from subscriber] suci: {suci}")
+        self.handleSubscriber(conn)
+
+    def serve(self):
+        """
+        Serve subscribers until the listening socket is closed, one thread per session.
+        """
+        while True:
+            try:
+                conn, addr = self.sckt_sn.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.handleSubscriber, args=(conn,), daemon=True).start()
+
+    def shutdown(self):
+        """
+        Stop serving by closing the listening socket.
+        """
+        self.sckt_sn.close()
+
+    def handleSubscriber(self, conn):
+        """
+        Serve one subscriber session, relaying it to the Home Network when needed.
+
+        Parameters:
+            conn (socket): Connection from the subscriber
+        """
+        try:
+            identity = pickle.loads(conn.recv(1024 * 2))
+            if isinstance(identity, tuple) and identity[0] == 'GUTI':
+                with self.lock:
+                    supi = self.gutis.get(identity[1])
+                if supi is not None:
+                    self.reauthenticate(conn, supi, identity[1])
+                    return
+                # Unknown GUTI, ask the subscriber for its SUCI
+                conn.send(pickle.dumps(('IDENTITY',)))
+                identity = pickle.loads(conn.recv(1024 * 2))
+        except (EOFError, OSError) as msg:
+            log.warning("Connection interrupted", error=msg)
+            conn.close()
+            return
+        self.relaySession(conn, identity)
+
+    def relaySession(self, conn, suci):
+        """
+        Relay a full authentication to the Home Network.
+
+        Parameters:
+            conn (socket): Connection from the subscriber
+            suci (bytes): Subscriber Concealed Identifier
+        """
+        try:
+            sckt2hn = socket.create_connection(('127.0.0.1', self.port_hn))
+        except socket.error as msg:
+            log.error("Socket error", error=msg)
+            conn.close()
+            return
+        try:
+            self.relay(conn, sckt2hn, suci)
+        except (EOFError, OSError) as msg:
+            log.warning("Connection interrupted", error=msg)
+        finally:
+            conn.close()
+            sckt2hn.close()
+
+    def relay(self, conn, sckt2hn, suci):
+        """
+        Relay the authentication messages of one session.
+
+        Parameters:
+            conn (socket): Connection from the subscriber
+            sckt2hn (socket): Connection to the Home Network
+            suci (bytes): Subscriber Concealed Identifier received from the subscriber
+        """
+        log.info("Received SUCI from subscriber", suci=suci)
+        with self.lock:
+            self.counters["full"] += 1
+            self.counters["hn_requests"] += 1
 
         # Send SUCI and sname to Home Network
-        self.connectHN(1070)
-        self.sckt2hn.send(pickle.dumps((suci, self.sname)))
-        print("\033[1;32m", datetime.datetime.now().strftime("%F %T"), "\033[0m", f" [Sent SUCI and sname to HN] suci: {suci}, sname: {self.sname}")
+        if self.cache is None:
+            sckt2hn.send(pickle.dumps((suci, self.sname)))
+        else:
+            sckt2hn.send(pickle.dumps(('AV_REQ', suci, self.sname, self.batch)))
+        log.info("Sent SUCI and sname to HN", suci=suci, sname=self.sname)
 
         # Receive R, AUTN, HXRES*, K_SEAF from Home Network
-        r, autn, hxres_star, k_seaf = pickle.loads(self.sckt2hn.recv(1024))
-        print("\033[1;32m", datetime.datetime.now().strftime("%F %T"), "\033[0m", f" [Received R, AUTN, HXRES*, K_SEAF from HN] R: {r}, \nAUTN: {autn}, \nHXRES*: {hxres_star}, \nK_SEAF: {k_seaf}")
+        if self.cache is None:
+            r, autn, hxres_star, k_seaf = pickle.loads(sckt2hn.recv(1024))
+            spare = []
+        else:
+            (r, autn, hxres_star, k_seaf), *spare = authVectors.recvVectors(sckt2hn)
+        log.info("Received R, AUTN, HXRES*, K_SEAF from HN", R=r, AUTN=autn, HXRES_star=hxres_star, K_SEAF=k_seaf)
 
         # Send R and AUTN to subscriber
         conn.send(pickle.dumps((r, autn)))
-        print("\033[1;32m", datetime.datetime.now().strftime("%F %T"), "\033[0m", f" [Sent R and AUTN to subscriber] R: {r}, AUTN: {autn}")
+        log.info("Sent R and AUTN to subscriber", R=r, AUTN=autn)
 
         # Receive response from subscriber
         package = pickle.loads(conn.recv(1024 * 2))
-        print("\033[1;32m", datetime.datetime.now().strftime("%F %T"), "\033[0m", f" [Received response from subscriber] package: {package}")
+        log.info("Received response from subscriber", package=package)
 
         # Handle different types of responses
         if package[0] == 'Mac_Failure':
-            print("\033[1;31m", datetime.datetime.now().strftime("%F %T"), "\033[0m", " [Mac_Failure] Abort")
+            log.warning("Mac_Failure", action="Abort")
         
         elif package[0] == 'Sync_Failure':
             auts = package[1]
-            self.sckt2hn.send(pickle.dumps(('Sync_Failure', auts, r, suci)))
-            print("\033[1;31m", datetime.datetime.now().strftime("%F %T"), "\033[0m", f" [Sent 'Sync_Failure', AUTS, R, SUCI to HN] AUTS: {auts}, \nR: {r}, \nsuci: {suci}")
+            sckt2hn.send(pickle.dumps(('Sync_Failure', auts, r, suci)))
+            log.warning("Sent 'Sync_Failure', AUTS, R, SUCI to HN", AUTS=auts, R=r, suci=suci)
+            with self.lock:
+                self.counters["resyncs"] += 1
+            # Wait for the HN to close the session so the resynchronization is in place before the next attach
+            sckt2hn.recv(1)
+            # The spare vectors were generated before the resynchronization and are dropped
 
         elif package[0] == 'RES*':
             res_star = package[1]
-            print("\033[1;32m", datetime.datetime.now().strftime("%F %T"), "\033[0m", f" [Received RES*] RES*: {res_star}")
+            log.info("Received RES*", RES_star=res_star)
             if crypto.getsha256(r, res_star) != hxres_star:
-                print("\033[1;31m", datetime.datetime.now().strftime("%F %T"), "\033[0m", " [SHA256(<R, RES*>) != HXRES*] Abort")
-                sys.exit(1)
+                log.warning("SHA256(<R, RES*>) != HXRES*", action="Abort")
             else:
-                self.sckt2hn.send(pickle.dumps(('RES*', res_star, suci)))
-                print("\033[1;32m", datetime.datetime.now().strftime("%F %T"), "\033[0m", f" [Sent RES* and suci to HN] RES*: {res_star}, suci: {suci}")
-                supi = pickle.loads(self.sckt2hn.recv(1024 * 2))
-                print("\033[1;32m", datetime.datetime.now().strftime("%F %T"), "\033[0m", f" [Received SUPI from HN] supi: {supi}")
+                sckt2hn.send(pickle.dumps(('RES*', res_star, suci)))
+                log.info("Sent RES* and suci to HN", RES_star=res_star, suci=suci)
+                supi = pickle.loads(sckt2hn.recv(1024 * 2))
+                log.info("Received SUPI from HN", supi=supi)
+                if self.cache is not None:
+                    self.cache.put(supi, spare)
+                    conn.send(pickle.dumps(('GUTI', self.assignGUTI(supi))))
+
+    def reauthenticate(self, conn, supi, guti):
+        """
+        Authenticate a subscriber known by its GUTI, with a cached vector when one is held.
+
+        Parameters:
+            conn (socket): Connection from the subscriber
+            supi (str): Subscriber Permanent Identifier
+            guti (str): GUTI sent by the subscriber
+        """
+        try:
+            with self.lock:
+                self.counters["reauth"] += 1
+            vector = self.cache.pop(supi)
+            if vector is None:
+                vectors = self.requestVectors(supi)
+                if not vectors:
+                    log.warning("No vectors from HN", supi=supi, action="Abort")
+                    return
+                vector = vectors[0]
+                self.cache.put(supi, vectors[1:])
+            r, autn, hxres_star, k_seaf = vector
+
+            conn.send(pickle.dumps((r, autn)))
+            log.info("Sent R and AUTN to subscriber", R=r, AUTN=autn, GUTI=guti)
+            package = pickle.loads(conn.recv(1024 * 2))
+            log.info("Received response from subscriber", package=package)
+
+            if package[0] == 'Mac_Failure':
+                log.warning("Mac_Failure", action="Abort")
+            elif package[0] == 'Sync_Failure':
+                # Every cached vector of the subscriber is older than the resynchronized SQN
+                dropped = self.cache.invalidate(supi)
+                log.warning("Sync_Failure on a cached vector", supi=supi, dropped=dropped)
+                with self.lock:
+                    self.counters["resyncs"] += 1
+                    self.counters["hn_requests"] += 1
+                with socket.create_connection(('127.0.0.1', self.port_hn)) as sckt2hn:
+                    sckt2hn.send(pickle.dumps(('RESYNC', supi, r, package[1])))
+                    # Wait for the HN to close the session so the resynchronization is in place before the next attach
+                    sckt2hn.recv(1)
+            elif package[0] == 'RES*':
+                if crypto.getsha256(r, package[1]) != hxres_star:
+                    log.warning("SHA256(<R, RES*>) != HXRES*", action="Abort")
+                else:
+                    log.info("Authenticated with a cached vector", supi=supi)
+                    conn.send(pickle.dumps(('GUTI', guti)))
+        except (EOFError, OSError) as msg:
+            log.warning("Connection interrupted", error=msg)
+        finally:
+            conn.close()
 
-        conn.close()
-        self.sckt2hn.close()
+    def requestVectors(self, supi):
+        """
+        Request a batch of vectors of an identified subscriber from the Home Network.
+
+        Parameters:
+            supi (str): Subscriber Permanent Identifier
+
+        Returns:
+            list: Vectors (r, autn, hxres_star, k_seaf), empty if the Home Network refused
+        """
+        with self.lock:
+            self.counters["hn_requests"] += 1
+        with socket.create_connection(('127.0.0.1', self.port_hn)) as sckt2hn:
+            sckt2hn.send(pickle.dumps(('AV_REQ_SUPI', supi, self.sname, self.batch)))
+            return authVectors.recvVectors(sckt2hn)
+
+    def assignGUTI(self, supi):
+        """
+        Assign a new GUTI to an authenticated subscriber, replacing its previous one.
+
+        Parameters:
+            supi (str): Subscriber Permanent Identifier
+
+        Returns:
+            str: GUTI
+        """
+        guti = os.urandom(8).hex()
+        with self.lock:
+            self.gutis.pop(self.gutiBySupi.get(supi), None)
+            self.gutis[guti] = supi
+            self.gutiBySupi[supi] = guti
+        return guti
+
+    def stats(self):
+        """
+        Report how attaches were served.
+
+        Returns:
+            dict: Full and GUTI attaches, requests and resyncs sent to the Home Network, and the cache counters
+        """
+        with self.lock:
+            stats = dict(self.counters)
+        if self.cache is not None:
+            stats["cache"] = self.cache.stats()
+        return stats
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="5G AKA Serving Network")
+    parser.add_argument("--log-level", choices=eventLog.LEVELS, default="info", help="minimum level of the logged protocol events")
+    parser.add_argument("--log-json", help="also write the protocol events to this JSON lines file")
+    args = parser.parse_args()
+    eventLog.configure(args.log_level, args.log_json)
+
     sn = ServingNetwork("sname_100", "suci", 8080)
     sn.transfer()
@@ -0,0 +1,109 @@
+# sqnArray.py
+# Sequence numbers with index bits and an array of accepted values, after
+# 3GPP TS 33.102 Annex C. A SQN is SEQ || IND, IND being its ind_bits least
+# significant bits. The HN increments SEQ and cycles IND for every vector,
+# and the UE keeps the highest accepted SQN of every IND value, so vectors
+# delivered out of order are still accepted as long as they are fresh.
+
+# Number of IND bits, 0 for the plain increasing SQN
+IND_BITS = 5
+# Largest distance in SEQ steps between the highest accepted SQN and an older one that is still accepted
+AGE_LIMIT = 64
+# Largest jump in SEQ steps above the highest accepted SQN, to resist wrap around
+DELTA = 1 << 28
+
+
+def split(sqn, ind_bits=IND_BITS):
+    """
+    Split a sequence number into its SEQ and IND parts.
+
+    Parameters:
+        sqn (int): Sequence number
+        ind_bits (int): Number of IND bits
+
+    Returns:
+        tuple: SEQ (int), IND (int)
+    """
+    return sqn >> ind_bits, sqn & ((1 << ind_bits) - 1)
+
+
+def advance(sqn, n=1, ind_bits=IND_BITS):
+    """
+    Sequence number issued by the HN n vectors after sqn: SEQ grows by n and
+    IND cycles through its values.
+
+    Parameters:
+        sqn (int): Sequence number
+        n (int): Number of vectors
+        ind_bits (int): Number of IND bits
+
+    Returns:
+        int: Sequence number
+    """
+    seq, ind = split(sqn, ind_bits)
+    return ((seq + n) << ind_bits) | ((ind + n) & ((1 << ind_bits) - 1))
+
+
+class SqnArray:
+    def __init__(self, sqn, ind_bits=IND_BITS, age_limit=AGE_LIMIT, delta=DELTA):
+        """
+        Initialize the SqnArray class.
+
+        Every entry starts at sqn, so only sequence numbers above it are
+        accepted at first. With ind_bits 0 the array has a single entry and
+        behaves like the plain increasing SQN.
+
+        Parameters:
+            sqn (int): Highest sequence number accepted so far
+            ind_bits (int): Number of IND bits
+            age_limit (int): Largest age in SEQ steps of an accepted sequence number
+            delta (int): Largest jump in SEQ steps above the highest accepted sequence number
+        """
+        self.ind_bits = ind_bits
+        self.age_limit = age_limit
+        self.delta = delta
+        self.reset(sqn)
+
+    def reset(self, sqn):
+        """
+        Forget the accepted sequence numbers and only accept the ones above sqn.
+
+        Parameters:
+            sqn (int): Highest sequence number accepted so far
+        """
+        self.entries = [sqn] * (1 << self.ind_bits)
+        self.highest = sqn
+
+    def check(self, sqn):
+        """
+        Check if a sequence number is fresh, without accepting it.
+
+        Parameters:
+            sqn (int): Sequence number
+
+        Returns:
+            bool: True if the sequence number would be accepted
+        """
+        seq, ind = split(sqn, self.ind_bits)
+        seq_ms = self.highest >> self.ind_bits
+        if sqn <= self.entries[ind]:
+            return False
+        if seq - seq_ms > self.delta:
+            return False
+        return seq_ms - seq <= self.age_limit
+
+    def accept(self, sqn):
+        """
+        Accept a sequence number if it is fresh.
+
+        Parameters:
+            sqn (int): Sequence number
+
+        Returns:
+            bool: True if the sequence number was accepted
+        """
+        if not self.check(sqn):
+            return False
+        self.entries[split(sqn, self.ind_bits)[1]] = sqn
+        self.highest = max(self.highest, sqn)
+        return True
@@ -3,12 +3,16 @@ import socket
 import sys
 import pickle
 import crypto
-import datetime
+import sqnArray
 from ecies import encrypt
-import time
+import argparse
+import instrumentation
+import eventLog
+
+log = eventLog.getLogger("ue")
 
 class Subscriber:
-    def __init__(self, k, supi, sqn_ue, sname, port_sn, hn_pk):
+    def __init__(self, k, supi, sqn_ue, sname, port_sn, hn_pk, ind_bits=sqnArray.IND_BITS, age_limit=sqnArray.AGE_LIMIT):
         """
         Initialize the Subscriber class.
 
@@ -17,58 +21,134 @@ class Subscriber:
             supi (str): Subscriber Permanent Identifier
             sqn_ue (int): Sequence number for User Equipment
             sname (str): Serving network name
-            port_sn (int): Port number for Serving Network
+            port_sn (int): Port number for Serving Network, None for an offline instance
             hn_pk (bytes): Public key for Home Network
+            ind_bits (int): Number of IND bits in SQN, must match the Home Network
+            age_limit (int): Largest age in SEQ steps of an accepted SQN
         """
         self.k = k
         self.supi = supi
-        self.sqn_ue = sqn_ue
+        self.sqn = sqnArray.SqnArray(sqn_ue, ind_bits, age_limit)
+        # Temporary identity assigned by a Serving Network caching vectors
+        self.guti = None
         self.sname = sname
         self.port_sn = port_sn
         self.hn_pk = hn_pk
+        if port_sn is None:
+            return
 
         # Connect to Serving Network
         try:
-            self.sckt2sn = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.sckt2sn.connect(('127.0.0.1', port_sn))
-            print("\033[1;32m", datetime.datetime.now().strftime("%F %T"), "\033[0m", " [Connected to Serving Network]")
+            self.connect()
         except socket.error as msg:
-            print(msg)
+            log.error("Socket error", error=msg)
             sys.exit(1)
-    
+
+    def connect(self, port_sn=None):
+        """
+        Open a connection to the Serving Network.
+
+        Parameters:
+            port_sn (int): Port number for Serving Network (default: the one given at initialization)
+        """
+        if port_sn is not None:
+            self.port_sn = port_sn
+        self.sckt2sn = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sckt2sn.connect(('127.0.0.1', self.port_sn))
+        log.info("Connected to Serving Network")
+
+    @property
+    def sqn_ue(self):
+        return self.sqn.highest
+
+    @sqn_ue.setter
+    def sqn_ue(self, sqn_ue):
+        self.sqn.reset(sqn_ue)
+
     def connectSN(self):
         """
         Connect to the Serving Network and handle the authentication process.
+
+        Returns:
+            str: Message sent to the Serving Network ('RES*', 'Sync_Failure' or 'Mac_Failure')
+        """
+        r, autn = self.challenge()
+        return self.respond(r, autn)
+
+    def challenge(self):
         """
-        # Initialize by sending SUCI
-        suci = self.getSUCI()
-        self.sckt2sn.send(pickle.dumps(suci))
-        print("\033[1;32m", datetime.datetime.now().strftime("%F %T"), "\033[0m", f" [Sent SUCI] suci: {suci}")
+        Send the SUCI (or the GUTI if one was assigned) on the open connection
+        and receive the challenge.
+
+        Returns:
+            tuple: Random value (r), Authentication token (autn)
+        """
+        if self.guti is not None:
+            with instrumentation.timer("ue.phase.challenge"):
+                self.sckt2sn.send(pickle.dumps(('GUTI', self.guti)))
+                log.info("Sent GUTI", guti=self.guti)
+                reply = pickle.loads(self.sckt2sn.recv(1024 * 2))
+            if reply == ('IDENTITY',):
+                # The Serving Network does not know the GUTI any more
+                self.guti = None
+
+        if self.guti is None:
+            # Initialize by sending SUCI
+            with instrumentation.timer("ue.phase.suci"):
+                suci = self.getSUCI()
+            with instrumentation.timer("ue.phase.challenge"):
+                self.sckt2sn.send(pickle.dumps(suci))
+                log.info("Sent SUCI", suci=suci)
+                reply = pickle.loads(self.sckt2sn.recv(1024 * 2))
 
         # Receive R and AUTN
-        r, autn = pickle.loads(self.sckt2sn.recv(1024 * 2))
-        print("\033[1;32m", datetime.datetime.now().strftime("%F %T"), "\033[0m", f" [Received R and AUTN] R: {r}, \nAUTN: {autn}")
-
-        # Verify the received data
-        i, ii, xsqn_hn = self.verify(self.k, r, autn)
-        print("\033[1;32m", datetime.datetime.now().strftime("%F %T"), "\033[0m", f" [Verification result] i: {i}, ii: {ii}")
-
-        # Handle verification result
-        if i and ii:
-            self.sqn_ue = xsqn_hn
-            res_star = self.getRES_star(self.k, r, self.sname)
-            self.sckt2sn.send(pickle.dumps(('RES*', res_star)))
-            print("\033[1;32m", datetime.datetime.now().strftime("%F %T"), "\033[0m", f" [Sent RES*] RES*: {res_star}")
-        elif i and not ii:
-            auts = self.getAUTS(self.k, self.sqn_ue, r)
-            self.sckt2sn.send(pickle.dumps(('Sync_Failure', auts)))
-            print("\033[1;31m", datetime.datetime.now().strftime("%F %T"), "\033[0m", f" [Sent 'Sync_Failure', AUTS] AUTS: {auts}")
-        elif not i:
-            self.sckt2sn.send(pickle.dumps(('Mac_Failure',)))
-            print("\033[1;31m", datetime.datetime.now().strftime("%F %T"), "\033[0m", f" [Sent 'Mac_Failure']")
+        r, autn = reply
+        log.info("Received R and AUTN", R=r, AUTN=autn)
+        return r, autn
+
+    def respond(self, r, autn):
+        """
+        Answer a challenge received by challenge() on the open connection and close it.
+
+        Parameters:
+            r (bytes): Random value
+            autn (tuple): Authentication token (conc, mac)
+
+        Returns:
+            str: Message sent to the Serving Network ('RES*', 'Sync_Failure' or 'Mac_Failure')
+        """
+        with instrumentation.timer("ue.phase.response"):
+            # Verify the received data
+            i, ii, xsqn_hn = self.verify(self.k, r, autn)
+            log.info("Verification result", i=i, ii=ii)
+
+            # Handle verification result
+            if i and ii:
+                self.sqn.accept(xsqn_hn)
+                res_star = self.getRES_star(self.k, r, self.sname)
+                message = ('RES*', res_star)
+                log.info("Sent RES*", RES_star=res_star)
+            elif i and not ii:
+                auts = self.getAUTS(self.k, self.sqn_ue, r)
+                message = ('Sync_Failure', auts)
+                log.warning("Sent 'Sync_Failure', AUTS", AUTS=auts)
+            else:
+                message = ('Mac_Failure',)
+                log.warning("Sent 'Mac_Failure'")
+
+        with instrumentation.timer("ue.phase.confirm"):
+            self.sckt2sn.send(pickle.dumps(message))
+            # The Serving Network closes the session once the Home Network has answered,
+            # after assigning a GUTI if it caches vectors
+            reply = self.sckt2sn.recv(1024)
+            if reply:
+                self.guti = pickle.loads(reply)[1]
+                log.info("Received GUTI", guti=self.guti)
 
         self.sckt2sn.close()
+        return message[0]
 
+    @instrumentation.timed("ue.getSUCI")
     def getSUCI(self):
         """
         Encrypt the SUPI to get the SUCI.
@@ -76,17 +156,12 @@ class Subscriber:
         Returns:
             bytes: Encrypted SUCI
         """
-        start_time = time.time()
-        for _ in range(1000):
-            suci = self.supi
-            suci_enc = encrypt(self.hn_pk, suci.encode('utf-8'))
-        end_time = time.time()
-        total_elapsed_time = end_time - start_time
-        average_time_per_challenge = (total_elapsed_time / 1000) * 1000  # Convert to milliseconds
-        formatted_time = f"{average_time_per_challenge:.2f} ms"
-        print(f"UEgetSUCI execution time: {formatted_time}")
+        suci = self.supi
+        instrumentation.count("ecies_encrypt")
+        suci_enc = encrypt(self.hn_pk, suci.encode('utf-8'))
         return suci_enc
 
+    @instrumentation.timed("ue.verify")
     def verify(self, k, r, autn):
         """
         Verify the AUTN value.
@@ -99,23 +174,17 @@ class Subscriber:
         Returns:
             tuple: Verification result (bool, bool, int)
         """
-        start_time = time.time()
-        for _ in range(1000):
-            xconc = autn[0]
-            xmac = autn[1]
-            ak = crypto.fun5(k, r)
-            bxsqn_hn = crypto.getXOR(ak, xconc)
-            xsqn_hn = int.from_bytes(bxsqn_hn, byteorder='little')
-            mac = crypto.fun1(k, xsqn_hn, r)
-            i = xmac == mac
-            ii = self.sqn_ue < xsqn_hn
-        end_time = time.time()
-        total_elapsed_time = end_time - start_time
-        average_time_per_challenge = (total_elapsed_time / 1000) * 1000  # Convert to milliseconds
-        formatted_time = f"{average_time_per_challenge:.2f} ms"
-        print(f"UEverify execution time: {formatted_time}")
+        xconc = autn[0]
+        xmac = autn[1]
+        ak = crypto.fun5(k, r)
+        bxsqn_hn = crypto.getXOR(ak, xconc)
+        xsqn_hn = int.from_bytes(bxsqn_hn, byteorder='little')
+        mac = crypto.fun1(k, xsqn_hn, r)
+        i = xmac == mac
+        ii = self.sqn.check(xsqn_hn)
         return i, ii, xsqn_hn
 
+    @instrumentation.timed("ue.getRES_star")
     def getRES_star(self, k, r, sname):
         """
         Generate the RES* value.
@@ -128,16 +197,10 @@ class Subscriber:
         Returns:
             bytes: RES* value
         """
-        start_time = time.time()
-        for _ in range(1000):
-            cha = crypto.challenge(k, r, sname)
-        end_time = time.time()
-        total_elapsed_time = end_time - start_time
-        average_time_per_challenge = (total_elapsed_time / 1000) * 1000  # Convert to milliseconds
-        formatted_time = f"{average_time_per_challenge:.2f} ms"
-        print(f"getRES_star execution time: {formatted_time}")
+        cha = crypto.challenge(k, r, sname)
         return cha
 
+    @instrumentation.timed("ue.getAUTS")
     def getAUTS(self, k, sqn_ue, r):
         """
         Generate the AUTS value.
@@ -150,19 +213,41 @@ class Subscriber:
         Returns:
             tuple: AUTS value (conc_star, macs)
         """
-        start_time = time.time()
-        for _ in range(1000):
-            macs = crypto.fun1_star(k, sqn_ue, r)
-            ak_star = crypto.fun5_star(k, r)
-            bsqn_ue = sqn_ue.to_bytes(256, byteorder='little')
-            conc_star = crypto.getXOR(bsqn_ue, ak_star)
-        end_time = time.time()
-        elapsed_time = (end_time - start_time)
-        formatted_time = f"{elapsed_time:.2f} ms"
-        print(f"getAUTS execution time: {formatted_time}")
+        macs = crypto.fun1_star(k, sqn_ue, r)
+        ak_star = crypto.fun5_star(k, r)
+        bsqn_ue = sqn_ue.to_bytes(256, byteorder='little')
+        conc_star = crypto.getXOR(bsqn_ue, ak_star)
         return (conc_star, macs)
 
+def benchmark(iterations, pk_hn):
+    """
+    Benchmark mode: time each Subscriber operation offline.
+
+    Parameters:
+        iterations (int): Number of runs per operation
+        pk_hn (bytes): Public key for Home Network
+    """
+    k = crypto.getKey()
+    sqn_hn = 100
+    scb = Subscriber(k, "supi", 99, "sname_100", None, pk_hn)
+    r = crypto.getRandom(256)
+    ak = crypto.fun5(k, r)
+    autn = (crypto.getXOR(sqn_hn.to_bytes(256, byteorder='little'), ak), crypto.fun1(k, sqn_hn, r))
+    instrumentation.benchmark(scb.getSUCI, iterations=iterations, name="UEgetSUCI")
+    instrumentation.benchmark(scb.verify, k, r, autn, iterations=iterations, name="UEverify")
+    instrumentation.benchmark(scb.getRES_star, k, r, scb.sname, iterations=iterations)
+    instrumentation.benchmark(scb.getAUTS, k, scb.sqn_ue, r, iterations=iterations)
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="5G AKA Subscriber")
+    parser.add_argument("--benchmark", action="store_true", help="time each operation offline instead of attaching")
+    parser.add_argument("--iterations", type=int, default=1000, help="runs per operation in benchmark mode")
+    parser.add_argument("--metrics", help="record per-operation timings and write them to this JSON file")
+    parser.add_argument("--log-level", choices=eventLog.LEVELS, default="info", help="minimum level of the logged protocol events")
+    parser.add_argument("--log-json", help="also write the protocol events to this JSON lines file")
+    args = parser.parse_args()
+    eventLog.configure(args.log_level, args.log_json)
+
     k = crypto.getKey()
     sqn_ue = 99
 
@@ -171,5 +256,13 @@ if __name__ == '__main__':
     with open(file_path, 'rb') as file:
         pk_hn = file.read()
 
+    if args.benchmark:
+        benchmark(args.iterations, pk_hn)
+        sys.exit(0)
+    if args.metrics:
+        instrumentation.enable()
+
     scb = Subscriber(k, "supi", sqn_ue, "sname_100", 8080, pk_hn)
     scb.connectSN()
+    if args.metrics:
+        instrumentation.export_json(args.metrics)
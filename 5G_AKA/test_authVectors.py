@@ -0,0 +1,50 @@
+import random
+import pytest
+import authVectors
+import crypto
+import sqnArray
+from authVectors import generateAVs
+from homeNetwork import HomeNetwork
+
+def test_batch_matches_single_vector():
+    sname = "5G:mnc093.mcc208.3gppnetwork.org"
+    records = [("supi-%d" % i, crypto.getKey(True), sqnArray.advance(0, 32 + 7 * i)) for i in range(9)]
+    batch = generateAVs(records, sname, threads=2)
+    assert (len(batch), batch.supis) == (9, [supi for (supi, k, sqn) in records])
+    # Every vector is the one HomeNetwork.challengeSubscriber computes for the same k, RAND and SQN
+    for (i, (supi, k, sqn)) in enumerate(records):
+        (r, (conc, mac), hxres_star, k_seaf, xres_star) = batch[i]
+        assert len(r) == authVectors.FIELD_SIZE
+        assert mac == crypto.fun1(k, sqn, r)
+        assert conc == crypto.getXOR(sqn.to_bytes(256, byteorder='little'), crypto.fun5(k, r))
+        assert xres_star == crypto.challenge(k, r, sname)
+        assert hxres_star == crypto.getsha256(r, xres_star)
+        assert k_seaf == crypto.keySeed(k, r, sqn, sname)
+    assert batch.nbytes() == 9 * (2 * authVectors.FIELD_SIZE + 4 * authVectors.DIGEST_SIZE)
+    with pytest.raises(ValueError):
+        generateAVs([("supi", b"short", 0)])
+
+def home_network(supis, sqn_hn):
+    hn = HomeNetwork(crypto.getKey(), None, 0, None, b"", b"")
+    for supi in supis:
+        hn.addSubscriber(supi, crypto.getKey(), sqn_hn)
+    return hn
+
+def test_generate_avs(monkeypatch):
+    supis = ["imsi-20893%010d" % i for i in range(5)]
+    sqn_hn = sqnArray.advance(0, 40)
+    hn = home_network(supis, sqn_hn)
+    first = hn.generate_avs(supis, 3, threads=1)
+    second = hn.generate_avs(supis[:2], 3, threads=1)
+    # Each subscriber gets a block of consecutive SQNs, the next call continues after it
+    assert first.sqns == [sqnArray.advance(sqn_hn, i) for supi in supis for i in range(3)]
+    assert second.sqns == [sqnArray.advance(sqn_hn, 3 + i) for supi in supis[:2] for i in range(3)]
+    assert [hn.subscribers[supi]["sqn_hn"] for supi in supis] == [sqnArray.advance(sqn_hn, 6)] * 2 + [sqnArray.advance(sqn_hn, 3)] * 3
+
+    # With the same RAND, the thread pool computes the vectors of the inline path
+    batches = []
+    for threads in [1, 3]:
+        monkeypatch.setattr(authVectors.os, "urandom", random.Random(7).randbytes)
+        batches.append(home_network(supis, sqn_hn).generate_avs(supis, 4, threads=threads))
+    assert [batches[0][i] for i in range(20)] == [batches[1][i] for i in range(20)]
+    assert batches[0].sqns == batches[1].sqns
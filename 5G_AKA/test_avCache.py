@@ -0,0 +1,94 @@
+import os
+import pickle
+import socket
+import threading
+import crypto
+from avCache import AVCache
+from servingNetwork import ServingNetwork
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_put_pop_expiry():
+    clock = Clock()
+    cache = AVCache(capacity=10, lifetime=30.0, clock=clock)
+    cache.put("supi-1", ["v1", "v2"])
+    clock.now = 20.0
+    cache.put("supi-1", ["v3"])
+    # Vectors come back in the order they were generated
+    assert cache.pop("supi-1") == "v1"
+    clock.now = 35.0
+    # v2 expired, v3 is still fresh
+    assert cache.pop("supi-1") == "v3"
+    assert cache.pop("supi-1") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["expired"], stats["vectors"]) == (2, 1, 1, 0)
+
+def test_capacity_eviction_order():
+    cache = AVCache(capacity=4, clock=Clock())
+    cache.put("a", ["a1", "a2"])
+    cache.put("b", ["b1", "b2"])
+    # a was used last, so b is the least recently used subscriber
+    assert cache.pop("a") == "a1"
+    cache.put("c", ["c1", "c2"])
+    assert cache.stats()["evicted"] == 1
+    assert cache.pop("b") == "b2"
+    assert cache.pop("a") == "a2"
+    assert cache.pop("c") == "c1"
+
+def test_invalidate():
+    cache = AVCache(clock=Clock())
+    cache.put("a", ["a1", "a2"])
+    cache.put("b", ["b1"])
+    assert cache.invalidate("a") == 2
+    assert cache.invalidate("unknown") == 0
+    assert cache.pop("a") is None
+    assert cache.pop("b") == "b1"
+    assert cache.stats()["invalidated"] == 2
+
+def vector(res):
+    r = os.urandom(16)
+    return (r, os.urandom(16), crypto.getsha256(r, res), os.urandom(32))
+
+def test_reauthenticate_and_resync():
+    # Stand-in for the HN, recording the RESYNC requests it receives
+    hn = socket.create_server(('127.0.0.1', 0))
+    requests = []
+
+    def serve_hn():
+        conn, addr = hn.accept()
+        with conn:
+            requests.append(pickle.loads(conn.recv(4096)))
+
+    threading.Thread(target=serve_hn, daemon=True).start()
+    cache = AVCache(clock=Clock())
+    sn = ServingNetwork("5G:mnc093.mcc208.3gppnetwork.org", "suci", 0, hn.getsockname()[1], cache)
+    res = os.urandom(16)
+    cache.put("supi", [vector(res), vector(res), vector(res)])
+
+    def attach(reply):
+        (sn_side, ue_side) = socket.socketpair()
+        thread = threading.Thread(target=sn.reauthenticate, args=(sn_side, "supi", "guti"))
+        thread.start()
+        with ue_side:
+            (r, autn) = pickle.loads(ue_side.recv(4096))
+            ue_side.send(pickle.dumps(reply(r)))
+            thread.join(10)
+            answer = ue_side.recv(4096)
+        return (r, pickle.loads(answer) if answer else None)
+
+    # A cached vector authenticates without the HN
+    assert attach(lambda r: ('RES*', res))[1] == ('GUTI', 'guti')
+    assert requests == []
+    # A Sync_Failure drops the stale cached vectors and resynchronizes through the HN
+    (r, answer) = attach(lambda r: ('Sync_Failure', b"auts"))
+    assert answer is None
+    assert requests == [('RESYNC', 'supi', r, b"auts")]
+    assert cache.pop("supi") is None
+    assert sn.counters["resyncs"] == 1 and sn.counters["reauth"] == 2
+    sn.sckt_sn.close()
+    hn.close()
@@ -0,0 +1,64 @@
+import asyncio
+import pytest
+from ecies import encrypt
+from ecies.utils import generate_key
+from deconcealment import DeconcealmentEngine, DeconcealmentError
+
+@pytest.fixture
+def keys():
+    key = generate_key()
+    return (key.public_key.format(True), key.secret)
+
+def test_batching(keys):
+    (pk_hn, sk_hn) = keys
+    supis = ["imsi-20893%010d" % i for i in range(20)]
+    with DeconcealmentEngine(sk_hn, workers=2, batch_size=8, max_delay=0.05) as engine:
+        futures = [engine.submit(encrypt(pk_hn, supi.encode('utf-8'))) for supi in supis]
+        assert [future.result(timeout=30) for future in futures] == supis
+        stats = engine.stats()
+    assert (stats["completed"], stats["failed"], stats["in_flight_batches"]) == (20, 0, 0)
+    # 20 SUCIs submitted at once fit in a few batches of at most 8
+    assert 3 <= stats["batches"] < 20
+
+def test_error_results(keys):
+    (pk_hn, sk_hn) = keys
+    with DeconcealmentEngine(sk_hn, workers=1, max_delay=0.05) as engine:
+        bad = engine.submit(b"not a suci")
+        good = engine.submit(encrypt(pk_hn, b"supi"))
+        # A SUCI that fails to decrypt only fails its own future
+        with pytest.raises(DeconcealmentError):
+            bad.result(timeout=30)
+        assert good.result(timeout=30) == "supi"
+        assert (engine.stats()["completed"], engine.stats()["failed"]) == (1, 1)
+
+def test_close(keys):
+    (pk_hn, sk_hn) = keys
+    engine = DeconcealmentEngine(sk_hn, workers=1, max_delay=0.05)
+    futures = [engine.submit(encrypt(pk_hn, b"supi")) for _ in range(5)]
+    engine.close()
+    # The SUCIs queued before close() are still decrypted
+    assert all(future.done() and future.result() == "supi" for future in futures)
+    with pytest.raises(DeconcealmentError):
+        engine.submit(encrypt(pk_hn, b"supi"))
+    engine.close()
+
+def test_cancelled_future(keys):
+    (pk_hn, sk_hn) = keys
+    with DeconcealmentEngine(sk_hn, workers=1, batch_size=8, max_delay=0.2) as engine:
+        suci = encrypt(pk_hn, b"supi")
+        (first, second) = (engine.submit(suci), engine.submit(suci))
+        assert first.cancel()
+        # The rest of the batch resolves despite the cancelled future
+        assert second.result(timeout=30) == "supi"
+
+def test_submit_async_cancel(keys):
+    (pk_hn, sk_hn) = keys
+
+    async def main(engine):
+        suci = encrypt(pk_hn, b"supi")
+        (first, second) = (engine.submit_async(suci), engine.submit_async(suci))
+        first.cancel()
+        return await asyncio.wait_for(second, 30)
+
+    with DeconcealmentEngine(sk_hn, workers=1, batch_size=8, max_delay=0.2) as engine:
+        assert asyncio.run(main(engine)) == "supi"
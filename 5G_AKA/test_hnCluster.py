@@ -0,0 +1,41 @@
+import shutil
+import tempfile
+import threading
+import crypto
+import sqnArray
+from ecies.utils import generate_key
+from hnCluster import ShardedHomeNetwork, shardOf
+
+def test_shard_of_is_stable():
+    supis = ["imsi-20893%010d" % i for i in range(200)]
+    shards = [shardOf(supi, 4) for supi in supis]
+    # The shard only depends on the SUPI, not on the process or the order of the calls
+    assert shards == [shardOf(supi, 4) for supi in reversed(supis)][::-1]
+    assert set(shards) == {0, 1, 2, 3}
+    assert shardOf("imsi-208930000000001", 4) == 1
+    assert all(shardOf(supi, 1) == 0 for supi in supis)
+
+def test_forward_challenge_to_owner():
+    key = generate_key()
+    (pk_hn, sk_hn) = (key.public_key.format(True), key.secret)
+    supis = ["imsi-20893%010d" % i for i in range(8)]
+    records = [(supi, crypto.getKey(), sqnArray.advance(0, 32)) for supi in supis]
+    run_dir = tempfile.mkdtemp()
+    workers = [ShardedHomeNetwork(shard, 2, records, 0, pk_hn, sk_hn, run_dir) for shard in range(2)]
+    for hn in workers:
+        threading.Thread(target=hn.serveForwarding, daemon=True).start()
+    try:
+        supi = next(supi for supi in supis if shardOf(supi, 2) == 1)
+        (k, sqn_hn) = [(k, sqn_hn) for (s, k, sqn_hn) in records if s == supi][0]
+        assert supi not in workers[0].subscribers
+        (r, autn, hxres_star, k_seaf, xres_star) = workers[0].challengeSubscriber(supi)
+        # The owner issued the challenge with its SQN and moved it on
+        assert autn[1] == crypto.fun1(k, sqn_hn, r)
+        assert workers[1].subscribers[supi]["sqn_hn"] == sqnArray.advance(sqn_hn)
+        assert (workers[0].forwarded, workers[1].forwarded) == (0, 1)
+    finally:
+        for hn in workers:
+            hn.stop()
+            hn.sckt_hn.close()
+            hn.drain(0)
+        shutil.rmtree(run_dir)
@@ -0,0 +1,24 @@
+import pickle
+import socket
+import pytest
+import crypto
+from homeNetwork import HomeNetwork
+
+@pytest.mark.parametrize("message", [(b"not a suci", "sname_100"), ('AV_REQ', b"suci"), 5, ('RESYNC',)])
+def test_malformed_session(message):
+    hn = HomeNetwork(crypto.getKey(), "imsi-208930000000001", 0, None, b"", bytes(32))
+    (sn_side, hn_side) = socket.socketpair()
+    with sn_side:
+        sn_side.send(pickle.dumps(message))
+        # The session is rejected and its connection closed, without raising
+        hn.handleSN(hn_side)
+        assert sn_side.recv(1024) == b""
+        assert hn_side.fileno() == -1
+
+def test_garbage_session():
+    hn = HomeNetwork(crypto.getKey(), "imsi-208930000000001", 0, None, b"", bytes(32))
+    (sn_side, hn_side) = socket.socketpair()
+    with sn_side:
+        sn_side.send(b"\x80\x04garbage")
+        hn.handleSN(hn_side)
+        assert sn_side.recv(1024) == b""
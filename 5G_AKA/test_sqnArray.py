@@ -0,0 +1,50 @@
+from sqnArray import SqnArray, split, advance
+
+def test_split_advance():
+    assert split((7 << 5) | 3) == (7, 3)
+    assert split(13, ind_bits=0) == (13, 0)
+    sqn = (10 << 5) | 30
+    assert split(advance(sqn)) == (11, 31)
+    # IND wraps around while SEQ keeps growing
+    assert split(advance(sqn, 3)) == (13, 1)
+    assert advance(5, 2, ind_bits=0) == 7
+
+def test_replay_and_out_of_order():
+    array = SqnArray(advance(0, 32))
+    sqns = [advance(advance(0, 32), n) for n in range(1, 5)]
+    # Vectors delivered out of order are accepted, each once
+    for sqn in [sqns[2], sqns[0], sqns[3], sqns[1]]:
+        assert array.check(sqn)
+        assert array.accept(sqn)
+    for sqn in sqns:
+        assert not array.accept(sqn)
+    # A lower SEQ at the same IND is a replay of an older vector
+    (seq, ind) = split(sqns[1])
+    assert not array.check(((seq - 32) << 5) | ind)
+
+def test_plain_increasing_sqn():
+    array = SqnArray(10, ind_bits=0)
+    assert not array.accept(10)
+    assert array.accept(12)
+    assert not array.accept(11)
+    assert array.accept(13)
+
+def test_age_limit_and_delta():
+    array = SqnArray(0, age_limit=4, delta=100)
+    assert array.accept((50 << 5) | 1)
+    # Not yet seen at IND 2, but at most age_limit SEQ steps below the highest
+    assert array.check((46 << 5) | 2)
+    assert not array.check((45 << 5) | 2)
+    # At most delta SEQ steps above the highest
+    assert array.check((150 << 5) | 3)
+    assert not array.check((151 << 5) | 3)
+    assert array.highest == (50 << 5) | 1
+
+def test_reset():
+    array = SqnArray(0)
+    sqn = advance(0, 40)
+    assert array.accept(sqn)
+    array.reset(advance(0, 100))
+    assert not array.check(advance(0, 90))
+    assert array.check(advance(0, 101))
+    assert array.entries == [advance(0, 100)] * 32
@@ -0,0 +1,164 @@
+""" Asyncio API for the heavy AAKA+ operations, run on a thread or process executor """
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from aaka_net import make_scheme
+from codec import encode, decode
+from utils import setup
+
+EXECUTORS = ("thread", "process")
+
+_worker = {}
+
+
+def _init_worker(name):
+    params = setup(3)
+    _worker.update(params=params, scheme=make_scheme(name, params))
+
+
+def _call_encoded(method, data):
+    # Process workers exchange arguments and results in the codec format,
+    # the bplib elements cannot be pickled
+    G = _worker["params"][0]
+    return encode(getattr(_worker["scheme"], method)(*decode(G, data)))
+
+
+class AsyncScheme:
+    def __init__(self, scheme, executor="thread", workers=None, max_batch=32, batch_delay=0.002):
+        """
+        Initialize the AsyncScheme class.
+
+        Every coroutine runs its operation on the executor so the event loop
+        never blocks. Concurrent AcredVer calls with the same keys are
+        coalesced into micro-batches of at most max_batch shows, waiting at
+        most batch_delay seconds for a batch to fill, and verified with one
+        batch_AcredVer call that shares a single multi-pairing.
+
+        Cancelling a coroutine withdraws its call if it has not reached the
+        executor yet: a pending show is dropped from its batch and a queued
+        call is not started. A call already running is left to finish and
+        its result is discarded.
+
+        Parameters:
+            scheme (str): "ps", "bb" or "ps_g1"
+            executor (str): "thread" or "process"
+            workers (int): Executor workers (default: the executor's own default)
+            max_batch (int): Largest number of shows verified in one batch
+            batch_delay (float): Longest time in seconds a show waits for its batch to fill
+        """
+        if executor not in EXECUTORS:
+            raise ValueError("unknown executor %s" % executor)
+        self.name = scheme
+        self.params = setup(3)
+        self.scheme = make_scheme(scheme, self.params)
+        self.process = executor == "process"
+        if self.process:
+            self.executor = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(scheme,))
+        else:
+            self.executor = ThreadPoolExecutor(workers)
+        self.max_batch = max_batch
+        self.batch_delay = batch_delay
+        self.pending = {}
+        self.timers = {}
+        self.tasks = set()
+        self.stats = {"calls": 0, "batches": 0, "batched_shows": 0, "cancelled": 0}
+
+    async def _run(self, method, *args):
+        loop = asyncio.get_running_loop()
+        self.stats["calls"] += 1
+        if not self.process:
+            return await loop.run_in_executor(self.executor, getattr(self.scheme, method), *args)
+        data = await loop.run_in_executor(self.executor, _call_encoded, method, encode(args))
+        return decode(self.params[0], data)
+
+    async def CredIssue(self, isk, ipk, m, pm):
+        """
+        Issue a credential.
+
+        Returns:
+            tuple: Credential and zero-knowledge proof
+        """
+        return await self._run("CredIssue", isk, ipk, m, pm)
+
+    async def CredShow(self, ipk, tpk, m, pm, cred, keyEx):
+        """
+        Show a credential.
+
+        Returns:
+            tuple: Anonymous credential (Acred), zero-knowledge proof and hashed key (H)
+        """
+        return await self._run("CredShow", ipk, tpk, m, pm, cred, keyEx)
+
+    async def Trace(self, tsk, Acred):
+        """
+        Trace an anonymous credential.
+
+        Returns:
+            G1Elem or G2Elem: Traced message
+        """
+        return await self._run("Trace", tsk, Acred)
+
+    async def judge(self, Acred, RL):
+        """
+        Judge if a user is revoked.
+
+        Returns:
+            bool: Judge result
+        """
+        return await self._run("judge", Acred, RL)
+
+    async def AcredVer(self, ipk, tpk, m, Acred, pi, keyEx):
+        """
+        Verify an anonymous credential as part of a micro-batch.
+
+        Returns:
+            bool: Verification result
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        key = (id(ipk), id(tpk))
+        batch = self.pending.setdefault(key, (ipk, tpk, []))
+        batch[2].append((future, (m, Acred, pi, keyEx)))
+        if len(batch[2]) >= self.max_batch:
+            self._flush(key)
+        elif key not in self.timers:
+            self.timers[key] = loop.call_later(self.batch_delay, self._flush, key)
+        try:
+            return await future
+        except asyncio.CancelledError:
+            self.stats["cancelled"] += 1
+            raise
+
+    def _flush(self, key):
+        timer = self.timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        (ipk, tpk, entries) = self.pending.pop(key)
+        entries = [(future, item) for (future, item) in entries if not future.cancelled()]
+        if entries:
+            task = asyncio.get_running_loop().create_task(self._verify_batch(ipk, tpk, entries))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def _verify_batch(self, ipk, tpk, entries):
+        self.stats["batches"] += 1
+        self.stats["batched_shows"] += len(entries)
+        try:
+            results = await self._run("batch_AcredVer", ipk, tpk, [item for (future, item) in entries])
+        except Exception as error:
+            for (future, item) in entries:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        for ((future, item), result) in zip(entries, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def close(self):
+        """
+        Verify the pending batches and shut the executor down.
+        """
+        for key in list(self.pending):
+            self._flush(key)
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.executor.shutdown(cancel_futures=True)
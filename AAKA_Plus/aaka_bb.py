@@ -6,13 +6,15 @@ from utils import *
 
 
 class AAKA_BB:
-    def __init__(self, k, supi, sqn_bb, pk_bb, sk_bb, params):
+    def __init__(self, k, supi, sqn_bb, pk_bb, sk_bb, params, exact=False):
         self.k = k
         self.supi = supi
         self.sqn_bb = sqn_bb
         self.pk_bb = pk_bb
         self.sk_bb = sk_bb
         self.params = params
+        # check every proof equation separately instead of one random linear combination per group
+        self.exact = exact
 
     def IKeyGen(self, q):
         """
@@ -124,8 +126,16 @@ class AAKA_BB:
         (commit, list_s) = pi_0
         (cmt, cmt_hat) = commit
         ch = challenge(cmt + cmt_hat)
+        if not self.exact:
+            w = random_weights(o, len(list_s))
+            terms_1 = [(cred[0], sum((w[i] * list_s[i] for i in range(len(list_s))), Bn(0)))]
+            terms_2 = [(g2, sum((w[i] * list_s[i] for i in range(len(list_s))), Bn(0)))]
+            for i in range(len(list_s)):
+                terms_1 += [(cmt[i], -w[i]), (cred[i + 1], -w[i] * ch)]
+                terms_2 += [(cmt_hat[i], -w[i]), (ipk[i], -w[i] * ch)]
+            return check_combined(G, terms_1) and check_combined(G, terms_2)
         for i in range(len(cred) - 1):
-            if not (list_s[i] * cred[0] == cmt[i] + ch * cred[i + 1]) and (list_s[i] * g2 == cmt_hat[i] + ch * ipk[i]):
+            if not ((list_s[i] * cred[0] == cmt[i] + ch * cred[i + 1]) and (list_s[i] * g2 == cmt_hat[i] + ch * ipk[i])):
                 return False
         return True
 
@@ -177,14 +187,31 @@ class AAKA_BB:
             B (G2Elem): exchanged key
             tau (bytes): hashed key
         """
+        (B, tau, self.k_s) = self.KeyExchange_XN_Key(A, Y, y)
+        return (B, tau)
+
+    def KeyExchange_XN_Key(self, A, Y, y):
+        """
+        Perform XN key exchange without keeping any state on the instance.
+
+        Parameters:
+            A (G2Elem): key from user equipment
+            Y (G2Elem): public key
+            y (FieldElem): private key
+
+        Returns:
+            B (G2Elem): exchanged key
+            tau (bytes): hashed key
+            k_s (bytes): session key
+        """
         (G, o, g1, g2, e) = self.params
         b = o.random()
         B = b * g1
         delta = challenge([Y, A, B])
         K = (b + delta * y) * A
         tau = crypto.getsha256(K.export(), (0).to_bytes(1, byteorder='big'))
-        self.k_s = crypto.getsha256(K.export(), (1).to_bytes(1, byteorder='big'))
-        return (B, tau)
+        k_s = crypto.getsha256(K.export(), (1).to_bytes(1, byteorder='big'))
+        return (B, tau, k_s)
 
     def KeyExchange_UE_Ver(self, Y, A, B, a, tau):
         """
@@ -200,14 +227,33 @@ class AAKA_BB:
         Returns:
             bool: verification result
         """
+        k_s = self.KeyExchange_UE_Key(Y, A, B, a, tau)
+        if k_s is None:
+            return False
+        self.k_s = k_s
+        return True
+
+    def KeyExchange_UE_Key(self, Y, A, B, a, tau):
+        """
+        Verify user equipment key exchange without keeping any state on the instance.
+
+        Parameters:
+            Y (G2Elem): public key
+            A (G2Elem): key from user equipment
+            B (G2Elem): exchanged key
+            a (FieldElem): random value
+            tau (bytes): hashed key
+
+        Returns:
+            k_s (bytes): session key, None if the verification fails
+        """
         (G, o, g1, g2, e) = self.params
         delta = challenge([Y, A, B])
         K = a * (B + delta * Y)
         if tau == crypto.getsha256(K.export(), (0).to_bytes(1, byteorder='big')):
-            self.k_s = crypto.getsha256(K.export(), (1).to_bytes(1, byteorder='big'))
-            return True
+            return crypto.getsha256(K.export(), (1).to_bytes(1, byteorder='big'))
         else:
-            return False
+            return None
 
     def CredShow(self, ipk, tpk, m, pm, cred, keyEx):
         """
@@ -291,22 +337,124 @@ class AAKA_BB:
         Returns:
             bool: verification result
         """
-        (G, o, g1, g2, e) = self.params
+        ctx = self.AcredVer_challenge(Acred, pi_1, keyEx)
+        return self.AcredVer_G1(ipk, tpk, Acred, pi_1, ctx) and self.AcredVer_G2(ipk, tpk, Acred, pi_1, ctx)
+
+    def AcredVer_wellformed(self, Acred, pi_1):
+        """
+        Check the shape and element types of a show.
+
+        Parameters:
+            Acred (tuple): anonymous credential
+            pi_1 (tuple): zero-knowledge proof
+
+        Returns:
+            bool: verification result
+        """
+        (commit, list_s) = pi_1
+        return (len(Acred) == 7 and len(commit) == 5 and len(list_s) == 4
+                and all(isinstance(x, G1Elem) for x in (Acred[0], Acred[2], Acred[5], commit[1], commit[4]))
+                and all(isinstance(x, G2Elem) for x in (Acred[1], Acred[3], Acred[4], commit[0], commit[2], commit[3]))
+                and all(isinstance(x, Bn) for x in [Acred[6]] + list(list_s)))
+
+    def AcredVer_challenge(self, Acred, pi_1, keyEx):
+        """
+        Recompute the hashes of a show.
+
+        Parameters:
+            Acred (tuple): anonymous credential
+            pi_1 (tuple): zero-knowledge proof
+            keyEx (tuple): key exchange data
+
+        Returns:
+            h (Bn): hash of the credential, H = h * g1
+            ch (Bn): challenge
+        """
         (sigma_hat, C1, C2, C3, C4, C5, m) = Acred
         (commit, list_s) = pi_1
         (cmt_1, cmt_2, cmt_3, cmt_4, cmt_5) = commit
         (A, B, tau) = keyEx
-        H = challenge([sigma_hat, C1, C2, C3, C4, m]) * g1
+        h = challenge([sigma_hat, C1, C2, C3, C4, m])
         ch = challenge([cmt_1, cmt_2, cmt_3, cmt_4, cmt_5, A, B, tau])
-        eq_1 = list_s[0] * ipk[2] + list_s[1] * g2 == cmt_1 + ch * (C1 - (ipk[0] + m * ipk[1]))
-        eq_2 = list_s[2] * g1 + list_s[1] * sigma_hat == cmt_2 + ch * C2
-        eq_3 = list_s[3] * g2 == cmt_3 + ch * C3
-        eq_4 = list_s[3] * tpk + list_s[0] * g2 == cmt_4 + ch * C4
-        eq_5 = list_s[0] * H == cmt_5 + ch * C5
-        if eq_1 and eq_2 and eq_3 and eq_4 and eq_5:
-            return True
-        else:
+        return (h, ch)
+
+    def AcredVer_G1(self, ipk, tpk, Acred, pi_1, ctx):
+        """
+        Check the equations of relation 2 over G1 as one random linear combination,
+        or one at a time stopping at the first failure in exact mode.
+
+        Parameters:
+            ipk (list): issuer public key
+            tpk (G2Elem): trustee public key
+            Acred (tuple): anonymous credential
+            pi_1 (tuple): zero-knowledge proof
+            ctx (tuple): output of AcredVer_challenge
+
+        Returns:
+            bool: verification result
+        """
+        (G, o, g1, g2, e) = self.params
+        (sigma_hat, C1, C2, C3, C4, C5, m) = Acred
+        ((cmt_1, cmt_2, cmt_3, cmt_4, cmt_5), list_s) = pi_1
+        (h, ch) = ctx
+        if not self.exact:
+            (w1, w2) = random_weights(o, 2)
+            return check_combined(G, [
+                (g1, w1 * list_s[0] * h + w2 * list_s[2]), (cmt_5, -w1), (C5, -w1 * ch),
+                (sigma_hat, w2 * list_s[1]), (cmt_2, -w2), (C2, -w2 * ch),
+            ])
+        H = h * g1
+        if not list_s[0] * H == cmt_5 + ch * C5:
             return False
+        return list_s[2] * g1 + list_s[1] * sigma_hat == cmt_2 + ch * C2
+
+    def AcredVer_G2(self, ipk, tpk, Acred, pi_1, ctx):
+        """
+        Check the equations of relation 2 over G2 as one random linear combination,
+        or one at a time stopping at the first failure in exact mode.
+
+        Parameters:
+            ipk (list): issuer public key
+            tpk (G2Elem): trustee public key
+            Acred (tuple): anonymous credential
+            pi_1 (tuple): zero-knowledge proof
+            ctx (tuple): output of AcredVer_challenge
+
+        Returns:
+            bool: verification result
+        """
+        (G, o, g1, g2, e) = self.params
+        (sigma_hat, C1, C2, C3, C4, C5, m) = Acred
+        ((cmt_1, cmt_2, cmt_3, cmt_4, cmt_5), list_s) = pi_1
+        (h, ch) = ctx
+        if not self.exact:
+            (w1, w2, w3) = random_weights(o, 3)
+            return check_combined(G, [
+                (g2, w1 * list_s[1] + w2 * list_s[3] + w3 * list_s[0]),
+                (ipk[0], w1 * ch), (ipk[1], w1 * ch * m), (ipk[2], w1 * list_s[0]),
+                (cmt_1, -w1), (C1, -w1 * ch),
+                (cmt_3, -w2), (C3, -w2 * ch),
+                (tpk, w3 * list_s[3]), (cmt_4, -w3), (C4, -w3 * ch),
+            ])
+        if not list_s[3] * g2 == cmt_3 + ch * C3:
+            return False
+        if not list_s[3] * tpk + list_s[0] * g2 == cmt_4 + ch * C4:
+            return False
+        return list_s[0] * ipk[2] + list_s[1] * g2 == cmt_1 + ch * (C1 - (ipk[0] + m * ipk[1]))
+
+    def AcredVer_pairing(self, Acred):
+        """
+        Check the pairing equation of the randomized signature.
+
+        Parameters:
+            Acred (tuple): anonymous credential
+
+        Returns:
+            bool: verification result
+        """
+        (G, o, g1, g2, e) = self.params
+        (sigma_hat, C1, C2, C3, C4, C5, m) = Acred
+        return e(sigma_hat, C1) == e(C2, g2)
 
     def AcredVer(self, ipk, tpk, m, Acred, pi_1, keyEx):
         """
@@ -323,13 +471,71 @@ class AAKA_BB:
         Returns:
             bool: verification result
         """
-        (G, o, g1, g2, e) = self.params
-        (sigma_hat, C1, C2, C3, C4, C5, m) = Acred
-        if e(sigma_hat, C1) == e(C2, g2) and self.ZK_Verify_Relation_2(ipk, tpk, Acred, pi_1, keyEx):
+        # Cheapest checks first: the proof equations before the two pairings
+        if self.ZK_Verify_Relation_2(ipk, tpk, Acred, pi_1, keyEx) and self.AcredVer_pairing(Acred):
             return True
         else:
             return False
 
+    def AcredVer_pairing_terms(self, Acred):
+        """
+        Pairing equation of the randomized signature as pairs whose pairings multiply to one.
+
+        Parameters:
+            Acred (tuple): anonymous credential
+
+        Returns:
+            list: (G1Elem, G2Elem) pairs
+        """
+        (G, o, g1, g2, e) = self.params
+        (sigma_hat, C1, C2, C3, C4, C5, m) = Acred
+        return [(sigma_hat, C1), (-C2, g2)]
+
+    def AcredVer_proof(self, ipk, tpk, Acred, pi_1, keyEx):
+        """
+        Check the shape and the proof of one show of a batch, a malformed
+        show being rejected instead of raising.
+
+        Parameters:
+            ipk (list): issuer public key
+            tpk (G2Elem): trustee public key
+            Acred (tuple): anonymous credential
+            pi_1 (tuple): zero-knowledge proof
+            keyEx (tuple): key exchange data
+
+        Returns:
+            bool: verification result
+        """
+        try:
+            return self.AcredVer_wellformed(Acred, pi_1) and self.ZK_Verify_Relation_2(ipk, tpk, Acred, pi_1, keyEx)
+        except Exception:
+            return False
+
+    def batch_AcredVer(self, ipk, tpk, items):
+        """
+        Verify several anonymous credentials at once.
+
+        The proofs are checked one by one, then the pairing equations of the
+        shows whose proofs hold are checked together with one multi-pairing.
+        Only if that fails are they checked one by one to find the bad shows.
+        A malformed show is rejected on its own, the others still verify.
+
+        Parameters:
+            ipk (list): issuer public key
+            tpk (G2Elem): trustee public key
+            items (list): (m, Acred, pi_1, keyEx) of every show
+
+        Returns:
+            list: verification result of every show
+        """
+        (G, o, g1, g2, e) = self.params
+        results = [self.AcredVer_proof(ipk, tpk, Acred, pi_1, keyEx) for (m, Acred, pi_1, keyEx) in items]
+        passed = [i for i in range(len(items)) if results[i]]
+        if passed and not check_pairings(G, [self.AcredVer_pairing_terms(items[i][1]) for i in passed]):
+            for i in passed:
+                results[i] = self.AcredVer_pairing(items[i][1])
+        return results
+
     def Trace(self, tsk, Acred):
         """
         Trace an anonymous credential.
@@ -346,6 +552,19 @@ class AAKA_BB:
         tm = C4 - tsk * C3
         return tm
 
+    def Trace_batch(self, tsk, Acreds):
+        """
+        Trace several anonymous credentials.
+
+        Parameters:
+            tsk (FieldElem): trustee secret key
+            Acreds (list): anonymous credentials
+
+        Returns:
+            list: traced message of every credential
+        """
+        return elgamal_dec_batch(self.params, tsk, [(Acred[3], Acred[4]) for Acred in Acreds])
+
     def judge(self, Acred, RL):
         """
         Judge if a user is revoked.
@@ -0,0 +1,326 @@
+""" Command-line entry points running AAKA+ operations in bulk over record streams """
+import argparse
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from aaka_net import SCHEMES, make_scheme
+from codec import CodecError, encode, decode, read_frames, write_frame
+from revocation import SCHEME_GROUPS, SNAPSHOT_MAGIC, RevocationError, RevocationList, RevocationStore
+from utils import setup
+
+# Record streams are sequences of length-prefixed codec values:
+#   issuer key   ("issuer", scheme, isk, ipk)
+#   LEA key      ("lea", scheme, tsk, tpk)
+#   XN key       ("xn", scheme, y, Y)
+#   subscriber   (m, pm)
+#   credential   (m, pm, cred, pi)
+#   show         (m, Acred, pi, keyEx)
+#   verdict      bool
+#   traced       G1Elem or G2Elem, the revocation list entries read by judge
+
+_worker = {}
+
+
+class CLIError(Exception):
+    pass
+
+
+def _init_worker(scheme, keys, rl):
+    # Each worker sets the scheme up and decodes the keys and the revocation
+    # list once, chunks only carry records
+    params = setup(3)
+    G = params[0]
+    _worker.clear()
+    _worker.update(params=params, scheme=make_scheme(scheme, params))
+    for data in keys:
+        key = decode(G, data)
+        _worker[key[0]] = key[2:]
+    if rl is None:
+        return
+    try:
+        if rl[0] == "store":
+            _worker["RL"] = RevocationList(G, SCHEME_GROUPS[scheme], 0, rl[1])
+        else:
+            with open(rl[1], "rb") as file:
+                _worker["RL"] = [decode(G, data) for data in read_frames(file)]
+    except (CodecError, RevocationError) as error:
+        # Raised by the first chunk instead, an initializer that raises breaks the whole pool
+        _worker["error"] = error
+
+
+def read_rl(path, scheme):
+    """
+    Read the revocation list of judge.
+
+    A revocation store directory is read with its journal, so the updates
+    made since its last compaction are included.
+
+    Parameters:
+        path (str): File of traced records, or revocation store directory
+        scheme (str): Scheme of the store
+
+    Returns:
+        tuple: ("store", compressed points) or ("records", path)
+    """
+    if os.path.isdir(path):
+        try:
+            return ("store", RevocationStore(path, scheme, read_only=True).snapshot()[1])
+        except RevocationError as error:
+            raise CLIError(str(error))
+    with open(path, "rb") as file:
+        if file.read(len(SNAPSHOT_MAGIC)) == SNAPSHOT_MAGIC:
+            # The snapshot misses the updates journaled since it was written
+            raise CLIError("%s is a store snapshot, pass the store directory" % path)
+    return ("records", path)
+
+
+def _issue(scheme, items):
+    (isk, ipk) = _worker["issuer"]
+    return [(m, pm) + scheme.CredIssue(isk, ipk, m, pm) for (m, pm) in items]
+
+
+def _verify_cred(scheme, items):
+    (isk, ipk) = _worker["issuer"]
+    return [scheme.CredVer(ipk, m, pm, cred, pi) for (m, pm, cred, pi) in items]
+
+
+def _show(scheme, items):
+    (isk, ipk) = _worker["issuer"]
+    (tsk, tpk) = _worker["lea"]
+    (y, Y) = _worker["xn"]
+    shows = []
+    for (m, pm, cred, pi) in items:
+        # Both sides of the key exchange run here, the show is bound to it
+        (a, A) = scheme.KeyExchange_UE()
+        (B, tau) = scheme.KeyExchange_XN(A, Y, y)
+        keyEx = (A, B, tau)
+        (Acred, pi_show, H) = scheme.CredShow(ipk, tpk, m, pm, cred, keyEx)
+        shows.append((m, Acred, pi_show, keyEx))
+    return shows
+
+
+def _is_show(item):
+    return isinstance(item, tuple) and len(item) == 4
+
+
+def _verify_show(scheme, items):
+    (isk, ipk) = _worker["issuer"]
+    (tsk, tpk) = _worker["lea"]
+    # A record that is not a show is rejected on its own, as batch_AcredVer does for a malformed show
+    verdicts = iter(scheme.batch_AcredVer(ipk, tpk, [item for item in items if _is_show(item)]))
+    return [next(verdicts) if _is_show(item) else False for item in items]
+
+
+def _judge(scheme, items):
+    return [scheme.judge(Acred, _worker["RL"]) for (m, Acred, pi, keyEx) in items]
+
+
+def _trace(scheme, items):
+    (tsk, tpk) = _worker["lea"]
+    return scheme.Trace_batch(tsk, [Acred for (m, Acred, pi, keyEx) in items])
+
+
+# Bulk commands: operation on a chunk of records, keys it needs, whether its outputs are verdicts
+COMMANDS = {
+    "issue": (_issue, ("issuer",), False),
+    "verify-cred": (_verify_cred, ("issuer",), True),
+    "show": (_show, ("issuer", "lea", "xn"), False),
+    "verify-show": (_verify_show, ("issuer", "lea"), True),
+    "judge": (_judge, (), True),
+    "trace": (_trace, ("lea",), False),
+}
+
+
+def _run_chunk(command, frames):
+    if "error" in _worker:
+        raise _worker["error"]
+    G = _worker["params"][0]
+    outputs = COMMANDS[command][0](_worker["scheme"], [decode(G, data) for data in frames])
+    return [encode(output) for output in outputs]
+
+
+def chunks(frames, size):
+    chunk = []
+    for data in frames:
+        chunk.append(data)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_bulk(command, scheme, keys, frames, out, jobs=1, chunk=64, rl_path=None):
+    """
+    Run a bulk command over a stream of records.
+
+    Records are read lazily and cut into chunks. With more than one job,
+    worker processes run the chunks with at most two chunks per worker in
+    flight, so memory stays bounded whatever the size of the stream, and
+    the outputs are written in input order.
+
+    Parameters:
+        command (str): A name of COMMANDS
+        scheme (str): "ps", "bb" or "ps_g1"
+        keys (list): Encoded key records the command needs
+        frames (iterable): Encoded input records
+        out (file): Binary stream the encoded outputs are written to
+        jobs (int): Worker processes, 1 to run in this process
+        chunk (int): Records per task
+        rl_path (str): Revocation list of judge, a file of traced records or a revocation store directory
+
+    Returns:
+        tuple: Number of records written, number of False verdicts
+    """
+    verdicts = COMMANDS[command][2]
+    counts = [0, 0]
+
+    def emit(outputs):
+        for data in outputs:
+            write_frame(out, data)
+        counts[0] += len(outputs)
+        if verdicts:
+            counts[1] += sum(1 for data in outputs if not decode(None, data))
+
+    init_args = (scheme, keys, None if rl_path is None else read_rl(rl_path, scheme))
+    if jobs <= 1:
+        _init_worker(*init_args)
+        for frames_chunk in chunks(frames, chunk):
+            emit(_run_chunk(command, frames_chunk))
+        return tuple(counts)
+    with ProcessPoolExecutor(jobs, initializer=_init_worker, initargs=init_args) as pool:
+        pending = deque()
+        try:
+            for frames_chunk in chunks(frames, chunk):
+                pending.append(pool.submit(_run_chunk, command, frames_chunk))
+                while len(pending) >= 2 * jobs:
+                    emit(pending.popleft().result())
+            while pending:
+                emit(pending.popleft().result())
+        finally:
+            for future in pending:
+                future.cancel()
+    return tuple(counts)
+
+
+def read_key(path, kind, scheme):
+    """
+    Read a key file written by a keygen command.
+
+    Parameters:
+        path (str): Key file
+        kind (str): "issuer", "lea" or "xn"
+        scheme (str): Scheme the key must belong to
+
+    Returns:
+        bytes: Encoded key record
+    """
+    with open(path, "rb") as file:
+        frames = list(read_frames(file))
+    if len(frames) != 1:
+        raise CLIError("%s does not hold one key" % path)
+    header = decode(setup(3)[0], frames[0])[:2]
+    if header != (kind, scheme):
+        raise CLIError("%s holds a %s key of %s, expected a %s key of %s" % (path, header[0], header[1], kind, scheme))
+    return frames[0]
+
+
+def open_input(path):
+    return sys.stdin.buffer if path == "-" else open(path, "rb")
+
+
+def open_output(path):
+    return sys.stdout.buffer if path == "-" else open(path, "wb")
+
+
+def keygen(args, params, scheme):
+    if args.command == "ikeygen":
+        if args.q != 3 and args.scheme == "bb":
+            raise CLIError("AAKA+BB credentials sign exactly 3 attributes")
+        return ("issuer", args.scheme) + scheme.IKeyGen(args.q)
+    if args.command == "leakeygen":
+        return ("lea", args.scheme) + scheme.LEAKeyGen()
+    return ("xn", args.scheme) + scheme.AsymKeyGen()
+
+
+def subscribers(o, count):
+    for _ in range(count):
+        yield encode((o.random(), o.random()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="AAKA+ operations in bulk over record streams")
+    commands = parser.add_subparsers(dest="command", required=True)
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--scheme", choices=SCHEMES, default="ps")
+    common.add_argument("--out", default="-", help="output record file, - for stdout")
+
+    ikeygen = commands.add_parser("ikeygen", parents=[common], help="generate an issuer key pair")
+    ikeygen.add_argument("-q", type=int, default=3, help="number of attributes")
+    commands.add_parser("leakeygen", parents=[common], help="generate an LEA key pair")
+    commands.add_parser("xnkeygen", parents=[common], help="generate an XN key pair for the key exchange of show")
+
+    bulk = argparse.ArgumentParser(add_help=False, parents=[common])
+    bulk.add_argument("--in", dest="input", default="-", help="input record file, - for stdin")
+    bulk.add_argument("--jobs", type=int, default=1, help="worker processes")
+    bulk.add_argument("--chunk", type=int, default=64, help="records per task")
+    keys = {
+        "issuer": ("--issuer", "issuer key file"),
+        "lea": ("--lea", "LEA key file"),
+        "xn": ("--xn", "XN key file"),
+    }
+    helps = {
+        "issue": "issue a credential to every subscriber record",
+        "verify-cred": "verify credential records",
+        "show": "show every credential record",
+        "verify-show": "verify show records in batches",
+        "judge": "check show records against a revocation list",
+        "trace": "trace show records to their revocation list entries",
+    }
+    for (name, (func, needed, verdicts)) in COMMANDS.items():
+        command = commands.add_parser(name, parents=[bulk], help=helps[name])
+        for kind in needed:
+            command.add_argument(keys[kind][0], required=True, help=keys[kind][1])
+    commands.choices["issue"].add_argument("--count", type=int, help="issue to this many random subscribers instead of reading them")
+    commands.choices["judge"].add_argument("--rl", required=True, help="revocation list file of traced records, or a revocation store directory")
+
+    args = parser.parse_args(argv)
+    params = setup(3)
+    out = None
+    try:
+        if args.command not in COMMANDS:
+            key = keygen(args, params, make_scheme(args.scheme, params))
+            out = open_output(args.out)
+            write_frame(out, encode(key))
+            return 0
+        needed = COMMANDS[args.command][1]
+        key_records = [read_key(getattr(args, kind), kind, args.scheme) for kind in needed]
+        out = open_output(args.out)
+        if args.command == "issue" and args.count is not None:
+            frames = subscribers(params[1], args.count)
+            (written, false) = run_bulk(args.command, args.scheme, key_records, frames, out, args.jobs, args.chunk)
+        else:
+            with open_input(args.input) as file:
+                (written, false) = run_bulk(args.command, args.scheme, key_records, read_frames(file), out,
+                                            args.jobs, args.chunk, getattr(args, "rl", None))
+    except (CLIError, CodecError, RevocationError) as error:
+        # Status 2, not the 1 of rejected records, for a command that could not run
+        print("error: %s" % error, file=sys.stderr)
+        return 2
+    finally:
+        if out is sys.stdout.buffer:
+            out.flush()
+        elif out is not None:
+            out.close()
+    if args.command == "judge":
+        print("%d records, %d revoked" % (written, written - false), file=sys.stderr)
+    elif COMMANDS[args.command][2]:
+        print("%d records, %d rejected" % (written, false), file=sys.stderr)
+        return 1 if false else 0
+    else:
+        print("%d records" % written, file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,234 @@
+""" Local multi-UE driver measuring AAKA+ attaches/s over the network """
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+from audit_log import AuditLog, trace
+from aaka_net import LEA, XN, UE, WalletUE, SCHEMES, make_scheme
+from codec import encode, decode, send_msg, recv_msg
+from resumption import TicketIssuer
+from utils import setup
+from wallet import Wallet
+
+
+def run_lea(scheme, port, keys):
+    params = setup(3)
+    tsk = decode(params[0], keys)
+    LEA(scheme, params, tsk, port).serve()
+
+
+def run_xn(scheme, port, lea_port, keys, audit_dir=None, resume=False):
+    params = setup(3)
+    (ipk, tpk, y, Y) = decode(params[0], keys)
+    audit_log = AuditLog(audit_dir, scheme) if audit_dir else None
+    tickets = TicketIssuer() if resume else None
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+    try:
+        XN(scheme, params, ipk, tpk, y, Y, port, lea_port, audit_log=audit_log, tickets=tickets).serve()
+    finally:
+        if audit_log is not None:
+            audit_log.close()
+
+
+def wait_for_port(port, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("nothing is listening on port %d" % port)
+
+
+def percentile(samples, q):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+def latency_summary(samples):
+    ms = lambda seconds: round(seconds * 1000, 3)
+    return {
+        "mean": ms(sum(samples) / len(samples)) if samples else 0.0,
+        "p50": ms(percentile(samples, 50)),
+        "p90": ms(percentile(samples, 90)),
+        "p99": ms(percentile(samples, 99)),
+        "max": ms(max(samples, default=0.0)),
+    }
+
+
+class Driver:
+    def __init__(self, scheme, ues, attaches, revoked, port_xn, port_lea, wallet=False, audit_dir=None, resume=False):
+        """
+        Initialize the Driver class.
+
+        Parameters:
+            scheme (str): "ps", "bb" or "ps_g1"
+            ues (int): Number of UEs attaching concurrently
+            attaches (int): Total number of attaches
+            revoked (int): Number of UEs revoked by the LEA before the run
+            port_xn (int): Port number of the XN
+            port_lea (int): Port number of the LEA
+            wallet (bool): Keep the UE credentials in a memory-mapped wallet
+            audit_dir (str): Directory where the XN logs the accepted shows, None to keep no log
+            resume (bool): Have the XN issue resumption tickets and the UEs resume with them
+        """
+        self.scheme = scheme
+        self.ues = ues
+        self.attaches = attaches
+        self.revoked = revoked
+        self.port_xn = port_xn
+        self.port_lea = port_lea
+        self.wallet = wallet
+        self.audit_dir = audit_dir
+        self.resume = resume
+        self.outcomes = {}
+        self.unexpected = 0
+        self.latencies = {}
+        self.lock = threading.Lock()
+
+    def run(self):
+        """
+        Start the LEA and XN, revoke some UEs, run every attach and stop them again.
+
+        Returns:
+            dict: Throughput, outcome counts and latency percentiles
+        """
+        params = setup(3)
+        (G, o, g1, g2, e) = params
+        issuer = make_scheme(self.scheme, params)
+        (isk, ipk) = issuer.IKeyGen(3)
+        (tsk, tpk) = issuer.LEAKeyGen()
+        (y, Y) = issuer.AsymKeyGen()
+
+        lea = multiprocessing.Process(target=run_lea, args=(self.scheme, self.port_lea, encode(tsk)), daemon=True)
+        xn = multiprocessing.Process(target=run_xn, args=(self.scheme, self.port_xn, self.port_lea, encode((ipk, tpk, y, Y)), self.audit_dir, self.resume), daemon=True)
+        lea.start()
+        wallet = None
+        workdir = tempfile.mkdtemp()
+        try:
+            wait_for_port(self.port_lea)
+            ues = []
+            wallet = Wallet(os.path.join(workdir, "wallet"), params, self.scheme, self.ues) if self.wallet else None
+            for i in range(self.ues):
+                (m, pm) = (o.random(), o.random())
+                (cred, pi) = issuer.CredIssue(isk, ipk, m, pm)
+                if wallet is None:
+                    ues.append(UE(self.scheme, params, ipk, tpk, Y, m, pm, cred))
+                else:
+                    wallet.put(i, m, pm, cred)
+                    ues.append(WalletUE(self.scheme, params, ipk, tpk, Y, wallet, i))
+            for ue in ues[:self.revoked]:
+                (Acred, pi) = ue.show((g1, g1, b""))
+                with socket.create_connection(('127.0.0.1', self.port_lea)) as conn:
+                    send_msg(conn, ("REVOKE", Acred))
+                    recv_msg(conn, G)
+
+            xn.start()
+            wait_for_port(self.port_xn)
+            remaining = [self.attaches]
+            threads = [threading.Thread(target=self.simulate, args=(ue, i < self.revoked, remaining)) for i, ue in enumerate(ues)]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+            # Identity of the last UE, to trace its shows in the audit log
+            target = issuer.Trace(tsk, ues[-1].show((g1, g1, b""))[0])
+        finally:
+            for process in (xn, lea):
+                if process.is_alive():
+                    process.terminate()
+                    process.join()
+            if wallet is not None:
+                wallet.close()
+            shutil.rmtree(workdir)
+
+        completed = sum(self.outcomes.values())
+        report = {
+            "scheme": self.scheme,
+            "ues": self.ues,
+            "revoked_ues": self.revoked,
+            "attaches": completed,
+            "elapsed_s": round(elapsed, 3),
+            "attaches_per_s": round(completed / elapsed, 2) if elapsed else 0.0,
+            "outcomes": dict(self.outcomes),
+            "unexpected_outcomes": self.unexpected,
+            "latency_ms": latency_summary([latency for samples in self.latencies.values() for latency in samples]),
+        }
+        if self.resume:
+            report["latency_ms_by_outcome"] = {outcome: latency_summary(samples) for outcome, samples in self.latencies.items()}
+        if self.audit_dir:
+            start = time.perf_counter()
+            matches = sum(1 for match in trace(self.audit_dir, tsk, target))
+            report["trace"] = {"matches": matches, "elapsed_s": round(time.perf_counter() - start, 3)}
+        return report
+
+    def simulate(self, ue, revoked, remaining):
+        """
+        Attach one UE again and again until every attach has been run.
+
+        Parameters:
+            ue (UE): Simulated UE
+            revoked (bool): Whether the LEA revoked this UE
+            remaining (list): Shared count of attaches left
+        """
+        expected = ("revoked",) if revoked else ("ACCEPT", "RESUMED")
+        while True:
+            with self.lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            begin = time.perf_counter()
+            outcome = ue.attach(self.port_xn, resume=self.resume)
+            latency = time.perf_counter() - begin
+            with self.lock:
+                self.latencies.setdefault(outcome, []).append(latency)
+                self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+                if outcome not in expected:
+                    self.unexpected += 1
+
+
+def print_report(report):
+    latency = report["latency_ms"]
+    print("[%s] %d attaches by %d UEs in %s s: %s attaches/s" % (report["scheme"], report["attaches"], report["ues"], report["elapsed_s"], report["attaches_per_s"]))
+    print("  outcomes: %s, unexpected: %d" % (report["outcomes"], report["unexpected_outcomes"]))
+    print("  latency (ms): mean %.2f, p50 %.2f, p90 %.2f, p99 %.2f, max %.2f" % (latency["mean"], latency["p50"], latency["p90"], latency["p99"], latency["max"]))
+    for outcome, latency in report.get("latency_ms_by_outcome", {}).items():
+        print("    %s: mean %.2f, p50 %.2f, p90 %.2f, p99 %.2f, max %.2f" % (outcome, latency["mean"], latency["p50"], latency["p90"], latency["p99"], latency["max"]))
+    if "trace" in report:
+        print("  trace of the last UE: %d shows found in %s s" % (report["trace"]["matches"], report["trace"]["elapsed_s"]))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="AAKA+ multi-UE driver")
+    parser.add_argument("--scheme", nargs="+", choices=SCHEMES, default=list(SCHEMES))
+    parser.add_argument("--ues", type=int, default=8, help="UEs attaching concurrently")
+    parser.add_argument("--attaches", type=int, default=100, help="total number of attaches per scheme")
+    parser.add_argument("--revoked", type=int, default=0, help="UEs revoked by the LEA before the run")
+    parser.add_argument("--port-xn", type=int, default=9090)
+    parser.add_argument("--port-lea", type=int, default=9091)
+    parser.add_argument("--wallet", action="store_true", help="keep the UE credentials in a memory-mapped wallet")
+    parser.add_argument("--audit-dir", help="have the XN log the accepted shows in this directory")
+    parser.add_argument("--resume", action="store_true", help="resume sessions with tickets after the first attach of each UE")
+    parser.add_argument("--json", help="also write the reports to this JSON file")
+    args = parser.parse_args()
+
+    reports = []
+    for scheme in args.scheme:
+        report = Driver(scheme, args.ues, args.attaches, args.revoked, args.port_xn, args.port_lea, args.wallet, args.audit_dir, args.resume).run()
+        print_report(report)
+        reports.append(report)
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(reports, file, indent=2)
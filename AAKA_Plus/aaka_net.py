@@ -0,0 +1,462 @@
+""" AAKA+ network entities: UE, XN (serving network) and LEA over TCP """
+import hmac
+import os
+import socket
+import socketserver
+import threading
+import crypto
+from hashlib import sha256
+from ecies.utils import generate_key
+from aaka_ps import AAKA_PS
+from aaka_ps_g1 import AAKA_PS_G1
+from aaka_bb import AAKA_BB
+from codec import send_msg, recv_msg, recv_frame, CodecError
+from replay_cache import ReplayCache
+from revocation import SCHEME_GROUPS, RevocationError, RevocationList, RevocationStore
+from resumption import TicketError, resumption_secret, resume_proof, resume_confirm, resumed_key
+from session import Engine
+from utils import *
+
+SCHEMES = ("ps", "bb", "ps_g1")
+
+# Outcome reported to the UE for the stage of the verification pipeline that rejected its show
+REJECTIONS = {None: "accepted", "decode": "malformed", "replay": "replayed", "revocation": "revoked"}
+
+_bb_key = None
+
+
+def make_scheme(name, params):
+    """
+    Create a scheme instance.
+
+    Parameters:
+        name (str): "ps", "bb" or "ps_g1"
+        params (tuple): System parameters
+
+    Returns:
+        AAKA_PS, AAKA_BB or AAKA_PS_G1: Scheme instance
+    """
+    global _bb_key
+    if name == "ps":
+        return AAKA_PS("supi", params)
+    if name == "ps_g1":
+        return AAKA_PS_G1("supi", params)
+    if name == "bb":
+        if _bb_key is None:
+            _bb_key = generate_key()
+        return AAKA_BB(crypto.getKey(), "supi", 100, _bb_key.public_key.format(True), _bb_key.secret, params)
+    raise ValueError("unknown scheme %s" % name)
+
+
+def _tagged(message, tag, arity):
+    return isinstance(message, tuple) and len(message) == arity and message[0] == tag
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        try:
+            self.server.entity.handle(self.request)
+        except (EOFError, OSError, CodecError, CocoException):
+            pass
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+    request_queue_size = socket.SOMAXCONN
+
+    def __init__(self, entity, port):
+        self.entity = entity
+        super().__init__(('127.0.0.1', port), _Handler)
+
+
+class Entity:
+    def __init__(self, port):
+        """
+        Initialize a network entity listening on port, one thread per connection.
+
+        Parameters:
+            port (int): Port number, 0 to pick a free one
+        """
+        self.server = _Server(self, port)
+        self.port = self.server.server_address[1]
+
+    def serve(self):
+        """
+        Serve connections until shutdown() is called.
+        """
+        self.server.serve_forever()
+
+    def shutdown(self):
+        """
+        Stop serving and close the listening socket.
+        """
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handle(self, conn):
+        raise NotImplementedError
+
+
+class LEA(Entity):
+    def __init__(self, scheme, params, tsk, port, store=None):
+        """
+        Initialize the LEA, which traces anonymous credentials and keeps the revocation list.
+
+        Requests:
+            ("RL",)               -> ("RL", version, RL)
+            ("RL_DELTA", since)   -> ("RL_DELTA", since, version, ops), or ("RL_SNAPSHOT", version, entries)
+                                     when the updates after since were compacted away
+            ("TRACE", Acred)      -> ("TRACED", tm)
+            ("REVOKE", Acred)     -> ("REVOKED", version)
+            ("REINSTATE", tm)     -> ("REINSTATED", version)
+
+        Parameters:
+            scheme (str): "ps", "bb" or "ps_g1"
+            params (tuple): System parameters
+            tsk (Bn): LEA secret key
+            port (int): Port number
+            store (RevocationStore): Revocation list store (default: a new one kept in memory)
+        """
+        self.scheme = make_scheme(scheme, params)
+        self.params = params
+        self.tsk = tsk
+        self.store = store if store is not None else RevocationStore(None, scheme)
+        (version, entries) = self.store.snapshot()
+        self.RL = RevocationList(params[0], self.store.group, version, entries)
+        self.lock = threading.Lock()
+        super().__init__(port)
+
+    @property
+    def version(self):
+        return self.store.version
+
+    def _update(self, add=(), remove=()):
+        with self.lock:
+            since = self.store.version
+            version = self.store.update(add, remove)
+            self.RL.apply(since, *self.store.delta(since))
+            return version
+
+    def revoke(self, Acred):
+        """
+        Trace an anonymous credential and add its user to the revocation list.
+
+        Parameters:
+            Acred (tuple): Anonymous credential
+
+        Returns:
+            int: New revocation list version
+        """
+        return self._update(add=[self.scheme.Trace(self.tsk, Acred)])
+
+    def reinstate(self, tm):
+        """
+        Remove a traced message from the revocation list.
+
+        Parameters:
+            tm (G1Elem or G2Elem): Traced message
+
+        Returns:
+            int: New revocation list version
+        """
+        return self._update(remove=[tm])
+
+    def handle(self, conn):
+        (G, o, g1, g2, e) = self.params
+        while True:
+            request = recv_msg(conn, G)
+            if request[0] == "RL":
+                with self.lock:
+                    send_msg(conn, ("RL", self.RL.version, list(self.RL)))
+            elif request[0] == "RL_DELTA":
+                delta = self.store.delta(request[1])
+                if delta is None:
+                    send_msg(conn, ("RL_SNAPSHOT",) + self.store.snapshot())
+                else:
+                    send_msg(conn, ("RL_DELTA", request[1]) + delta)
+            elif request[0] == "TRACE":
+                send_msg(conn, ("TRACED", self.scheme.Trace(self.tsk, request[1])))
+            elif request[0] == "REVOKE":
+                send_msg(conn, ("REVOKED", self.revoke(request[1])))
+            elif request[0] == "REINSTATE":
+                send_msg(conn, ("REINSTATED", self.reinstate(request[1])))
+            else:
+                raise CodecError("unknown request %s" % request[0])
+
+
+class XN(Entity):
+    def __init__(self, scheme, params, ipk, tpk, y, Y, port, lea_port=None, rl_refresh=1.0, replay_cache=None, audit_log=None, tickets=None):
+        """
+        Initialize the XN, which authenticates UEs and serves them concurrently.
+
+        Every connection is a session of one shared protocol engine: it runs
+        the key exchange, then the show goes through the verification pipeline: decode, replay
+        check, AcredVer from its cheapest equations to the pairing, and judge
+        against the revocation list fetched from the LEA. Accepted shows are
+        appended to the audit log, if any, so the LEA can trace them later.
+
+        With a ticket issuer, every accepted UE also gets a resumption
+        ticket, and a later ("RESUME", ticket, n_ue, proof) from it is
+        answered in one symmetric round with ("RESUMED", n_xn, confirm,
+        ticket) instead of a new show. Tickets are single-use and refused
+        once the revocation list has changed.
+
+        Parameters:
+            scheme (str): "ps", "bb" or "ps_g1"
+            params (tuple): System parameters
+            ipk (list): Issuer public key
+            tpk (G2Elem): LEA public key
+            y (Bn): XN private key
+            Y (G1Elem): XN public key
+            port (int): Port number
+            lea_port (int): Port number of the LEA, None to start with an empty revocation list
+            rl_refresh (float): Seconds between two revocation list fetches
+            replay_cache (ReplayCache): Cache of recent shows (default: a new ReplayCache)
+            audit_log (AuditLog): Log of accepted shows, None to keep no log
+            tickets (TicketIssuer): Resumption ticket issuer, None to disable resumption
+        """
+        self.scheme = scheme
+        self.params = params
+        self.ipk = ipk
+        self.tpk = tpk
+        self.y = y
+        self.Y = Y
+        self.lea_port = lea_port
+        self.rl_refresh = rl_refresh
+        self.replay_cache = replay_cache if replay_cache is not None else ReplayCache()
+        self.audit_log = audit_log
+        self.tickets = tickets
+        self.revocation = RevocationList(params[0], SCHEME_GROUPS[scheme])
+        self.RL = []
+        self.rl_version = 0
+        self.engine = Engine(make_scheme(scheme, params), ipk, tpk, Y, y, self.replay_cache)
+        self.pipeline = self.engine.pipeline
+        self.stats = {"accepted": 0, "revoked": 0, "invalid": 0, "replayed": 0, "malformed": 0, "resumed": 0, "resume_refused": 0}
+        self.lock = threading.Lock()
+        self.fetching = threading.Lock()
+        self.stopped = threading.Event()
+        super().__init__(port)
+        if lea_port is not None:
+            self.fetch_rl()
+
+    def fetch_rl(self):
+        """
+        Bring the revocation list up to date with the LEA.
+
+        Only the updates made since the version held are fetched and
+        decompressed. Sessions keep judging against the list they started
+        with while the next one is built.
+        """
+        (G, o, g1, g2, e) = self.params
+        with self.fetching:
+            with socket.create_connection(('127.0.0.1', self.lea_port)) as conn:
+                send_msg(conn, ("RL_DELTA", self.revocation.version))
+                reply = recv_msg(conn, G)
+            if reply[0] == "RL_SNAPSHOT":
+                (_, version, entries) = reply
+                self.revocation = RevocationList(G, SCHEME_GROUPS[self.scheme], version, entries)
+            else:
+                (_, since, version, ops) = reply
+                self.revocation.apply(since, version, ops)
+            with self.lock:
+                if self.revocation.version != self.rl_version:
+                    self.rl_version, self.RL = self.revocation.version, list(self.revocation)
+
+    def _refresh(self):
+        while not self.stopped.wait(self.rl_refresh):
+            try:
+                self.fetch_rl()
+            except (EOFError, OSError, CodecError, RevocationError):
+                pass
+
+    def serve(self):
+        if self.lea_port is not None:
+            threading.Thread(target=self._refresh, daemon=True).start()
+        super().serve()
+
+    def shutdown(self):
+        self.stopped.set()
+        super().shutdown()
+
+    def count(self, outcome):
+        with self.lock:
+            self.stats[outcome] += 1
+
+    def handle(self, conn):
+        (G, o, g1, g2, e) = self.params
+        request = recv_msg(conn, G)
+        if _tagged(request, "RESUME", 4):
+            self.resume(conn, request)
+            return
+        if not _tagged(request, "HELLO", 2) or not isinstance(request[1], G1Elem):
+            raise CodecError("expected HELLO or RESUME")
+        session = self.engine.xn_session()
+        (B, tau) = session.key_exchange(request[1])
+        send_msg(conn, ("KEX", B, tau))
+
+        with self.lock:
+            (RL, version) = (self.RL, self.rl_version)
+        show = recv_frame(conn)
+        (rejected, k_s) = session.verify(show, RL)
+        outcome = REJECTIONS.get(rejected, "invalid")
+        self.count(outcome)
+        if rejected is not None:
+            send_msg(conn, ("REJECT", outcome))
+            return
+        if self.audit_log is not None:
+            self.audit_log.append(show, session.keyEx)
+        send_msg(conn, ("ACCEPT",) if self.tickets is None else ("ACCEPT", self.tickets.issue(k_s, version)))
+
+    def resume(self, conn, request):
+        """
+        Answer a resumption request in one round, without pairings.
+
+        Parameters:
+            conn (socket): Connection of the UE
+            request (tuple): ("RESUME", ticket, n_ue, proof)
+        """
+        (_, ticket, n_ue, proof) = request
+        with self.lock:
+            version = self.rl_version
+        try:
+            if self.tickets is None:
+                raise TicketError("unsupported")
+            if not all(isinstance(field, bytes) for field in (ticket, n_ue, proof)):
+                raise TicketError("malformed")
+            rms = self.tickets.open(ticket, version)
+            if not hmac.compare_digest(proof, resume_proof(rms, ticket, n_ue)):
+                raise TicketError("invalid")
+            if self.replay_cache.check_and_add(sha256(ticket).digest()):
+                raise TicketError("replayed")
+        except TicketError as error:
+            self.count("resume_refused")
+            send_msg(conn, ("REJECT", "ticket " + error.reason))
+            return
+        self.count("resumed")
+        n_xn = os.urandom(16)
+        k_s = resumed_key(rms, n_ue, n_xn)
+        send_msg(conn, ("RESUMED", n_xn, resume_confirm(rms, n_ue, n_xn), self.tickets.issue(k_s, version)))
+
+
+class UE:
+    def __init__(self, scheme, params, ipk, tpk, Y, m, pm, cred):
+        """
+        Initialize the UE holding an issued credential.
+
+        Parameters:
+            scheme (str): "ps", "bb" or "ps_g1"
+            params (tuple): System parameters
+            ipk (list): Issuer public key
+            tpk (G2Elem): LEA public key
+            Y (G1Elem): XN public key
+            m (Bn): Message
+            pm (Bn): id
+            cred (tuple): Credential
+        """
+        self.scheme = make_scheme(scheme, params)
+        self.engine = Engine(self.scheme, ipk, tpk, Y)
+        self.params = params
+        self.ipk = ipk
+        self.tpk = tpk
+        self.Y = Y
+        self.m = m
+        self.pm = pm
+        self.cred = cred
+        self.k_s = None
+        self.ticket = None
+        self.rms = None
+
+    def show(self, keyEx):
+        """
+        Show the credential bound to a key exchange.
+
+        Parameters:
+            keyEx (tuple): Key exchange data (A, B, tau)
+
+        Returns:
+            tuple: Anonymous credential (Acred) and zero-knowledge proof
+        """
+        (Acred, pi, H) = self.scheme.CredShow(self.ipk, self.tpk, self.m, self.pm, self.cred, keyEx)
+        return (Acred, pi)
+
+    def attach(self, port, host='127.0.0.1', resume=False):
+        """
+        Run one authentication with the XN.
+
+        Parameters:
+            port (int): Port number of the XN
+            host (str): Address of the XN
+            resume (bool): Try the ticket of the last session before a full handshake
+
+        Returns:
+            str: "ACCEPT", "RESUMED", or the reason of the rejection
+        """
+        (G, o, g1, g2, e) = self.params
+        self.k_s = None
+        if resume and self.ticket is not None and self.resume(port, host):
+            return "RESUMED"
+        with socket.create_connection((host, port)) as conn:
+            session = self.engine.ue_session()
+            send_msg(conn, ("HELLO", session.A))
+            (_, B, tau) = recv_msg(conn, G)
+            k_s = session.key_exchange(B, tau)
+            if k_s is None:
+                send_msg(conn, ("ABORT",))
+                return "key exchange failed"
+            (Acred, pi) = self.show(session.keyEx)
+            send_msg(conn, ("SHOW", Acred, pi))
+            reply = recv_msg(conn, G)
+        if reply[0] == "ACCEPT":
+            self.k_s = k_s
+            self.rms = resumption_secret(self.k_s)
+            self.ticket = reply[1] if len(reply) > 1 else None
+            return "ACCEPT"
+        return reply[1]
+
+    def resume(self, port, host='127.0.0.1'):
+        """
+        Resume the last session with its ticket, in one round and without a show.
+
+        Parameters:
+            port (int): Port number of the XN
+            host (str): Address of the XN
+
+        Returns:
+            bool: True if the session was resumed, the ticket is dropped either way
+        """
+        (G, o, g1, g2, e) = self.params
+        (ticket, self.ticket) = (self.ticket, None)
+        n_ue = os.urandom(16)
+        with socket.create_connection((host, port)) as conn:
+            send_msg(conn, ("RESUME", ticket, n_ue, resume_proof(self.rms, ticket, n_ue)))
+            reply = recv_msg(conn, G)
+        if reply[0] != "RESUMED" or not hmac.compare_digest(reply[2], resume_confirm(self.rms, n_ue, reply[1])):
+            return False
+        self.k_s = resumed_key(self.rms, n_ue, reply[1])
+        self.rms = resumption_secret(self.k_s)
+        self.ticket = reply[3]
+        return True
+
+
+class WalletUE(UE):
+    def __init__(self, scheme, params, ipk, tpk, Y, wallet, device_id):
+        """
+        Initialize a UE whose credential stays in a wallet until it is shown.
+
+        Parameters:
+            scheme (str): "ps", "bb" or "ps_g1"
+            params (tuple): System parameters
+            ipk (list): Issuer public key
+            tpk (G2Elem): LEA public key
+            Y (G1Elem): XN public key
+            wallet (Wallet): Wallet holding the credential
+            device_id (int): Device id in the wallet
+        """
+        super().__init__(scheme, params, ipk, tpk, Y, None, None, None)
+        self.wallet = wallet
+        self.device_id = device_id
+
+    def show(self, keyEx):
+        (Acred, pi, H) = self.wallet.cred_show(self.scheme, self.ipk, self.tpk, self.device_id, keyEx)
+        return (Acred, pi)
@@ -6,16 +6,18 @@ from utils import *
 import time
 
 class AAKA_PS:
-    def __init__(self, suci, params):
+    def __init__(self, suci, params, exact=False):
         """
         Initialize the AAKA_PS class.
 
         Parameters:
             suci (str): Subscriber Concealed Identifier
             params (tuple): Public parameters (G, o, g1, g2, e)
+            exact (bool): Check every proof equation separately instead of one random linear combination per group
         """
         self.suci = suci
         self.params = params
+        self.exact = exact
 
     def IKeyGen(self, q):
         """
@@ -124,7 +126,14 @@ class AAKA_PS:
         (commit, list_s) = pi_2
         (cmt, cmt_hat) = commit
         ch = challenge(cmt + cmt_hat)
-        for i in range(len(cred) - 1):
+        if not self.exact:
+            w = random_weights(o, len(list_s))
+            terms = [(g2, sum((w[i] * list_s[i] for i in range(len(list_s))), Bn(0)))]
+            for i in range(len(list_s)):
+                terms += [(cmt_hat[i], -w[i]), (ipk[i], -w[i] * ch)]
+            return (check_combined(G, terms)
+                    and check_combined(G, [(cred[0], list_s[0] + m * list_s[1] + pm * list_s[2]), (cmt[0], -1), (cred[1], -ch)]))
+        for i in range(len(list_s)):
             if not (list_s[i] * g2 == cmt_hat[i] + ch * ipk[i]):
                 return False
         if not ((list_s[0] + m * list_s[1] + pm * list_s[2]) * cred[0] == cmt[0] + ch * cred[1]):
@@ -175,14 +184,29 @@ class AAKA_PS:
         Returns:
             tuple: Exchanged key (B) and hashed key (tau)
         """
+        (B, tau, self.k_s) = self.KeyExchange_XN_Key(A, Y, y)
+        return (B, tau)
+
+    def KeyExchange_XN_Key(self, A, Y, y):
+        """
+        Perform XN key exchange without keeping any state on the instance.
+
+        Parameters:
+            A (G1Elem): Key from user equipment
+            Y (G2Elem): Public key
+            y (Bn): Private key
+
+        Returns:
+            tuple: Exchanged key (B), hashed key (tau) and session key (k_s)
+        """
         (G, o, g1, g2, e) = self.params
         b = o.random()
         B = b * g1
         delta = challenge([Y, A, B])
         K = (b + delta * y) * A
         tau = crypto.getsha256(K.export(), (0).to_bytes(1, byteorder='big'))
-        self.k_s = crypto.getsha256(K.export(), (1).to_bytes(1, byteorder='big'))
-        return (B, tau)
+        k_s = crypto.getsha256(K.export(), (1).to_bytes(1, byteorder='big'))
+        return (B, tau, k_s)
 
     def KeyExchange_UE_Ver(self, Y, A, B, a, tau):
         """
@@ -198,14 +222,33 @@ class AAKA_PS:
         Returns:
             bool: Verification result
         """
+        k_s = self.KeyExchange_UE_Key(Y, A, B, a, tau)
+        if k_s is None:
+            return False
+        self.k_s = k_s
+        return True
+
+    def KeyExchange_UE_Key(self, Y, A, B, a, tau):
+        """
+        Verify user equipment key exchange without keeping any state on the instance.
+
+        Parameters:
+            Y (G2Elem): Public key
+            A (G1Elem): Key from user equipment
+            B (G1Elem): Exchanged key
+            a (Bn): Random value
+            tau (bytes): Hashed key
+
+        Returns:
+            bytes: Session key (k_s), None if the verification fails
+        """
         (G, o, g1, g2, e) = self.params
         delta = challenge([Y, A, B])
         K = a * (B + delta * Y)
         if tau == crypto.getsha256(K.export(), (0).to_bytes(1, byteorder='big')):
-            self.k_s = crypto.getsha256(K.export(), (1).to_bytes(1, byteorder='big'))
-            return True
+            return crypto.getsha256(K.export(), (1).to_bytes(1, byteorder='big'))
         else:
-            return False
+            return None
 
     def CredShow(self, ipk, tpk, m, pm, cred, keyEx):
         """
@@ -285,21 +328,116 @@ class AAKA_PS:
         Returns:
             bool: Verification result
         """
-        (G, o, g1, g2, e) = self.params
+        ctx = self.AcredVer_challenge(Acred, pi_3, keyEx)
+        return self.AcredVer_G1(ipk, tpk, Acred, pi_3, ctx) and self.AcredVer_G2(ipk, tpk, Acred, pi_3, ctx)
+
+    def AcredVer_wellformed(self, Acred, pi_3):
+        """
+        Check the shape and element types of a show.
+
+        Parameters:
+            Acred (tuple): Anonymous credential
+            pi_3 (tuple): Zero-knowledge proof
+
+        Returns:
+            bool: Verification result
+        """
+        (commit, list_s) = pi_3
+        return (len(Acred) == 7 and len(commit) == 4 and len(list_s) == 3
+                and all(isinstance(x, G1Elem) for x in (Acred[0], Acred[1], Acred[5], commit[3]))
+                and all(isinstance(x, G2Elem) for x in (Acred[2], Acred[3], Acred[4], commit[0], commit[1], commit[2]))
+                and all(isinstance(x, Bn) for x in [Acred[6]] + list(list_s)))
+
+    def AcredVer_challenge(self, Acred, pi_3, keyEx):
+        """
+        Recompute the hashes of a show.
+
+        Parameters:
+            Acred (tuple): Anonymous credential
+            pi_3 (tuple): Zero-knowledge proof
+            keyEx (tuple): Key exchange data
+
+        Returns:
+            tuple: Hash of the credential (h, with H = h * g1) and challenge (ch)
+        """
         (sigma_1_hat, sigma_2_hat, C1, C2, C3, C4, m) = Acred
         (commit, list_s) = pi_3
         (cmt_1, cmt_2, cmt_3, cmt_4) = commit
         (A, B, tau) = keyEx
-        H = challenge([sigma_1_hat, sigma_2_hat, C1, C2, C3, m]) * g1
+        h = challenge([sigma_1_hat, sigma_2_hat, C1, C2, C3, m])
         ch = challenge([cmt_1, cmt_2, cmt_3, cmt_4, A, B, tau])
-        eq_1 = list_s[0] * ipk[2] + list_s[1] * g2 == cmt_1 + ch * (C1 - (ipk[0] + m * ipk[1]))
-        eq_2 = list_s[2] * g2 == cmt_2 + ch * C2
-        eq_3 = list_s[2] * tpk + list_s[0] * g2 == cmt_3 + ch * C3
-        eq_4 = list_s[0] * H == cmt_4 + ch * C4
-        if eq_1 and eq_2 and eq_3 and eq_4:
-            return True
-        else:
+        return (h, ch)
+
+    def AcredVer_G1(self, ipk, tpk, Acred, pi_3, ctx):
+        """
+        Check the equations of relation 4 over G1.
+
+        Parameters:
+            ipk (list): Issuer public key
+            tpk (G2Elem): Trustee public key
+            Acred (tuple): Anonymous credential
+            pi_3 (tuple): Zero-knowledge proof
+            ctx (tuple): Output of AcredVer_challenge
+
+        Returns:
+            bool: Verification result
+        """
+        (G, o, g1, g2, e) = self.params
+        (sigma_1_hat, sigma_2_hat, C1, C2, C3, C4, m) = Acred
+        ((cmt_1, cmt_2, cmt_3, cmt_4), list_s) = pi_3
+        (h, ch) = ctx
+        if not self.exact:
+            return check_combined(G, [(g1, list_s[0] * h), (cmt_4, -1), (C4, -ch)])
+        H = h * g1
+        return list_s[0] * H == cmt_4 + ch * C4
+
+    def AcredVer_G2(self, ipk, tpk, Acred, pi_3, ctx):
+        """
+        Check the equations of relation 4 over G2 as one random linear combination,
+        or one at a time stopping at the first failure in exact mode.
+
+        Parameters:
+            ipk (list): Issuer public key
+            tpk (G2Elem): Trustee public key
+            Acred (tuple): Anonymous credential
+            pi_3 (tuple): Zero-knowledge proof
+            ctx (tuple): Output of AcredVer_challenge
+
+        Returns:
+            bool: Verification result
+        """
+        (G, o, g1, g2, e) = self.params
+        (sigma_1_hat, sigma_2_hat, C1, C2, C3, C4, m) = Acred
+        ((cmt_1, cmt_2, cmt_3, cmt_4), list_s) = pi_3
+        (h, ch) = ctx
+        if not self.exact:
+            (w1, w2, w3) = random_weights(o, 3)
+            return check_combined(G, [
+                (g2, w1 * list_s[1] + w2 * list_s[2] + w3 * list_s[0]),
+                (ipk[0], w1 * ch), (ipk[1], w1 * ch * m), (ipk[2], w1 * list_s[0]),
+                (cmt_1, -w1), (C1, -w1 * ch),
+                (cmt_2, -w2), (C2, -w2 * ch),
+                (tpk, w3 * list_s[2]), (cmt_3, -w3), (C3, -w3 * ch),
+            ])
+        if not list_s[2] * g2 == cmt_2 + ch * C2:
+            return False
+        if not list_s[2] * tpk + list_s[0] * g2 == cmt_3 + ch * C3:
             return False
+        return list_s[0] * ipk[2] + list_s[1] * g2 == cmt_1 + ch * (C1 - (ipk[0] + m * ipk[1]))
+
+    def AcredVer_pairing(self, Acred):
+        """
+        Check the pairing equation of the randomized signature.
+
+        Parameters:
+            Acred (tuple): Anonymous credential
+
+        Returns:
+            bool: Verification result
+        """
+        (G, o, g1, g2, e) = self.params
+        (sigma_1_hat, sigma_2_hat, C1, C2, C3, C4, m) = Acred
+        return e(sigma_1_hat, C1) == e(sigma_2_hat, g2)
 
     def AcredVer(self, ipk, tpk, m, Acred, pi_3, keyEx):
         """
@@ -316,13 +454,71 @@ class AAKA_PS:
         Returns:
             bool: Verification result
         """
-        (G, o, g1, g2, e) = self.params
-        (sigma_1_hat, sigma_2_hat, C1, C2, C3, C4, m) = Acred
-        if e(sigma_1_hat, C1) == e(sigma_2_hat, g2) and self.ZK_Verify_Relation_4(ipk, tpk, Acred, pi_3, keyEx):
+        # Cheapest checks first: the proof equations before the two pairings
+        if self.ZK_Verify_Relation_4(ipk, tpk, Acred, pi_3, keyEx) and self.AcredVer_pairing(Acred):
             return True
         else:
             return False
 
+    def AcredVer_pairing_terms(self, Acred):
+        """
+        Pairing equation of the randomized signature as pairs whose pairings multiply to one.
+
+        Parameters:
+            Acred (tuple): Anonymous credential
+
+        Returns:
+            list: (G1Elem, G2Elem) pairs
+        """
+        (G, o, g1, g2, e) = self.params
+        (sigma_1_hat, sigma_2_hat, C1, C2, C3, C4, m) = Acred
+        return [(sigma_1_hat, C1), (-sigma_2_hat, g2)]
+
+    def AcredVer_proof(self, ipk, tpk, Acred, pi_3, keyEx):
+        """
+        Check the shape and the proof of one show of a batch, a malformed
+        show being rejected instead of raising.
+
+        Parameters:
+            ipk (list): Issuer public key
+            tpk (G2Elem): Trustee public key
+            Acred (tuple): Anonymous credential
+            pi_3 (tuple): Zero-knowledge proof
+            keyEx (tuple): Key exchange data
+
+        Returns:
+            bool: Verification result
+        """
+        try:
+            return self.AcredVer_wellformed(Acred, pi_3) and self.ZK_Verify_Relation_4(ipk, tpk, Acred, pi_3, keyEx)
+        except Exception:
+            return False
+
+    def batch_AcredVer(self, ipk, tpk, items):
+        """
+        Verify several anonymous credentials at once.
+
+        The proofs are checked one by one, then the pairing equations of the
+        shows whose proofs hold are checked together with one multi-pairing.
+        Only if that fails are they checked one by one to find the bad shows.
+        A malformed show is rejected on its own, the others still verify.
+
+        Parameters:
+            ipk (list): Issuer public key
+            tpk (G2Elem): Trustee public key
+            items (list): (m, Acred, pi_3, keyEx) of every show
+
+        Returns:
+            list: Verification result of every show
+        """
+        (G, o, g1, g2, e) = self.params
+        results = [self.AcredVer_proof(ipk, tpk, Acred, pi_3, keyEx) for (m, Acred, pi_3, keyEx) in items]
+        passed = [i for i in range(len(items)) if results[i]]
+        if passed and not check_pairings(G, [self.AcredVer_pairing_terms(items[i][1]) for i in passed]):
+            for i in passed:
+                results[i] = self.AcredVer_pairing(items[i][1])
+        return results
+
     def Trace(self, tsk, Acred):
         """
         Trace an anonymous credential.
@@ -339,6 +535,19 @@ class AAKA_PS:
         tm = C3 - tsk * C2
         return tm
 
+    def Trace_batch(self, tsk, Acreds):
+        """
+        Trace several anonymous credentials.
+
+        Parameters:
+            tsk (Bn): Trustee secret key
+            Acreds (list): Anonymous credentials
+
+        Returns:
+            list: Traced message of every credential
+        """
+        return elgamal_dec_batch(self.params, tsk, [(Acred[3], Acred[4]) for Acred in Acreds])
+
     def judge(self, Acred, RL):
         """
         Judge if a user is revoked.
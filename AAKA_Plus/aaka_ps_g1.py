@@ -0,0 +1,197 @@
+from aaka_ps import AAKA_PS
+from utils import *
+
+
+class AAKA_PS_G1(AAKA_PS):
+    """
+    AAKA+PS with the tracing ciphertext in G1.
+
+    The LEA key tpk, the ElGamal ciphertext (C2, C3) of the identity and the
+    commitments proving it move from G2 to G1, and the hashed key H and
+    C4 = pm * H move to G2 instead, so the UE does most of its show in the
+    cheaper group. C1 stays in G2 for the pairing with the randomized
+    signature. Traced messages are pm * g1, and judge checks
+    e(tm, H) == e(g1, C4).
+    """
+
+    def LEAKeyGen(self):
+        """
+        Generate LEA key pair.
+
+        Returns:
+            tuple: LEA secret key (tsk) and LEA public key (tpk, in G1)
+        """
+        (G, o, g1, g2, e) = self.params
+        tsk = o.random()
+        tpk = tsk * g1
+        return (tsk, tpk)
+
+    def CredShow(self, ipk, tpk, m, pm, cred, keyEx):
+        """
+        Show a credential.
+
+        Parameters:
+            ipk (list): Issuer public key
+            tpk (G1Elem): Trustee public key
+            m (Bn): Message
+            pm (Bn): id
+            cred (tuple): Credential
+            keyEx (tuple): Key exchange data
+
+        Returns:
+            tuple: Anonymous credential (Acred), zero-knowledge proof (pi_3), and hashed key (H, in G2)
+        """
+        (G, o, g1, g2, e) = self.params
+        (sigma_1, sigma_2) = cred
+        r, t, u = o.random(), o.random(), o.random()
+        sigma_1_hat = r * sigma_1
+        sigma_2_hat = r * sigma_2 + t * sigma_1_hat
+        C1 = ipk[0] + m * ipk[1] + pm * ipk[2] + t * g2
+        C2 = u * g1
+        C3 = u * tpk + pm * g1
+        H = challenge([sigma_1_hat, sigma_2_hat, C1, C2, C3, m]) * g2
+        C4 = pm * H
+        Acred = (sigma_1_hat, sigma_2_hat, C1, C2, C3, C4, m)
+        witness = (pm, t, u)
+        pi_3 = self.ZK_prove_Relation_4(Acred, witness, ipk, tpk, H, keyEx)
+        return (Acred, pi_3, H)
+
+    def ZK_prove_Relation_4(self, stm, witness, ipk, tpk, H, keyEx):
+        """
+        Prove zero-knowledge relation 4.
+
+        Parameters:
+            stm (tuple): Statement
+            witness (tuple): Witness
+            ipk (list): Issuer public key
+            tpk (G1Elem): Trustee public key
+            H (G2Elem): Hashed key
+            keyEx (tuple): Key exchange data
+
+        Returns:
+            tuple: Commitment (commit) and responses (list_s)
+        """
+        (G, o, g1, g2, e) = self.params
+        (A, B, tau) = keyEx
+        rho_list = [o.random() for _ in range(len(witness))]
+        cmt_1 = rho_list[0] * ipk[2] + rho_list[1] * g2
+        cmt_2 = rho_list[2] * g1
+        cmt_3 = rho_list[0] * g1 + rho_list[2] * tpk
+        cmt_4 = rho_list[0] * H
+        ch = challenge([cmt_1, cmt_2, cmt_3, cmt_4, A, B, tau])
+        list_s = [rho_list[i] + witness[i] * ch for i in range(len(witness))]
+        commit = (cmt_1, cmt_2, cmt_3, cmt_4)
+        return (commit, list_s)
+
+    def AcredVer_wellformed(self, Acred, pi_3):
+        """
+        Check the shape and element types of a show.
+
+        Parameters:
+            Acred (tuple): Anonymous credential
+            pi_3 (tuple): Zero-knowledge proof
+
+        Returns:
+            bool: Verification result
+        """
+        (commit, list_s) = pi_3
+        return (len(Acred) == 7 and len(commit) == 4 and len(list_s) == 3
+                and all(isinstance(x, G1Elem) for x in (Acred[0], Acred[1], Acred[3], Acred[4], commit[1], commit[2]))
+                and all(isinstance(x, G2Elem) for x in (Acred[2], Acred[5], commit[0], commit[3]))
+                and all(isinstance(x, Bn) for x in [Acred[6]] + list(list_s)))
+
+    def AcredVer_G1(self, ipk, tpk, Acred, pi_3, ctx):
+        """
+        Check the equations of relation 4 over G1 (the tracing ciphertext) as one
+        random linear combination, or one at a time stopping at the first failure
+        in exact mode.
+
+        Parameters:
+            ipk (list): Issuer public key
+            tpk (G1Elem): Trustee public key
+            Acred (tuple): Anonymous credential
+            pi_3 (tuple): Zero-knowledge proof
+            ctx (tuple): Output of AcredVer_challenge
+
+        Returns:
+            bool: Verification result
+        """
+        (G, o, g1, g2, e) = self.params
+        (sigma_1_hat, sigma_2_hat, C1, C2, C3, C4, m) = Acred
+        ((cmt_1, cmt_2, cmt_3, cmt_4), list_s) = pi_3
+        (h, ch) = ctx
+        if not self.exact:
+            (w1, w2) = random_weights(o, 2)
+            return check_combined(G, [
+                (g1, w1 * list_s[2] + w2 * list_s[0]), (cmt_2, -w1), (C2, -w1 * ch),
+                (tpk, w2 * list_s[2]), (cmt_3, -w2), (C3, -w2 * ch),
+            ])
+        if not list_s[2] * g1 == cmt_2 + ch * C2:
+            return False
+        return list_s[2] * tpk + list_s[0] * g1 == cmt_3 + ch * C3
+
+    def AcredVer_G2(self, ipk, tpk, Acred, pi_3, ctx):
+        """
+        Check the equations of relation 4 over G2 (C1 and C4) as one random linear
+        combination, or one at a time stopping at the first failure in exact mode.
+
+        Parameters:
+            ipk (list): Issuer public key
+            tpk (G1Elem): Trustee public key
+            Acred (tuple): Anonymous credential
+            pi_3 (tuple): Zero-knowledge proof
+            ctx (tuple): Output of AcredVer_challenge
+
+        Returns:
+            bool: Verification result
+        """
+        (G, o, g1, g2, e) = self.params
+        (sigma_1_hat, sigma_2_hat, C1, C2, C3, C4, m) = Acred
+        ((cmt_1, cmt_2, cmt_3, cmt_4), list_s) = pi_3
+        (h, ch) = ctx
+        if not self.exact:
+            (w1, w2) = random_weights(o, 2)
+            return check_combined(G, [
+                (g2, w1 * list_s[1] + w2 * list_s[0] * h),
+                (ipk[0], w1 * ch), (ipk[1], w1 * ch * m), (ipk[2], w1 * list_s[0]),
+                (cmt_1, -w1), (C1, -w1 * ch),
+                (cmt_4, -w2), (C4, -w2 * ch),
+            ])
+        if not list_s[0] * (h * g2) == cmt_4 + ch * C4:
+            return False
+        return list_s[0] * ipk[2] + list_s[1] * g2 == cmt_1 + ch * (C1 - (ipk[0] + m * ipk[1]))
+
+    def Trace(self, tsk, Acred):
+        """
+        Trace an anonymous credential.
+
+        Parameters:
+            tsk (Bn): Trustee secret key
+            Acred (tuple): Anonymous credential
+
+        Returns:
+            G1Elem: Traced message
+        """
+        (sigma_1_hat, sigma_2_hat, C1, C2, C3, C4, m) = Acred
+        tm = C3 - tsk * C2
+        return tm
+
+    def judge(self, Acred, RL):
+        """
+        Judge if a user is revoked.
+
+        Parameters:
+            Acred (tuple): Anonymous credential
+            RL (list): Revocation list of traced messages in G1
+
+        Returns:
+            bool: Judge result
+        """
+        (G, o, g1, g2, e) = self.params
+        (sigma_1_hat, sigma_2_hat, C1, C2, C3, C4, m) = Acred
+        H = challenge([sigma_1_hat, sigma_2_hat, C1, C2, C3, m]) * g2
+        target = e(g1, C4)
+        for i in range(len(RL)):
+            if e(RL[i], H) == target:
+                return True
+        return False
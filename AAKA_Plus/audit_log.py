@@ -0,0 +1,298 @@
+""" Append-only audit log of verified shows, and a streaming parallel Trace over it """
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from codec import encode, decode
+from utils import setup
+
+MAGIC = b"AAKASHW1"
+
+# magic, scheme
+_SEGMENT = struct.Struct(">8s8s")
+# payload length, CRC-32 of the payload, timestamp in ns, length of the show within the payload
+_RECORD = struct.Struct(">IIQI")
+
+
+class AuditLogError(Exception):
+    pass
+
+
+def segment_name(number):
+    return "shows-%08d.log" % number
+
+
+def segments(directory):
+    """
+    List the segment files of a log, oldest first.
+
+    Parameters:
+        directory (str): Log directory
+
+    Returns:
+        list: Paths of the segments
+    """
+    names = sorted(name for name in os.listdir(directory) if name.startswith("shows-") and name.endswith(".log"))
+    return [os.path.join(directory, name) for name in names]
+
+
+class AuditLog:
+    def __init__(self, directory, scheme, segment_bytes=64 << 20, batch_bytes=1 << 20, flush_interval=0.2):
+        """
+        Initialize the AuditLog class.
+
+        Verified shows are appended to a buffer that a writer thread empties
+        with one write per batch, when batch_bytes are pending or every
+        flush_interval seconds. The log is a sequence of segment files,
+        and a new segment is started once the current one reaches
+        segment_bytes. Each record carries a CRC so that a record torn by a
+        crash ends the segment cleanly when it is read back.
+
+        Parameters:
+            directory (str): Log directory, created if needed
+            scheme (str): "ps", "bb" or "ps_g1"
+            segment_bytes (int): Size after which a new segment is started
+            batch_bytes (int): Pending bytes that wake the writer up early
+            flush_interval (float): Longest time in seconds a record stays in memory
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.scheme = scheme
+        self.segment_bytes = segment_bytes
+        self.batch_bytes = batch_bytes
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.buffered = 0
+        self.records = 0
+        self.batches = 0
+        self.condition = threading.Condition()
+        self.written = threading.Condition(self.condition)
+        self.generation = 0
+        self.closed = False
+
+        existing = segments(directory)
+        self.number = int(os.path.basename(existing[-1])[6:14]) if existing else 0
+        self.file = None
+        self._open_segment(self.number if existing else 1)
+        self.writer = threading.Thread(target=self._write, daemon=True)
+        self.writer.start()
+
+    def _open_segment(self, number):
+        if self.file is not None:
+            self.file.close()
+        self.number = number
+        path = os.path.join(self.directory, segment_name(number))
+        self.file = open(path, "ab")
+        size = self.file.tell()
+        if 0 < size:
+            (scheme, end) = _intact_end(path) if size >= _SEGMENT.size else (self.scheme, 0)
+            if scheme != self.scheme:
+                self.file.close()
+                self.file = None
+                raise AuditLogError("%s holds %s shows, not %s" % (path, scheme, self.scheme))
+            # Records appended after a record torn by a crash could never be read back
+            if end < size:
+                self.file.truncate(end)
+                self.file.seek(end)
+        if self.file.tell() == 0:
+            self.file.write(_SEGMENT.pack(MAGIC, self.scheme.encode("ascii")))
+
+    def append(self, show, keyEx):
+        """
+        Queue a verified show and its key exchange transcript.
+
+        Parameters:
+            show (bytes or tuple): Encoded ("SHOW", Acred, pi) message, or the decoded (Acred, pi)
+            keyEx (tuple): Key exchange data (A, B, tau)
+        """
+        if not isinstance(show, (bytes, bytearray)):
+            show = encode(("SHOW",) + tuple(show))
+        payload = bytes(show) + encode(keyEx)
+        record = _RECORD.pack(len(payload), zlib.crc32(payload), time.time_ns(), len(show)) + payload
+        with self.condition:
+            if self.closed:
+                raise AuditLogError("the log is closed")
+            self.buffer.append(record)
+            self.buffered += len(record)
+            self.records += 1
+            if self.buffered >= self.batch_bytes:
+                self.condition.notify_all()
+
+    def _write(self):
+        while True:
+            with self.condition:
+                if not self.buffer and not self.closed:
+                    self.condition.wait(self.flush_interval)
+                (batch, self.buffer, self.buffered) = (self.buffer, [], 0)
+                closed = self.closed
+            if batch:
+                if self.file.tell() >= self.segment_bytes:
+                    self._open_segment(self.number + 1)
+                self.file.write(b"".join(batch))
+                self.file.flush()
+                self.batches += 1
+            with self.condition:
+                self.generation += 1
+                self.written.notify_all()
+            if closed and not batch:
+                return
+
+    def flush(self):
+        """
+        Wait until every queued record is written to its segment.
+        """
+        with self.condition:
+            target = self.generation + 2
+            self.condition.notify_all()
+            while self.generation < target and self.writer.is_alive():
+                self.written.wait(0.1)
+
+    def close(self):
+        """
+        Write the queued records and close the current segment.
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.writer.join()
+        self.file.close()
+
+    def stats(self):
+        """
+        Report the writer counters.
+
+        Returns:
+            dict: Records appended, batches written, current segment number
+        """
+        with self.condition:
+            return {"records": self.records, "batches": self.batches, "segment": self.number}
+
+
+def _records(view):
+    # Intact records of a mapped segment, and the offset just after the last one
+    records = []
+    offset = _SEGMENT.size
+    while offset + _RECORD.size <= len(view):
+        (length, crc, timestamp, show_length) = _RECORD.unpack_from(view, offset)
+        end = offset + _RECORD.size + length
+        # A torn record can only be the last one written before a crash
+        if end > len(view) or zlib.crc32(view[offset + _RECORD.size:end]) != crc:
+            break
+        records.append((offset, timestamp))
+        offset = end
+    return (records, offset)
+
+
+def _header(path, view):
+    (magic, scheme) = _SEGMENT.unpack_from(view, 0)
+    if magic != MAGIC:
+        raise AuditLogError("%s is not a show log segment" % path)
+    return scheme.rstrip(b"\0").decode("ascii", "replace")
+
+
+def _intact_end(path):
+    # Scheme of a segment and the offset just after its last intact record
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as view:
+        return (_header(path, view), _records(view)[1])
+
+
+def scan(path):
+    """
+    Find the records of a segment without decoding them.
+
+    Parameters:
+        path (str): Segment file
+
+    Returns:
+        tuple: Scheme name and the list of (offset, timestamp) of every intact record
+    """
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as view:
+        return (_header(path, view), _records(view)[0])
+
+
+def read_record(path, offset, G):
+    """
+    Decode one record of a segment.
+
+    Parameters:
+        path (str): Segment file
+        offset (int): Offset of the record, as yielded by scan or trace
+        G (BpGroup): Pairing group
+
+    Returns:
+        tuple: Timestamp in ns, anonymous credential, zero-knowledge proof and key exchange data
+    """
+    with open(path, "rb") as file:
+        file.seek(offset)
+        (length, crc, timestamp, show_length) = _RECORD.unpack(file.read(_RECORD.size))
+        payload = file.read(length)
+    (_, Acred, pi) = decode(G, payload[:show_length])
+    return (timestamp, Acred, pi, decode(G, payload[show_length:]))
+
+
+_worker = {}
+
+
+def _trace_chunk(scheme, path, offsets, tsk, target):
+    # Each worker process sets the parameters and scheme up once
+    if _worker.get("name") != scheme:
+        from aaka_net import make_scheme
+        params = setup(3)
+        _worker.update(name=scheme, params=params, scheme=make_scheme(scheme, params))
+    G = _worker["params"][0]
+    instance = _worker["scheme"]
+    tsk = decode(G, tsk)
+    matches = []
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as view:
+        for (offset, timestamp) in offsets:
+            (length, crc, _, show_length) = _RECORD.unpack_from(view, offset)
+            start = offset + _RECORD.size
+            (_, Acred, pi) = decode(G, view[start:start + show_length])
+            if instance.Trace(tsk, Acred).export() == target:
+                matches.append((path, offset, timestamp))
+    return matches
+
+
+def trace(directory, tsk, target, jobs=None, chunk=1024, executor=None):
+    """
+    Stream the shows of a log that trace to a target identity.
+
+    Segments are scanned one at a time through a memory mapping and cut into
+    chunks of records. Worker processes decode the shows of each chunk and
+    apply Trace with tsk, with at most two chunks per worker in flight, so
+    memory stays bounded whatever the size of the log. Matches are yielded
+    in log order.
+
+    Parameters:
+        directory (str): Log directory
+        tsk (Bn): LEA secret key
+        target (G2Elem): Traced message of the identity looked for
+        jobs (int): Worker processes (default: one per CPU)
+        chunk (int): Records per task
+        executor (Executor): Executor to run the chunks on instead of a new process pool
+
+    Yields:
+        tuple: Segment path, record offset and timestamp in ns of every matching show
+    """
+    tsk = encode(tsk)
+    target = target.export()
+    pool = executor or ProcessPoolExecutor(jobs)
+    window = 2 * (jobs or os.cpu_count() or 1)
+    pending = []
+    try:
+        for path in segments(directory):
+            (scheme, records) = scan(path)
+            for i in range(0, len(records), chunk):
+                pending.append(pool.submit(_trace_chunk, scheme, path, records[i:i + chunk], tsk, target))
+                while len(pending) >= window:
+                    yield from pending.pop(0).result()
+        for future in pending:
+            yield from future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+        if executor is None:
+            pool.shutdown()
@@ -0,0 +1,231 @@
+""" Binary codec and message framing for the AAKA+ network entities """
+import struct
+from bplib.bp import G1Elem, G2Elem
+from petlib.bn import Bn
+
+# Type tags
+BN, G1, G2, BYTES, STR, INT, BOOL, NONE, TUPLE, LIST = range(1, 11)
+
+# Largest frame accepted from the network
+MAX_FRAME = 1 << 24
+
+_LENGTH = struct.Struct(">I")
+
+
+class CodecError(Exception):
+    pass
+
+
+def _pack(out, value):
+    if isinstance(value, Bn):
+        negative = value < 0
+        data = (-value if negative else value).binary()
+        out.append(bytes([BN, int(negative)]))
+        out.append(_LENGTH.pack(len(data)))
+        out.append(data)
+    elif isinstance(value, G1Elem):
+        data = value.export()
+        out.append(bytes([G1]))
+        out.append(_LENGTH.pack(len(data)))
+        out.append(data)
+    elif isinstance(value, G2Elem):
+        data = value.export()
+        out.append(bytes([G2]))
+        out.append(_LENGTH.pack(len(data)))
+        out.append(data)
+    elif isinstance(value, (bytes, bytearray)):
+        out.append(bytes([BYTES]))
+        out.append(_LENGTH.pack(len(value)))
+        out.append(bytes(value))
+    elif isinstance(value, str):
+        data = value.encode("utf8")
+        out.append(bytes([STR]))
+        out.append(_LENGTH.pack(len(data)))
+        out.append(data)
+    elif isinstance(value, bool):
+        out.append(bytes([BOOL, int(value)]))
+    elif isinstance(value, int):
+        data = value.to_bytes((value.bit_length() + 8) // 8, "big", signed=True)
+        out.append(bytes([INT]))
+        out.append(_LENGTH.pack(len(data)))
+        out.append(data)
+    elif value is None:
+        out.append(bytes([NONE]))
+    elif isinstance(value, (tuple, list)):
+        out.append(bytes([TUPLE if isinstance(value, tuple) else LIST]))
+        out.append(_LENGTH.pack(len(value)))
+        for item in value:
+            _pack(out, item)
+    else:
+        raise CodecError("cannot encode %s" % type(value).__name__)
+
+
+def encode(value):
+    """
+    Encode a value into its type-tagged binary form.
+
+    Parameters:
+        value: Bn, G1Elem, G2Elem, bytes, str, int, bool, None, or a tuple/list of those
+
+    Returns:
+        bytes: Encoded value
+    """
+    out = []
+    _pack(out, value)
+    return b"".join(out)
+
+
+def _unpack(G, data, offset):
+    try:
+        tag = data[offset]
+    except IndexError:
+        raise CodecError("truncated value")
+    offset += 1
+    if tag == NONE:
+        return None, offset
+    if tag == BOOL:
+        return data[offset] == 1, offset + 1
+    if tag == BN:
+        negative = data[offset] == 1
+        offset += 1
+    if tag in (TUPLE, LIST):
+        (count,) = _LENGTH.unpack_from(data, offset)
+        offset += _LENGTH.size
+        items = []
+        for _ in range(count):
+            item, offset = _unpack(G, data, offset)
+            items.append(item)
+        return (tuple(items) if tag == TUPLE else items), offset
+
+    (length,) = _LENGTH.unpack_from(data, offset)
+    offset += _LENGTH.size
+    body = data[offset:offset + length]
+    if len(body) != length:
+        raise CodecError("truncated value")
+    offset += length
+    if tag == BN:
+        value = Bn.from_binary(body)
+        return (-value if negative else value), offset
+    if tag == G1:
+        return G1Elem.from_bytes(body, G), offset
+    if tag == G2:
+        return G2Elem.from_bytes(body, G), offset
+    if tag == BYTES:
+        return body, offset
+    if tag == STR:
+        return body.decode("utf8"), offset
+    if tag == INT:
+        return int.from_bytes(body, "big", signed=True), offset
+    raise CodecError("unknown tag %d" % tag)
+
+
+def decode(G, data):
+    """
+    Decode a value produced by encode.
+
+    Parameters:
+        G (BpGroup): Pairing group of the encoded points
+        data (bytes): Encoded value
+
+    Returns:
+        Decoded value
+    """
+    try:
+        value, offset = _unpack(G, bytes(data), 0)
+    except CodecError:
+        raise
+    except Exception as exc:
+        raise CodecError("malformed value: %s" % exc)
+    if offset != len(data):
+        raise CodecError("trailing bytes")
+    return value
+
+
+def _recv_exact(sock, n):
+    chunks = []
+    while n:
+        chunk = sock.recv(n)
+        if not chunk:
+            raise EOFError("connection closed")
+        chunks.append(chunk)
+        n -= len(chunk)
+    return b"".join(chunks)
+
+
+def send_msg(sock, value):
+    """
+    Send one length-prefixed message.
+
+    Parameters:
+        sock (socket): Connected socket
+        value: Message to encode
+    """
+    data = encode(value)
+    sock.sendall(_LENGTH.pack(len(data)) + data)
+
+
+def recv_frame(sock):
+    """
+    Receive one length-prefixed message without decoding it.
+
+    Parameters:
+        sock (socket): Connected socket
+
+    Returns:
+        bytes: Encoded message
+    """
+    (length,) = _LENGTH.unpack(_recv_exact(sock, _LENGTH.size))
+    if length > MAX_FRAME:
+        raise CodecError("frame of %d bytes exceeds the limit" % length)
+    return _recv_exact(sock, length)
+
+
+def recv_msg(sock, G):
+    """
+    Receive one length-prefixed message.
+
+    Parameters:
+        sock (socket): Connected socket
+        G (BpGroup): Pairing group of the received points
+
+    Returns:
+        Decoded message
+    """
+    return decode(G, recv_frame(sock))
+
+
+def write_frame(file, data):
+    """
+    Write one length-prefixed encoded value to a binary file or stream.
+
+    Parameters:
+        file (file): Binary file open for writing
+        data (bytes): Encoded value
+    """
+    file.write(_LENGTH.pack(len(data)))
+    file.write(data)
+
+
+def read_frames(file):
+    """
+    Read the length-prefixed encoded values of a binary file or stream one at a time.
+
+    Parameters:
+        file (file): Binary file open for reading
+
+    Yields:
+        bytes: Encoded value
+    """
+    while True:
+        header = file.read(_LENGTH.size)
+        if not header:
+            return
+        if len(header) < _LENGTH.size:
+            raise CodecError("truncated frame header")
+        (length,) = _LENGTH.unpack(header)
+        if length > MAX_FRAME:
+            raise CodecError("frame of %d bytes exceeds the limit" % length)
+        data = file.read(length)
+        if len(data) != length:
+            raise CodecError("truncated frame")
+        yield data
@@ -0,0 +1,32 @@
+import pytest
+from aaka_ps import AAKA_PS
+from aaka_ps_g1 import AAKA_PS_G1
+from utils import setup
+
+def issue_and_show(scheme):
+    (G, o, g1, g2, e) = scheme.params
+    (isk, ipk) = scheme.IKeyGen(3)
+    (tsk, tpk) = scheme.LEAKeyGen()
+    (m, pm) = (o.random(), o.random())
+    (cred, pi_cred) = scheme.CredIssue(isk, ipk, m, pm)
+    keyEx = (o.random() * g1, o.random() * g1, b"tau")
+    (Acred, pi_show, H) = scheme.CredShow(ipk, tpk, m, pm, cred, keyEx)
+    return (scheme, ipk, tsk, tpk, m, Acred, pi_show, keyEx)
+
+@pytest.fixture
+def ps_show():
+    return issue_and_show(AAKA_PS("supi", setup(3)))
+
+@pytest.fixture
+def ps_g1_show():
+    return issue_and_show(AAKA_PS_G1("supi", setup(3)))
+
+@pytest.fixture
+def tamper():
+    def tamper(pi, i):
+        # Shift one response of a proof
+        (commit, list_s) = pi
+        list_s = list(list_s)
+        list_s[i] = list_s[i] + 1
+        return (commit, list_s)
+    return tamper
@@ -0,0 +1,173 @@
+""" Opt-in counters of the group operations, pairings and hashes done by the AAKA+ schemes """
+import functools
+import sys
+import threading
+from bplib.bp import BpGroup, G1Elem, G2Elem, GTElem
+import crypto
+import utils
+
+# Counted primitives, in table order
+PRIMITIVES = [
+    "g1_mul", "g1_add", "g1_msm", "g1_msm_terms", "g1_table_mul",
+    "g2_mul", "g2_add", "g2_msm", "g2_msm_terms", "g2_table_mul",
+    "gt_mul", "gt_exp", "miller_loop", "final_exp",
+    "hash_g1", "challenge_hash", "sha256",
+]
+
+_lock = threading.Lock()
+_counts = dict.fromkeys(PRIMITIVES, 0)
+_originals = {}
+
+
+def count(name, n=1):
+    with _lock:
+        _counts[name] += n
+
+
+def _method(cls, attr, name):
+    func = getattr(cls, attr)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        count(name)
+        return func(*args, **kwargs)
+    return (cls, attr, func, wrapper)
+
+
+def _pair(func):
+    @functools.wraps(func)
+    def wrapper(self, g1, g2):
+        count("miller_loop")
+        count("final_exp")
+        return func(self, g1, g2)
+    return wrapper
+
+
+def _table(func):
+    @functools.wraps(func)
+    def wrapper(self, x):
+        count("g1_table_mul" if self.cls is G1Elem else "g2_table_mul")
+        return func(self, x)
+    return wrapper
+
+
+def _msm(func):
+    @functools.wraps(func)
+    def wrapper(G, points, scalars):
+        group = "g1" if isinstance(points[0], G1Elem) else "g2"
+        count(group + "_msm")
+        count(group + "_msm_terms", len(points))
+        return func(G, points, scalars)
+    return wrapper
+
+
+def _multi_pairing(func):
+    @functools.wraps(func)
+    def wrapper(G, pairs):
+        count("miller_loop", len(pairs))
+        count("final_exp")
+        return func(G, pairs)
+    return wrapper
+
+
+def _hashing(func, name):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        count(name)
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def enable():
+    """
+    Start counting.
+
+    The bplib point methods are wrapped in place, and the multi-scalar
+    multiplication, multi-pairing and hash helpers are replaced in every
+    loaded module that imported them, so counting costs nothing until it
+    is enabled. Modules imported while counting is on are not patched.
+    """
+    with _lock:
+        if _originals:
+            return
+        methods = [
+            _method(G1Elem, "mul", "g1_mul"), _method(G1Elem, "add", "g1_add"), _method(G1Elem, "double", "g1_add"),
+            _method(G2Elem, "mul", "g2_mul"), _method(G2Elem, "add", "g2_add"), _method(G2Elem, "double", "g2_add"),
+            _method(GTElem, "mul", "gt_mul"), _method(GTElem, "exp", "gt_exp"),
+            _method(BpGroup, "hashG1", "hash_g1"),
+        ]
+        methods.append((BpGroup, "pair", BpGroup.pair, _pair(BpGroup.pair)))
+        methods.append((utils.FixedBaseTable, "mul", utils.FixedBaseTable.mul, _table(utils.FixedBaseTable.mul)))
+        functions = [
+            (utils.ec_msm, _msm(utils.ec_msm)),
+            (utils.multi_pairing, _multi_pairing(utils.multi_pairing)),
+            (utils.challenge, _hashing(utils.challenge, "challenge_hash")),
+            (crypto.getsha256, _hashing(crypto.getsha256, "sha256")),
+        ]
+        for (cls, attr, func, wrapper) in methods:
+            setattr(cls, attr, wrapper)
+        replaced = []
+        for module in list(sys.modules.values()):
+            namespace = getattr(module, "__dict__", None)
+            if not namespace:
+                continue
+            for (func, wrapper) in functions:
+                for (attr, value) in list(namespace.items()):
+                    if value is func:
+                        namespace[attr] = wrapper
+                        replaced.append((namespace, attr, func))
+        _originals.update(methods=methods, replaced=replaced)
+
+
+def disable():
+    """
+    Stop counting and restore the original functions.
+    """
+    with _lock:
+        if not _originals:
+            return
+        for (cls, attr, func, wrapper) in _originals["methods"]:
+            setattr(cls, attr, func)
+        for (namespace, attr, func) in _originals["replaced"]:
+            namespace[attr] = func
+        _originals.clear()
+
+
+def reset():
+    with _lock:
+        for name in _counts:
+            _counts[name] = 0
+
+
+def snapshot():
+    """
+    Read the counters.
+
+    Returns:
+        dict: Count of every primitive done since the last reset, zero counts left out
+    """
+    with _lock:
+        return {name: n for (name, n) in _counts.items() if n}
+
+
+def counted(func, *args):
+    """
+    Count the primitives of one call.
+
+    Parameters:
+        func (function): The operation
+        args: Arguments of the operation
+
+    Returns:
+        dict: Count of every primitive done by the call
+    """
+    was_enabled = bool(_originals)
+    enable()
+    before = snapshot()
+    try:
+        func(*args)
+        after = snapshot()
+    finally:
+        if not was_enabled:
+            disable()
+    return {name: n - before.get(name, 0) for (name, n) in after.items() if n != before.get(name, 0)}
@@ -0,0 +1,183 @@
+""" Time-windowed replay cache for credential shows """
+import math
+import sys
+import threading
+import time
+from collections import OrderedDict
+from hashlib import sha256
+from codec import encode
+
+
+def show_key(Acred, pi, tau=b""):
+    """
+    Digest identifying a credential show.
+
+    Parameters:
+        Acred (tuple): Anonymous credential
+        pi (tuple): Zero-knowledge proof
+        tau (bytes): Key exchange tag the show was presented with
+
+    Returns:
+        bytes: SHA-256 digest of the encoded show and tau
+    """
+    H = sha256()
+    H.update(encode((Acred, pi)))
+    H.update(tau)
+    return H.digest()
+
+
+class BloomFilter:
+    def __init__(self, capacity, fp_rate):
+        """
+        Initialize the BloomFilter class.
+
+        Parameters:
+            capacity (int): Number of keys the filter is sized for
+            fp_rate (float): False positive rate at capacity
+        """
+        self.size = max(64, int(-capacity * math.log(fp_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        # Keys are already digests, so double hashing over two 64-bit slices is enough
+        h1 = int.from_bytes(key[:8], "little")
+        h2 = int.from_bytes(key[8:16], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class ReplayCache:
+    def __init__(self, capacity=100000, window=60.0, fp_rate=0.001, bloom_capacity=None, clock=time.monotonic):
+        """
+        Initialize the ReplayCache class.
+
+        Keys seen within the last window seconds are replays. A two-generation
+        Bloom filter answers the common "never seen" case, and an exact LRU of
+        at most capacity keys confirms its positives. A Bloom positive missing
+        from the LRU is never taken as a replay, so fresh keys are not refused
+        at the false positive rate. The LRU is the bound instead: a key evicted
+        within the window is no longer caught, so capacity should cover the
+        keys recorded per window, and only shows that verified should be
+        recorded, see VerificationPipeline.
+
+        Parameters:
+            capacity (int): Maximum number of keys kept exactly
+            window (float): Replay window in seconds
+            fp_rate (float): False positive rate of each Bloom generation
+            bloom_capacity (int): Keys per window each Bloom generation is sized for (default: 4 * capacity)
+            clock (function): Time source in seconds
+        """
+        self.capacity = capacity
+        self.window = window
+        self.fp_rate = fp_rate
+        self.bloom_capacity = bloom_capacity or 4 * capacity
+        self.clock = clock
+        self.lock = threading.Lock()
+
+        self.current = BloomFilter(self.bloom_capacity, fp_rate)
+        self.previous = BloomFilter(self.bloom_capacity, fp_rate)
+        self.rotated_at = clock()
+        self.lru = OrderedDict()
+
+        self.lookups = 0
+        self.replays = 0
+        self.bloom_positives = 0
+        self.false_positives = 0
+        self.evictions = 0
+
+    def _rotate(self, now):
+        if now - self.rotated_at >= self.window:
+            # An idle period longer than two windows leaves nothing worth keeping
+            self.previous = self.current if now - self.rotated_at < 2 * self.window else BloomFilter(self.bloom_capacity, self.fp_rate)
+            self.current = BloomFilter(self.bloom_capacity, self.fp_rate)
+            self.rotated_at = now
+
+    def _expire(self, now):
+        lru = self.lru
+        while lru:
+            key, seen = next(iter(lru.items()))
+            if now - seen < self.window:
+                break
+            lru.popitem(last=False)
+
+    def _seen(self, key, now):
+        self.lookups += 1
+        self._rotate(now)
+        self._expire(now)
+        if key not in self.current and key not in self.previous:
+            return False
+        self.bloom_positives += 1
+        if key not in self.lru:
+            self.false_positives += 1
+            return False
+        self.replays += 1
+        return True
+
+    def seen(self, key):
+        """
+        Tell whether a key was recorded within the window, without recording it.
+
+        Parameters:
+            key (bytes): Digest of the show, see show_key
+
+        Returns:
+            bool: True if the key is a replay
+        """
+        with self.lock:
+            return self._seen(key, self.clock())
+
+    def check_and_add(self, key):
+        """
+        Record a key and tell whether it was already seen within the window.
+
+        Parameters:
+            key (bytes): Digest of the show, see show_key
+
+        Returns:
+            bool: True if the key is a replay
+        """
+        with self.lock:
+            now = self.clock()
+            if self._seen(key, now):
+                # Refresh the entry so the LRU stays ordered by time for expiry
+                self.lru[key] = now
+                self.lru.move_to_end(key)
+                return True
+            self.current.add(key)
+            self.lru[key] = now
+            if len(self.lru) > self.capacity:
+                self.lru.popitem(last=False)
+                self.evictions += 1
+            return False
+
+    def __len__(self):
+        return len(self.lru)
+
+    def metrics(self):
+        """
+        Report the cache counters.
+
+        Returns:
+            dict: Lookups, replays, hit rate, Bloom positives and false positives, evictions, size and approximate memory
+        """
+        with self.lock:
+            entry = sys.getsizeof(b"\0" * 32) + sys.getsizeof(0.0) + 64
+            return {
+                "lookups": self.lookups,
+                "replays": self.replays,
+                "hit_rate": self.replays / self.lookups if self.lookups else 0.0,
+                "bloom_positives": self.bloom_positives,
+                "false_positives": self.false_positives,
+                "evictions": self.evictions,
+                "size": len(self.lru),
+                "bloom_bytes": len(self.current.bits) + len(self.previous.bits),
+                "memory_bytes": len(self.current.bits) + len(self.previous.bits) + sys.getsizeof(self.lru) + entry * len(self.lru),
+            }
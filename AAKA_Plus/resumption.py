@@ -0,0 +1,143 @@
+""" Session resumption tickets letting a UE re-attach to the same XN without a new show """
+import hmac
+import os
+import time
+from hashlib import sha256
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from codec import encode, decode, CodecError
+
+_AAD = b"AAKA+ resumption ticket"
+NONCE_SIZE = 12
+
+
+class TicketError(Exception):
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def _mac(key, *parts):
+    return hmac.new(key, b"".join(parts), sha256).digest()
+
+
+def resumption_secret(k_s):
+    """
+    Derive the resumption secret of a session, known to the UE and the XN only.
+
+    Parameters:
+        k_s (bytes): Session key of the full handshake
+
+    Returns:
+        bytes: Resumption secret
+    """
+    return _mac(k_s, b"resumption")
+
+
+def resume_proof(rms, ticket, n_ue):
+    """
+    MAC the UE sends with a ticket to prove it holds the resumption secret.
+
+    Parameters:
+        rms (bytes): Resumption secret
+        ticket (bytes): Ticket
+        n_ue (bytes): UE nonce
+
+    Returns:
+        bytes: Proof
+    """
+    return _mac(rms, b"ue", ticket, n_ue)
+
+
+def resume_confirm(rms, n_ue, n_xn):
+    """
+    MAC the XN answers with to prove it opened the ticket.
+
+    Parameters:
+        rms (bytes): Resumption secret
+        n_ue (bytes): UE nonce
+        n_xn (bytes): XN nonce
+
+    Returns:
+        bytes: Confirmation
+    """
+    return _mac(rms, b"xn", n_ue, n_xn)
+
+
+def resumed_key(rms, n_ue, n_xn):
+    """
+    Derive the session key of a resumed session.
+
+    Parameters:
+        rms (bytes): Resumption secret
+        n_ue (bytes): UE nonce
+        n_xn (bytes): XN nonce
+
+    Returns:
+        bytes: Session key (k_s)
+    """
+    return _mac(rms, b"k_s", n_ue, n_xn)
+
+
+class TicketIssuer:
+    def __init__(self, key=None, lifetime=30.0, clock=time.time):
+        """
+        Initialize the TicketIssuer class.
+
+        A ticket is the resumption secret of a session sealed with AES-GCM
+        under a key only the XN knows, together with its expiry and the
+        revocation list version it was issued under. The XN keeps no state
+        per ticket. Since a resumed UE does not show its credential again,
+        a ticket is refused as soon as the revocation list has changed, so
+        revocation takes effect on the next attach as it does without
+        resumption.
+
+        Parameters:
+            key (bytes): 32-byte ticket key (default: a random one)
+            lifetime (float): Seconds a ticket stays valid
+            clock (function): Time source in seconds
+        """
+        self.aead = AESGCM(key or AESGCM.generate_key(256))
+        self.lifetime = lifetime
+        self.clock = clock
+
+    def issue(self, k_s, rl_version):
+        """
+        Issue a ticket for a session.
+
+        Parameters:
+            k_s (bytes): Session key of the session
+            rl_version (int): Revocation list version the session was checked against
+
+        Returns:
+            bytes: Ticket
+        """
+        nonce = os.urandom(NONCE_SIZE)
+        expires = int((self.clock() + self.lifetime) * 1000)
+        state = encode((resumption_secret(k_s), rl_version, expires))
+        return nonce + self.aead.encrypt(nonce, state, _AAD)
+
+    def open(self, ticket, rl_version):
+        """
+        Check a ticket and recover its resumption secret.
+
+        Parameters:
+            ticket (bytes): Ticket
+            rl_version (int): Current revocation list version
+
+        Returns:
+            bytes: Resumption secret
+
+        Raises:
+            TicketError: reason "invalid", "expired" or "stale"
+        """
+        try:
+            state = self.aead.decrypt(ticket[:NONCE_SIZE], ticket[NONCE_SIZE:], _AAD)
+            (rms, version, expires) = decode(None, state)
+        except (InvalidTag, CodecError, ValueError):
+            raise TicketError("invalid")
+        if self.clock() * 1000 >= expires:
+            raise TicketError("expired")
+        if version != rl_version:
+            raise TicketError("stale")
+        return rms
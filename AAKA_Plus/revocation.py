@@ -0,0 +1,483 @@
+""" Versioned revocation list store with delta updates, and its incrementally updated verifier view """
+import mmap
+import os
+import struct
+import threading
+import zlib
+from bplib.bp import G1Elem, G2Elem
+from petlib.bn import Bn
+
+SNAPSHOT_MAGIC = b"AAKARVL1"
+JOURNAL_MAGIC = b"AAKARVJ1"
+
+# Field prime of the BN254 curve of bplib, p = 3 mod 4 so that a square root is a^((p + 1) / 4)
+P = 0x2523648240000001BA344D80000000086121000000000013A700000000000013
+# G2 lives on the twist y^2 = x^3 + 1 - i over Fp2 = Fp[i] / (i^2 + 1)
+B2 = (1, P - 1)
+_P = Bn.from_decimal(str(P))
+_SQRT = Bn.from_decimal(str((P + 1) // 4))
+
+# Size of a compressed entry: bplib compresses G1 itself, G2 is compressed here
+POINT_SIZE = {1: 33, 2: 64}
+SCHEME_GROUPS = {"ps": 2, "bb": 2, "ps_g1": 1}
+OPS = {"add": 1, "remove": 0}
+
+# magic, scheme, group, version, number of entries
+_SNAPSHOT = struct.Struct(">8s8sBQQ")
+# magic, scheme, group
+_JOURNAL = struct.Struct(">8s8sB")
+# version, number of operations, CRC-32 of the operations
+_UPDATE = struct.Struct(">QII")
+
+
+class RevocationError(Exception):
+    pass
+
+
+def _pow(a, exponent):
+    # OpenSSL exponentiation, a few times faster than pow() on integers of this size
+    return int(Bn.from_binary(a.to_bytes(32, "big")).mod_pow(exponent, _P))
+
+
+def _sqrt_fp2(a):
+    # Square root in Fp2 through the norm N = a0^2 + a1^2: if t = (a0 + sqrt(N)) / 2
+    # is a square s^2 then x = s + a1 / (2 s) i, otherwise -t = s^2 since -1 is not
+    # a square, and x = a1 / (2 s) + s i
+    (a0, a1) = a
+    norm = (a0 * a0 + a1 * a1) % P
+    n = _pow(norm, _SQRT)
+    if n * n % P != norm:
+        return None
+    t = (a0 + n) * ((P + 1) // 2) % P
+    if t == 0:
+        t = (a0 - n) * ((P + 1) // 2) % P
+    s = _pow(t, _SQRT)
+    if s == 0:
+        return (0, 0)
+    other = a1 * pow(2 * s, -1, P) % P
+    return (s, other) if s * s % P == t else (other, s)
+
+
+def _sign(y):
+    # Parity of the first non-zero coordinate, the two roots -y and y always differ on it
+    return (y[1] if y[1] else y[0]) & 1
+
+
+def compress_point(point):
+    """
+    Compress a point of the revocation list.
+
+    A G2 point is written as its x coordinate, the 64 bytes of x0 and x1,
+    with the sign of y in the top bit and the point at infinity in the next
+    one, both free since p has 254 bits. G1 points use the compressed form
+    of bplib.
+
+    Parameters:
+        point (G1Elem or G2Elem): Point
+
+    Returns:
+        bytes: Compressed point, POINT_SIZE bytes of its group
+    """
+    if isinstance(point, G1Elem):
+        return point.export()
+    data = point.export()
+    if len(data) == 1:
+        return bytes([0x40]) + bytes(63)
+    (x0, x1, y0, y1) = [int.from_bytes(data[i:i + 32], "big") for i in range(0, 128, 32)]
+    flag = 0x80 if _sign((y0, y1)) else 0
+    return bytes([data[0] | flag]) + data[1:64]
+
+
+def decompress_point(G, group, data):
+    """
+    Decompress a point of the revocation list.
+
+    Parameters:
+        G (BpGroup): Pairing group
+        group (int): 1 or 2
+        data (bytes): Compressed point
+
+    Returns:
+        G1Elem or G2Elem: Point
+
+    Raises:
+        RevocationError: The data is not a point of the group
+    """
+    if len(data) != POINT_SIZE[group]:
+        raise RevocationError("a compressed G%d point has %d bytes, not %d" % (group, POINT_SIZE[group], len(data)))
+    try:
+        if group == 1:
+            return G1Elem.from_bytes(bytes(data), G)
+        if data[0] & 0x40:
+            return G2Elem.from_bytes(b"\x00", G)
+        x0 = int.from_bytes(bytes([data[0] & 0x3f]) + bytes(data[1:32]), "big")
+        x1 = int.from_bytes(data[32:64], "big")
+        # y^2 = x^3 + b'
+        (xx0, xx1) = ((x0 * x0 - x1 * x1) % P, 2 * x0 * x1 % P)
+        y = _sqrt_fp2(((xx0 * x0 - xx1 * x1 + B2[0]) % P, (xx0 * x1 + xx1 * x0 + B2[1]) % P))
+        if y is None:
+            raise RevocationError("no G2 point has this x coordinate")
+        if _sign(y) != data[0] >> 7:
+            y = ((P - y[0]) % P, (P - y[1]) % P)
+        coordinates = (x0, x1) + y
+        return G2Elem.from_bytes(b"".join(c.to_bytes(32, "big") for c in coordinates), G)
+    except RevocationError:
+        raise
+    except Exception as error:
+        raise RevocationError("invalid G%d point: %s" % (group, error)) from None
+
+
+def write_snapshot(path, scheme, version, entries):
+    """
+    Write a revocation list snapshot, replacing the file atomically.
+
+    Parameters:
+        path (str): Snapshot file
+        scheme (str): "ps", "bb" or "ps_g1"
+        version (int): Revocation list version
+        entries (list): Compressed points
+    """
+    temp = path + ".tmp"
+    with open(temp, "wb") as file:
+        file.write(_SNAPSHOT.pack(SNAPSHOT_MAGIC, scheme.encode("ascii"), SCHEME_GROUPS[scheme], version, len(entries)))
+        file.write(b"".join(entries))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp, path)
+
+
+def read_snapshot(path):
+    """
+    Read a revocation list snapshot through a memory map.
+
+    Parameters:
+        path (str): Snapshot file
+
+    Returns:
+        tuple: Scheme, group, version and the list of compressed points
+    """
+    with open(path, "rb") as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            if len(view) < _SNAPSHOT.size:
+                raise RevocationError("%s is not a revocation list snapshot" % path)
+            (magic, scheme, group, version, count) = _SNAPSHOT.unpack_from(view)
+            if magic != SNAPSHOT_MAGIC or group not in POINT_SIZE:
+                raise RevocationError("%s is not a revocation list snapshot" % path)
+            size = POINT_SIZE[group]
+            if len(view) != _SNAPSHOT.size + count * size:
+                raise RevocationError("%s holds %d bytes of entries, expected %d" % (path, len(view) - _SNAPSHOT.size, count * size))
+            entries = [view[offset:offset + size] for offset in range(_SNAPSHOT.size, len(view), size)]
+    return (scheme.rstrip(b"\x00").decode("ascii"), group, version, entries)
+
+
+class RevocationStore:
+    def __init__(self, directory, scheme, read_only=False):
+        """
+        Initialize the RevocationStore class, kept by the LEA.
+
+        Every update adds and removes entries and gets the next version.
+        Entries are stored compressed, so that a delta carries a few bytes
+        per entry. On disk, the store is a snapshot of the list at some
+        version, written by compact(), and a journal of the updates made
+        since, replayed when the store is opened. Deltas from versions
+        before the last compaction are no longer available, and a verifier
+        that far behind reloads the whole list.
+
+        A read-only store reads the list as the LEA last wrote it, without
+        touching the files, so it can be opened while the LEA runs.
+
+        Parameters:
+            directory (str): Store directory, created if needed, None to keep the store in memory
+            scheme (str): "ps", "bb" or "ps_g1"
+            read_only (bool): Open an existing store for reading only
+        """
+        if scheme not in SCHEME_GROUPS:
+            raise ValueError("unknown scheme %s" % scheme)
+        self.directory = directory
+        self.scheme = scheme
+        self.group = SCHEME_GROUPS[scheme]
+        self.size = POINT_SIZE[self.group]
+        self.entries = []
+        self.index = {}
+        self.history = []
+        self.base = 0
+        self.version = 0
+        self.lock = threading.Lock()
+        self.journal = None
+        self.read_only = read_only
+        if directory is None:
+            return
+        self.snapshot_path = os.path.join(directory, "rl.snapshot")
+        self.journal_path = os.path.join(directory, "rl.journal")
+        if read_only:
+            if not os.path.exists(self.snapshot_path) and not os.path.exists(self.journal_path):
+                raise RevocationError("%s holds no revocation list store" % directory)
+        else:
+            os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self.snapshot_path):
+            (scheme, group, self.base, entries) = read_snapshot(self.snapshot_path)
+            if scheme != self.scheme:
+                raise RevocationError("%s holds a revocation list of %s, not %s" % (directory, scheme, self.scheme))
+            self.version = self.base
+            for data in entries:
+                self._apply(OPS["add"], data)
+        self._replay()
+
+    def _apply(self, op, data):
+        # Removal moves the last entry into the freed slot so the list stays dense
+        if op == OPS["add"]:
+            self.index[data] = len(self.entries)
+            self.entries.append(data)
+        else:
+            position = self.index.pop(data)
+            last = self.entries.pop()
+            if position < len(self.entries):
+                self.entries[position] = last
+                self.index[last] = position
+
+    def _replay(self):
+        header = _JOURNAL.pack(JOURNAL_MAGIC, self.scheme.encode("ascii"), self.group)
+        if not os.path.exists(self.journal_path):
+            if not self.read_only:
+                self._new_journal(header)
+            return
+        with open(self.journal_path, "rb") as file:
+            data = file.read()
+        if data[:_JOURNAL.size] != header:
+            raise RevocationError("%s is not a revocation journal of %s" % (self.journal_path, self.scheme))
+        offset = _JOURNAL.size
+        record = 1 + self.size
+        while offset + _UPDATE.size <= len(data):
+            (version, count, crc) = _UPDATE.unpack_from(data, offset)
+            ops = data[offset + _UPDATE.size:offset + _UPDATE.size + count * record]
+            if len(ops) != count * record or zlib.crc32(ops) != crc:
+                break
+            offset += _UPDATE.size + len(ops)
+            if version <= self.version:
+                continue
+            for i in range(0, len(ops), record):
+                self._apply(ops[i], ops[i + 1:i + record])
+                self.history.append((version, ops[i], ops[i + 1:i + record]))
+            self.version = version
+        if self.read_only:
+            return
+        # An update torn by a crash is dropped
+        self.journal = open(self.journal_path, "r+b")
+        self.journal.truncate(offset)
+        self.journal.seek(offset)
+
+    def _new_journal(self, header):
+        if self.journal is not None:
+            self.journal.close()
+        with open(self.journal_path + ".tmp", "wb") as file:
+            file.write(header)
+        os.replace(self.journal_path + ".tmp", self.journal_path)
+        self.journal = open(self.journal_path, "r+b")
+        self.journal.seek(0, os.SEEK_END)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, point):
+        return compress_point(point) in self.index
+
+    def update(self, add=(), remove=()):
+        """
+        Add and remove entries as one new version.
+
+        Adding an entry already in the list or removing one that is not is
+        a no-op, and an update without any change keeps the version.
+
+        Parameters:
+            add (list): Points to revoke
+            remove (list): Points to reinstate
+
+        Returns:
+            int: Revocation list version after the update
+        """
+        if self.read_only:
+            raise RevocationError("the store is read-only")
+        with self.lock:
+            ops = []
+            present = set(self.index)
+            for point in add:
+                data = compress_point(point)
+                if data not in present:
+                    present.add(data)
+                    ops.append((OPS["add"], data))
+            for point in remove:
+                data = compress_point(point)
+                if data in present:
+                    present.discard(data)
+                    ops.append((OPS["remove"], data))
+            if not ops:
+                return self.version
+            version = self.version + 1
+            if self.journal is not None:
+                body = b"".join(bytes([op]) + data for (op, data) in ops)
+                self.journal.write(_UPDATE.pack(version, len(ops), zlib.crc32(body)) + body)
+                self.journal.flush()
+            for (op, data) in ops:
+                self._apply(op, data)
+                self.history.append((version, op, data))
+            self.version = version
+            return version
+
+    def add(self, point):
+        return self.update(add=[point])
+
+    def remove(self, point):
+        return self.update(remove=[point])
+
+    def delta(self, since):
+        """
+        Read the updates made after a version.
+
+        Parameters:
+            since (int): Version the reader has
+
+        Returns:
+            tuple: Current version and the list of (op, compressed point) updates to apply in order,
+                   None if the updates after since were compacted away
+        """
+        with self.lock:
+            if since < self.base or since > self.version:
+                return None
+            # History versions increase, so the updates after since are a suffix
+            (low, high) = (0, len(self.history))
+            while low < high:
+                middle = (low + high) // 2
+                if self.history[middle][0] <= since:
+                    low = middle + 1
+                else:
+                    high = middle
+            return (self.version, [(op, data) for (version, op, data) in self.history[low:]])
+
+    def snapshot(self):
+        """
+        Read the whole list.
+
+        Returns:
+            tuple: Current version and the list of compressed points
+        """
+        with self.lock:
+            return (self.version, list(self.entries))
+
+    def compact(self):
+        """
+        Write the list to the snapshot and empty the journal.
+        """
+        if self.read_only:
+            raise RevocationError("the store is read-only")
+        with self.lock:
+            if self.directory is not None:
+                write_snapshot(self.snapshot_path, self.scheme, self.version, self.entries)
+                self._new_journal(_JOURNAL.pack(JOURNAL_MAGIC, self.scheme.encode("ascii"), self.group))
+            self.history = []
+            self.base = self.version
+
+    def close(self):
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+
+
+class RevocationList:
+    def __init__(self, G, group, version=0, entries=()):
+        """
+        Initialize the RevocationList class, the view of a verifier.
+
+        The view holds the decoded points judge goes through, and an index
+        of the compressed points to their position. A delta is applied in
+        time proportional to its size: only its points are decompressed,
+        and a removed entry is replaced by the last one. The view is a
+        sequence of points, so it is given to judge as it is.
+
+        Parameters:
+            G (BpGroup): Pairing group
+            group (int): 1 or 2, the group of the entries
+            version (int): Version of the entries
+            entries (list): Compressed points
+        """
+        self.G = G
+        self.group = group
+        self.version = version
+        self.points = []
+        self.keys = []
+        self.index = {}
+        for data in entries:
+            data = bytes(data)
+            self._add(data, decompress_point(G, group, data))
+
+    @classmethod
+    def load(cls, G, path):
+        """
+        Load the view from a snapshot file.
+
+        Parameters:
+            G (BpGroup): Pairing group
+            path (str): Snapshot file
+
+        Returns:
+            RevocationList: The view at the version of the snapshot
+        """
+        (scheme, group, version, entries) = read_snapshot(path)
+        return cls(G, group, version, entries)
+
+    def _add(self, data, point):
+        if data in self.index:
+            raise RevocationError("entry already in the revocation list")
+        self.index[data] = len(self.points)
+        self.points.append(point)
+        self.keys.append(data)
+
+    def _remove(self, data):
+        if data not in self.index:
+            raise RevocationError("entry not in the revocation list")
+        position = self.index.pop(data)
+        (point, key) = (self.points.pop(), self.keys.pop())
+        if position < len(self.points):
+            (self.points[position], self.keys[position]) = (point, key)
+            self.index[key] = position
+
+    def apply(self, since, version, ops):
+        """
+        Apply a delta.
+
+        Parameters:
+            since (int): Version the delta starts from, the version of the view
+            version (int): Version the delta leads to
+            ops (list): (op, compressed point) updates, op being 1 to add and 0 to remove
+
+        Raises:
+            RevocationError: The delta does not start from the version of the view, adds an entry
+                already in the list, removes one that is not, or holds an invalid point; the view
+                is then left as it was
+        """
+        if since != self.version:
+            raise RevocationError("delta from version %d does not apply to version %d" % (since, self.version))
+        ops = [(op, bytes(data)) for (op, data) in ops]
+        # Check every op and decompress before changing anything, so an invalid delta leaves the view as it was
+        present = {}
+        for (op, data) in ops:
+            if op not in OPS.values():
+                raise RevocationError("unknown operation %r" % op)
+            if present.get(data, data in self.index) == (op == OPS["add"]):
+                raise RevocationError("entry already in the revocation list" if op == OPS["add"] else "entry not in the revocation list")
+            present[data] = op == OPS["add"]
+        points = {data: decompress_point(self.G, self.group, data) for (op, data) in ops if op == OPS["add"]}
+        for (op, data) in ops:
+            if op == OPS["add"]:
+                self._add(data, points[data])
+            else:
+                self._remove(data)
+        self.version = version
+
+    def __len__(self):
+        return len(self.points)
+
+    def __getitem__(self, i):
+        return self.points[i]
+
+    def __iter__(self):
+        return iter(self.points)
@@ -0,0 +1,134 @@
+""" Shared protocol engine with per-session contexts for concurrent AAKA+ handshakes """
+from verify_pipeline import VerificationPipeline
+from utils import coco_ensure
+
+
+class Engine:
+    def __init__(self, scheme, ipk, tpk, Y, y=None, replay_cache=None):
+        """
+        Initialize the Engine class.
+
+        The engine owns what every session shares: the scheme instance with
+        its parameters, the public keys, the XN key pair and the verification
+        pipeline with its replay cache. It is not modified after construction
+        and only calls scheme methods that keep no state on the instance, so
+        one engine serves any number of concurrent sessions from any thread.
+        The state of a single handshake lives in the context returned by
+        xn_session() or ue_session().
+
+        Parameters:
+            scheme (AAKA_PS, AAKA_BB or AAKA_PS_G1): Scheme instance
+            ipk (list): Issuer public key
+            tpk (G2Elem): LEA public key
+            Y (G1Elem): XN public key
+            y (Bn): XN private key, None for an engine that only runs UE sessions
+            replay_cache (ReplayCache): Cache of recent shows, None to skip the replay check
+        """
+        self.scheme = scheme
+        self.params = scheme.params
+        self.ipk = ipk
+        self.tpk = tpk
+        self.Y = Y
+        self.y = y
+        self.pipeline = VerificationPipeline(scheme, ipk, tpk, replay_cache)
+
+    def xn_session(self):
+        """
+        Start the XN side of a handshake.
+
+        Returns:
+            XNSession: Session context
+        """
+        coco_ensure(self.y is not None, "XN sessions need the XN private key")
+        return XNSession(self)
+
+    def ue_session(self):
+        """
+        Start the UE side of a handshake.
+
+        Returns:
+            UESession: Session context
+        """
+        return UESession(self)
+
+
+class XNSession:
+    __slots__ = ("engine", "keyEx", "k_s")
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.keyEx = None
+        self.k_s = None
+
+    def key_exchange(self, A):
+        """
+        Answer the key exchange of a UE.
+
+        Parameters:
+            A (G1Elem): Key from user equipment
+
+        Returns:
+            tuple: Exchanged key (B) and hashed key (tau)
+        """
+        engine = self.engine
+        (B, tau, self.k_s) = engine.scheme.KeyExchange_XN_Key(A, engine.Y, engine.y)
+        self.keyEx = (A, B, tau)
+        return (B, tau)
+
+    def verify(self, show, RL=()):
+        """
+        Verify the show of the UE against this key exchange.
+
+        Parameters:
+            show (bytes or tuple): Encoded ("SHOW", Acred, pi) message, or the decoded (Acred, pi)
+            RL (list): Revocation list
+
+        Returns:
+            tuple: Name of the stage that rejected the show (None if accepted) and the session key (None if rejected)
+        """
+        coco_ensure(self.keyEx is not None, "verify called before key_exchange")
+        rejected = self.engine.pipeline.verify(show, self.keyEx, RL)
+        return (rejected, self.k_s if rejected is None else None)
+
+
+class UESession:
+    __slots__ = ("engine", "a", "A", "keyEx")
+
+    def __init__(self, engine):
+        self.engine = engine
+        (self.a, self.A) = engine.scheme.KeyExchange_UE()
+        self.keyEx = None
+
+    def key_exchange(self, B, tau):
+        """
+        Check the answer of the XN to A.
+
+        Parameters:
+            B (G1Elem): Exchanged key
+            tau (bytes): Hashed key
+
+        Returns:
+            bytes: Session key (k_s), None if the XN could not be authenticated
+        """
+        engine = self.engine
+        k_s = engine.scheme.KeyExchange_UE_Key(engine.Y, self.A, B, self.a, tau)
+        if k_s is not None:
+            self.keyEx = (self.A, B, tau)
+        return k_s
+
+    def show(self, m, pm, cred):
+        """
+        Show a credential bound to this key exchange.
+
+        Parameters:
+            m (Bn): Message
+            pm (Bn): id
+            cred (tuple): Credential
+
+        Returns:
+            tuple: Anonymous credential (Acred) and zero-knowledge proof (pi)
+        """
+        coco_ensure(self.keyEx is not None, "show called before key_exchange")
+        engine = self.engine
+        (Acred, pi, H) = engine.scheme.CredShow(engine.ipk, engine.tpk, m, pm, cred, self.keyEx)
+        return (Acred, pi)
@@ -0,0 +1,47 @@
+import asyncio
+import pytest
+from utils import setup
+from aaka_async import AsyncScheme
+
+async def exercise(scheme, executor):
+    service = AsyncScheme(scheme, executor, workers=2, max_batch=4, batch_delay=0.05)
+    (G, o, g1, g2, e) = service.params
+    (isk, ipk) = service.scheme.IKeyGen(3)
+    (tsk, tpk) = service.scheme.LEAKeyGen()
+    (y, Y) = service.scheme.AsymKeyGen()
+    try:
+        (m, pm) = (o.random(), o.random())
+        (cred, pi) = await service.CredIssue(isk, ipk, m, pm)
+        shows = []
+        for _ in range(6):
+            keyEx = (o.random() * g1, o.random() * g1, b"tau")
+            (Acred, pi_show, H) = await service.CredShow(ipk, tpk, m, pm, cred, keyEx)
+            shows.append((m, Acred, pi_show, keyEx))
+        forged = list(shows[2][1])
+        forged[0] = o.random() * g1
+        shows[2] = (m, tuple(forged), shows[2][2], shows[2][3])
+
+        # A show cancelled while its batch fills is never verified
+        cancelled = asyncio.ensure_future(service.AcredVer(ipk, tpk, *shows[0]))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        tasks = [asyncio.ensure_future(service.AcredVer(ipk, tpk, *show)) for show in shows]
+        assert await asyncio.gather(*tasks) == [True, True, False, True, True, True]
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        assert service.stats["batches"] == 2 and service.stats["batched_shows"] == 6
+
+        # A malformed show in a batch only fails its own call
+        (commit, list_s) = shows[1][2]
+        truncated = (m, shows[1][1], (commit, list_s[:-1]), shows[1][3])
+        tasks = [asyncio.ensure_future(service.AcredVer(ipk, tpk, *show)) for show in [shows[1], truncated, shows[3]]]
+        assert await asyncio.gather(*tasks) == [True, False, True]
+
+        tm = await service.Trace(tsk, shows[0][1])
+        assert await service.judge(shows[1][1], [tm])
+    finally:
+        await service.close()
+
+@pytest.mark.parametrize("scheme,executor", [("ps", "thread"), ("bb", "thread"), ("ps", "process")])
+def test_async_scheme(scheme, executor):
+    asyncio.run(exercise(scheme, executor))
@@ -62,3 +62,25 @@ def test_trace_judge(bb_instance):
     tm = bb.Trace(tsk, Acred)
     RL.append(tm)
     assert bb.judge(Acred, RL)
+
+@pytest.mark.parametrize("exact", [False, True])
+def test_verify_modes(exact, tamper):
+    secp_k = generate_key()
+    bb = AAKA_BB(crypto.getKey(), "supi", 100, secp_k.public_key.format(True), secp_k.secret, setup(3), exact=exact)
+    (isk, ipk) = bb.IKeyGen(3)
+    (tsk, tpk) = bb.LEAKeyGen()
+    (y, Y) = bb.AsymKeyGen()
+    (G, o, g1, g2, e) = bb.params
+    m = o.random()
+    pm = o.random()
+    (cred, pi_0) = bb.CredIssue(isk, ipk, m, pm)
+    assert bb.CredVer(ipk, m, pm, cred, pi_0)
+    for i in range(len(pi_0[1])):
+        assert not bb.CredVer(ipk, m, pm, cred, tamper(pi_0, i))
+    (a, A) = bb.KeyExchange_UE()
+    (B, tau) = bb.KeyExchange_XN(A, Y, y)
+    keyEx = (A, B, tau)
+    (Acred, pi_1, H) = bb.CredShow(ipk, tpk, m, pm, cred, keyEx)
+    assert bb.AcredVer(ipk, tpk, m, Acred, pi_1, keyEx)
+    for i in range(len(pi_1[1])):
+        assert not bb.AcredVer(ipk, tpk, m, Acred, tamper(pi_1, i), keyEx)
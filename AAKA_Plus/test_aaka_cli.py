@@ -0,0 +1,83 @@
+import io
+import os
+import subprocess
+import sys
+import pytest
+from aaka_cli import main
+from codec import CodecError, encode, decode, read_frames, write_frame
+from revocation import RevocationStore
+from utils import setup
+
+def records(path):
+    G = setup(3)[0]
+    with open(path, "rb") as file:
+        return [decode(G, data) for data in read_frames(file)]
+
+@pytest.mark.parametrize("scheme,jobs", [("ps", 1), ("bb", 2), ("ps_g1", 1)])
+def test_bulk_commands(tmp_path, scheme, jobs):
+    path = lambda name: str(tmp_path / name)
+    run = lambda *argv: main([argv[0], "--scheme", scheme] + list(argv[1:]))
+    assert run("ikeygen", "--out", path("issuer.key")) == 0
+    assert run("leakeygen", "--out", path("lea.key")) == 0
+    assert run("xnkeygen", "--out", path("xn.key")) == 0
+    bulk = ["--jobs", str(jobs), "--chunk", "2"]
+    assert run("issue", "--issuer", path("issuer.key"), "--count", "5", "--out", path("creds.bin"), *bulk) == 0
+    assert run("verify-cred", "--issuer", path("issuer.key"), "--in", path("creds.bin"), "--out", path("verdicts.bin"), *bulk) == 0
+    assert records(path("verdicts.bin")) == [True] * 5
+    assert run("show", "--issuer", path("issuer.key"), "--lea", path("lea.key"), "--xn", path("xn.key"),
+               "--in", path("creds.bin"), "--out", path("shows.bin"), *bulk) == 0
+    assert run("trace", "--lea", path("lea.key"), "--in", path("shows.bin"), "--out", path("traced.bin"), *bulk) == 0
+
+    # Revoke the second subscriber, judge flags only its show
+    with open(path("traced.bin"), "rb") as file, open(path("rl.bin"), "wb") as rl:
+        write_frame(rl, list(read_frames(file))[1])
+    assert run("judge", "--rl", path("rl.bin"), "--in", path("shows.bin"), "--out", path("judged.bin"), *bulk) == 0
+    assert records(path("judged.bin")) == [False, True, False, False, False]
+    # A revocation store, with a revocation made after its last compaction
+    store = RevocationStore(path("store"), scheme)
+    traced = records(path("traced.bin"))
+    store.update(add=traced[3:])
+    store.compact()
+    store.add(traced[0])
+    store.close()
+    assert run("judge", "--rl", path("store"), "--in", path("shows.bin"), "--out", path("judged.bin"), *bulk) == 0
+    assert records(path("judged.bin")) == [True, False, False, True, True]
+    # The snapshot alone misses that revocation and is refused
+    assert run("judge", "--rl", store.snapshot_path, "--in", path("shows.bin"), "--out", path("judged.bin"), *bulk) == 2
+
+    # A show bound to another key exchange is rejected, and the command fails. So are a proof
+    # missing a response and a record that is not a show, without failing the rest of their chunk
+    shows = records(path("shows.bin"))
+    shows[3] = shows[3][:3] + (shows[0][3],)
+    (commit, list_s) = shows[0][2]
+    shows[0] = (shows[0][0], shows[0][1], (commit, list_s[:-1]), shows[0][3])
+    shows[2] = shows[2][:2]
+    with open(path("shows.bin"), "wb") as file:
+        for show in shows:
+            write_frame(file, encode(show))
+    assert run("verify-show", "--issuer", path("issuer.key"), "--lea", path("lea.key"),
+               "--in", path("shows.bin"), "--out", path("verdicts.bin"), *bulk) == 1
+    assert records(path("verdicts.bin")) == [False, True, False, False, True]
+
+    # A truncated input or revocation list file is an error, not a rejection
+    with open(path("shows.bin"), "rb") as file, open(path("torn.bin"), "wb") as torn:
+        torn.write(file.read()[:-1])
+    assert run("verify-show", "--issuer", path("issuer.key"), "--lea", path("lea.key"),
+               "--in", path("torn.bin"), "--out", path("verdicts.bin"), *bulk) == 2
+    with open(path("rl.bin"), "r+b") as file:
+        file.truncate(os.path.getsize(path("rl.bin")) - 1)
+    assert run("judge", "--rl", path("rl.bin"), "--in", path("shows.bin"), "--out", path("judged.bin"), *bulk) == 2
+
+def test_streams_and_key_checks(tmp_path):
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "aaka_cli.py")
+    cli = lambda *argv, **kwargs: subprocess.run([sys.executable, script] + list(argv), capture_output=True, **kwargs)
+    issuer = cli("ikeygen").stdout
+    (tmp_path / "issuer.key").write_bytes(issuer)
+    creds = cli("issue", "--issuer", str(tmp_path / "issuer.key"), "--count", "2").stdout
+    verified = cli("verify-cred", "--issuer", str(tmp_path / "issuer.key"), input=creds)
+    assert verified.returncode == 0 and b"2 records, 0 rejected" in verified.stderr
+    # A key of another scheme is refused
+    assert main(["verify-cred", "--scheme", "bb", "--issuer", str(tmp_path / "issuer.key"), "--in", os.devnull]) == 2
+
+    with pytest.raises(CodecError):
+        list(read_frames(io.BytesIO(creds[:-1])))
@@ -0,0 +1,139 @@
+import socket
+import threading
+import pytest
+from utils import setup
+from codec import encode, decode, send_msg, recv_msg, CodecError
+from aaka_net import LEA, XN, UE, make_scheme
+from resumption import TicketIssuer, TicketError
+
+def test_codec_roundtrip():
+    params = setup(3)
+    (G, o, g1, g2, e) = params
+    value = ("SHOW", (o.random() * g1, o.random() * g2, -o.random(), 7, -1), [b"tau", None, True])
+    assert decode(G, encode(value)) == value
+    with pytest.raises(CodecError):
+        decode(G, encode(value)[:-1])
+
+@pytest.mark.parametrize("scheme", ["ps", "bb", "ps_g1"])
+def test_network_attach(scheme):
+    params = setup(3)
+    (G, o, g1, g2, e) = params
+    issuer = make_scheme(scheme, params)
+    (isk, ipk) = issuer.IKeyGen(3)
+    (tsk, tpk) = issuer.LEAKeyGen()
+    (y, Y) = issuer.AsymKeyGen()
+    ues = []
+    for _ in range(2):
+        (m, pm) = (o.random(), o.random())
+        (cred, pi) = issuer.CredIssue(isk, ipk, m, pm)
+        ues.append(UE(scheme, params, ipk, tpk, Y, m, pm, cred))
+
+    lea = LEA(scheme, params, tsk, 0)
+    threading.Thread(target=lea.serve, daemon=True).start()
+    lea.revoke(ues[1].show((g1, g1, b""))[0])
+    xn = XN(scheme, params, ipk, tpk, y, Y, 0, lea.port)
+    threading.Thread(target=xn.serve, daemon=True).start()
+    try:
+        assert ues[0].attach(xn.port) == "ACCEPT"
+        assert ues[0].k_s is not None
+        assert ues[1].attach(xn.port) == "revoked"
+        (Acred, pi) = ues[0].show((g1, g1, b""))
+        replies = []
+        for _ in range(2):
+            with socket.create_connection(('127.0.0.1', xn.port)) as conn:
+                send_msg(conn, ("HELLO", o.random() * g1))
+                recv_msg(conn, G)
+                send_msg(conn, ("SHOW", Acred, pi))
+                replies.append(recv_msg(conn, G))
+        # A show that failed to verify is not recorded, so its copy is not taken for a replay
+        assert replies == [("REJECT", "invalid"), ("REJECT", "invalid")]
+    finally:
+        xn.shutdown()
+        lea.shutdown()
+
+def test_ticket_lifetime():
+    now = [100.0]
+    tickets = TicketIssuer(lifetime=30.0, clock=lambda: now[0])
+    ticket = tickets.issue(b"k" * 32, 4)
+    assert tickets.open(ticket, 4) == tickets.open(tickets.issue(b"k" * 32, 4), 4)
+    for (version, delay, reason) in [(5, 0, "stale"), (4, 30, "expired")]:
+        now[0] += delay
+        with pytest.raises(TicketError, match=reason):
+            tickets.open(ticket, version)
+    with pytest.raises(TicketError, match="invalid"):
+        tickets.open(ticket[:-1] + bytes([ticket[-1] ^ 1]), 4)
+
+@pytest.mark.parametrize("scheme", ["ps", "bb"])
+def test_network_resume(scheme):
+    params = setup(3)
+    (G, o, g1, g2, e) = params
+    issuer = make_scheme(scheme, params)
+    (isk, ipk) = issuer.IKeyGen(3)
+    (tsk, tpk) = issuer.LEAKeyGen()
+    (y, Y) = issuer.AsymKeyGen()
+    (m, pm) = (o.random(), o.random())
+    (cred, pi) = issuer.CredIssue(isk, ipk, m, pm)
+    ue = UE(scheme, params, ipk, tpk, Y, m, pm, cred)
+
+    lea = LEA(scheme, params, tsk, 0)
+    threading.Thread(target=lea.serve, daemon=True).start()
+    xn = XN(scheme, params, ipk, tpk, y, Y, 0, lea.port, rl_refresh=60, tickets=TicketIssuer())
+    threading.Thread(target=xn.serve, daemon=True).start()
+    try:
+        assert ue.attach(xn.port, resume=True) == "ACCEPT"
+        keys = [ue.k_s]
+        for _ in range(2):
+            ticket = ue.ticket
+            assert ue.attach(xn.port, resume=True) == "RESUMED"
+            assert ue.k_s not in keys
+            keys.append(ue.k_s)
+        # Tickets are single-use
+        ue.ticket = ticket
+        assert not ue.resume(xn.port)
+        assert ue.attach(xn.port, resume=True) == "ACCEPT"
+        # Revocation invalidates the tickets issued before it
+        lea.revoke(ue.show((g1, g1, b""))[0])
+        xn.fetch_rl()
+        assert ue.ticket is not None
+        assert ue.attach(xn.port, resume=True) == "revoked"
+        assert xn.stats["resumed"] == 2 and xn.stats["resume_refused"] == 2
+    finally:
+        xn.shutdown()
+        lea.shutdown()
+
+@pytest.mark.parametrize("request_", [("HELLO",), ("HELLO", b"A"), ("BYE", None), b"HELLO", ("RESUME", b"t")])
+def test_malformed_first_message(request_):
+    params = setup(3)
+    issuer = make_scheme("ps", params)
+    (isk, ipk) = issuer.IKeyGen(3)
+    (tsk, tpk) = issuer.LEAKeyGen()
+    (y, Y) = issuer.AsymKeyGen()
+    xn = XN("ps", params, ipk, tpk, y, Y, 0)
+    (conn, peer) = socket.socketpair()
+    try:
+        send_msg(peer, request_)
+        with pytest.raises(CodecError):
+            xn.handle(conn)
+    finally:
+        conn.close()
+        peer.close()
+        xn.server.server_close()
+
+@pytest.mark.parametrize("fields", [(None, b"n", b"p"), (b"t", 1, b"p"), (b"t", b"n", ("p",))])
+def test_malformed_resume(fields):
+    params = setup(3)
+    issuer = make_scheme("ps", params)
+    (isk, ipk) = issuer.IKeyGen(3)
+    (tsk, tpk) = issuer.LEAKeyGen()
+    (y, Y) = issuer.AsymKeyGen()
+    xn = XN("ps", params, ipk, tpk, y, Y, 0, tickets=TicketIssuer())
+    (conn, peer) = socket.socketpair()
+    try:
+        send_msg(peer, ("RESUME",) + fields)
+        xn.handle(conn)
+        assert recv_msg(peer, params[0]) == ("REJECT", "ticket malformed")
+        assert xn.stats["resume_refused"] == 1
+    finally:
+        conn.close()
+        peer.close()
+        xn.server.server_close()
@@ -59,3 +59,24 @@ def test_trace_judge(ps_instance):
     tm = ps.Trace(tsk, Acred)
     RL.append(tm)
     assert ps.judge(Acred, RL)
+
+@pytest.mark.parametrize("exact", [False, True])
+def test_verify_modes(exact, tamper):
+    ps = AAKA_PS("supi", setup(3), exact=exact)
+    (isk, ipk) = ps.IKeyGen(3)
+    (tsk, tpk) = ps.LEAKeyGen()
+    (y, Y) = ps.AsymKeyGen()
+    (G, o, g1, g2, e) = ps.params
+    m = o.random()
+    pm = o.random()
+    (cred, pi_2) = ps.CredIssue(isk, ipk, m, pm)
+    assert ps.CredVer(ipk, m, pm, cred, pi_2)
+    for i in range(len(pi_2[1])):
+        assert not ps.CredVer(ipk, m, pm, cred, tamper(pi_2, i))
+    (a, A) = ps.KeyExchange_UE()
+    (B, tau) = ps.KeyExchange_XN(A, Y, y)
+    keyEx = (A, B, tau)
+    (Acred, pi_3, H) = ps.CredShow(ipk, tpk, m, pm, cred, keyEx)
+    assert ps.AcredVer(ipk, tpk, m, Acred, pi_3, keyEx)
+    for i in range(len(pi_3[1])):
+        assert not ps.AcredVer(ipk, tpk, m, Acred, tamper(pi_3, i), keyEx)
@@ -0,0 +1,28 @@
+import pytest
+from aaka_ps_g1 import AAKA_PS_G1
+from utils import setup
+from bplib.bp import G1Elem, G2Elem
+
+@pytest.mark.parametrize("exact", [False, True])
+def test_show_verify_trace(exact, tamper):
+    ps = AAKA_PS_G1("supi", setup(3), exact=exact)
+    (isk, ipk) = ps.IKeyGen(3)
+    (tsk, tpk) = ps.LEAKeyGen()
+    (y, Y) = ps.AsymKeyGen()
+    (G, o, g1, g2, e) = ps.params
+    m = o.random()
+    pm = o.random()
+    (cred, pi_2) = ps.CredIssue(isk, ipk, m, pm)
+    (a, A) = ps.KeyExchange_UE()
+    (B, tau) = ps.KeyExchange_XN(A, Y, y)
+    keyEx = (A, B, tau)
+    (Acred, pi_3, H) = ps.CredShow(ipk, tpk, m, pm, cred, keyEx)
+    assert isinstance(tpk, G1Elem) and isinstance(Acred[3], G1Elem) and isinstance(Acred[4], G1Elem)
+    assert isinstance(H, G2Elem) and isinstance(Acred[5], G2Elem)
+    assert ps.AcredVer(ipk, tpk, m, Acred, pi_3, keyEx)
+    for i in range(len(pi_3[1])):
+        assert not ps.AcredVer(ipk, tpk, m, Acred, tamper(pi_3, i), keyEx)
+    tm = ps.Trace(tsk, Acred)
+    assert tm == pm * g1
+    assert ps.judge(Acred, [o.random() * g1, tm])
+    assert not ps.judge(Acred, [o.random() * g1])
@@ -0,0 +1,80 @@
+import pytest
+from utils import setup
+from aaka_net import make_scheme
+from audit_log import AuditLog, AuditLogError, segments, scan, read_record, trace
+
+@pytest.mark.parametrize("scheme", ["ps", "bb"])
+def test_audit_log_trace(tmp_path, scheme):
+    params = setup(3)
+    (G, o, g1, g2, e) = params
+    issuer = make_scheme(scheme, params)
+    (isk, ipk) = issuer.IKeyGen(3)
+    (tsk, tpk) = issuer.LEAKeyGen()
+    creds = []
+    for _ in range(2):
+        (m, pm) = (o.random(), o.random())
+        creds.append((m, pm, issuer.CredIssue(isk, ipk, m, pm)[0]))
+
+    directory = str(tmp_path)
+    log = AuditLog(directory, scheme, segment_bytes=4096, batch_bytes=2048)
+    shows = []
+    for i in range(12):
+        (m, pm, cred) = creds[i % 3 == 0]
+        keyEx = (o.random() * g1, o.random() * g1, b"tau%d" % i)
+        (Acred, pi, H) = issuer.CredShow(ipk, tpk, m, pm, cred, keyEx)
+        log.append((Acred, pi), keyEx)
+        shows.append((Acred, pi, keyEx))
+        if i == 5:
+            log.flush()
+    log.close()
+    assert len(segments(directory)) > 1
+
+    # A torn record at the end of the last segment is ignored
+    with open(segments(directory)[-1], "ab") as file:
+        file.write(b"\0\0\1\0torn")
+    records = [(path, offset) for path in segments(directory) for (offset, timestamp) in scan(path)[1]]
+    assert len(records) == 12
+    (timestamp, Acred, pi, keyEx) = read_record(*records[4], G)
+    assert (Acred, pi, keyEx) == shows[4]
+
+    target = issuer.Trace(tsk, shows[0][0])
+    matches = list(trace(directory, tsk, target, jobs=2, chunk=3))
+    assert [(path, offset) for (path, offset, timestamp) in matches] == [records[i] for i in range(12) if i % 3 == 0]
+
+def test_audit_log_reopen_after_tear(tmp_path):
+    params = setup(3)
+    (G, o, g1, g2, e) = params
+    issuer = make_scheme("ps", params)
+    (isk, ipk) = issuer.IKeyGen(3)
+    (tsk, tpk) = issuer.LEAKeyGen()
+    (m, pm) = (o.random(), o.random())
+    cred = issuer.CredIssue(isk, ipk, m, pm)[0]
+    shows = []
+    for i in range(6):
+        keyEx = (o.random() * g1, o.random() * g1, b"tau%d" % i)
+        shows.append((issuer.CredShow(ipk, tpk, m, pm, cred, keyEx)[:2], keyEx))
+
+    directory = str(tmp_path)
+    log = AuditLog(directory, "ps")
+    for (show, keyEx) in shows[:3]:
+        log.append(show, keyEx)
+    log.close()
+    with open(segments(directory)[-1], "ab") as file:
+        file.write(b"\0\0\1\0torn")
+
+    # Reopening cuts the torn record off, so the records appended after it can be read
+    log = AuditLog(directory, "ps")
+    for (show, keyEx) in shows[3:]:
+        log.append(show, keyEx)
+    log.close()
+    records = [(path, offset) for path in segments(directory) for (offset, timestamp) in scan(path)[1]]
+    assert len(records) == 6
+    assert read_record(*records[5], G)[1:] == shows[5][0] + (shows[5][1],)
+
+    # A log is only reopened with the scheme of its segments
+    with pytest.raises(AuditLogError):
+        AuditLog(directory, "bb")
+    with open(segments(directory)[-1], "r+b") as file:
+        file.write(b"NOTALOG!")
+    with pytest.raises(AuditLogError):
+        AuditLog(directory, "ps")
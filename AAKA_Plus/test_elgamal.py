@@ -0,0 +1,51 @@
+import pytest
+import op_counter
+from petlib.bn import Bn
+from utils import *
+from aaka_net import make_scheme
+
+@pytest.mark.parametrize("group", ["g1", "g2"])
+def test_fixed_base_table(group):
+    params = setup(3)
+    (G, o, g1, g2, e) = params
+    P = o.random() * (g1 if group == "g1" else g2)
+    table = FixedBaseTable(G, P)
+    assert table.mul(Bn(0)).isinf() and table.mul(o).isinf()
+    for x in [Bn(1), Bn(5), o - 1, o + 3, o.random(), -o.random()]:
+        assert table.mul(x) == (x % o) * P
+    assert table.mul(5) == Bn(5) * P
+
+def test_elgamal():
+    params = setup(3)
+    (G, o, g1, g2, e) = params
+    (d, gamma) = elgamal_keygen(params)
+    (a, b, k) = elgamal_enc(params, gamma, Bn(7), g1)
+    assert elgamal_dec(params, d, (a, b)) == Bn(7) * g1
+
+    ms = [o.random() for _ in range(4)]
+    ciphertexts = elgamal_enc_batch(params, gamma, ms, g1)
+    assert all(a == k * g1 and b == k * gamma + m * g1 for ((a, b, k), m) in zip(ciphertexts, ms))
+    assert elgamal_dec_batch(params, d, [(a, b) for (a, b, k) in ciphertexts]) == [m * g1 for m in ms]
+
+    # The tracing ciphertext of AAKA+PS is an encryption of pm * g2 under tpk
+    (d, gamma) = elgamal_keygen(params, g2)
+    tables = elgamal_tables(params, gamma, g2, g2)
+    counts = op_counter.counted(elgamal_enc_batch, params, gamma, ms, g2, g2, tables)
+    assert counts == {"g2_table_mul": 12, "g2_add": 4}
+    ciphertexts = elgamal_enc_batch(params, gamma, ms, g2, g2, tables)
+    assert elgamal_dec_batch(params, d, [(a, b) for (a, b, k) in ciphertexts]) == [m * g2 for m in ms]
+
+@pytest.mark.parametrize("name", ["ps", "bb", "ps_g1"])
+def test_trace_batch(name):
+    params = setup(3)
+    (G, o, g1, g2, e) = params
+    scheme = make_scheme(name, params)
+    (isk, ipk) = scheme.IKeyGen(3)
+    (tsk, tpk) = scheme.LEAKeyGen()
+    Acreds = []
+    for _ in range(3):
+        (m, pm) = (o.random(), o.random())
+        (cred, pi) = scheme.CredIssue(isk, ipk, m, pm)
+        keyEx = (o.random() * g1, o.random() * g1, b"tau")
+        Acreds.append(scheme.CredShow(ipk, tpk, m, pm, cred, keyEx)[0])
+    assert scheme.Trace_batch(tsk, Acreds) == [scheme.Trace(tsk, Acred) for Acred in Acreds]
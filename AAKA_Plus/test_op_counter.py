@@ -0,0 +1,30 @@
+from bplib.bp import BpGroup, G1Elem
+import op_counter
+import utils
+from utils import setup
+
+def test_counts_per_operation(ps_show):
+    (scheme, ipk, tsk, tpk, m, Acred, pi_show, keyEx) = ps_show
+    RL = [scheme.Trace(tsk, Acred)]
+    assert op_counter.counted(scheme.Trace, tsk, Acred) == {"g2_mul": 1, "g2_add": 1}
+    assert op_counter.counted(scheme.judge, Acred, RL) == {"g1_mul": 1, "miller_loop": 2, "final_exp": 2, "challenge_hash": 1}
+    counts = op_counter.counted(scheme.AcredVer, ipk, tpk, m, Acred, pi_show, keyEx)
+    assert counts["g1_msm"] == 1 and counts["g2_msm"] == 1 and counts["challenge_hash"] == 2
+    assert counts["miller_loop"] == 2 and counts["final_exp"] == 2
+
+def test_moving_tracing_to_g1_shows_in_counts(ps_g1_show):
+    (scheme, ipk, tsk, tpk, m, Acred, pi_show, keyEx) = ps_g1_show
+    assert op_counter.counted(scheme.Trace, tsk, Acred) == {"g1_mul": 1, "g1_add": 1}
+
+def test_disable_restores_originals():
+    originals = (G1Elem.mul, BpGroup.pair, utils.ec_msm, utils.challenge)
+    op_counter.enable()
+    assert G1Elem.mul is not originals[0] and utils.ec_msm is not originals[2]
+    op_counter.disable()
+    assert (G1Elem.mul, BpGroup.pair, utils.ec_msm, utils.challenge) == originals
+
+    # Nothing is counted while counting is disabled
+    op_counter.reset()
+    (G, o, g1, g2, e) = setup(3)
+    e(o.random() * g1, g2)
+    assert op_counter.snapshot() == {}
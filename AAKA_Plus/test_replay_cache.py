@@ -0,0 +1,40 @@
+import os
+from replay_cache import ReplayCache, BloomFilter
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_replay_within_window():
+    clock = Clock()
+    cache = ReplayCache(capacity=100, window=10.0, clock=clock)
+    key = os.urandom(32)
+    assert not cache.check_and_add(key)
+    assert cache.check_and_add(key)
+    clock.now = 11.0
+    assert not cache.check_and_add(key)
+    metrics = cache.metrics()
+    assert metrics["lookups"] == 3 and metrics["replays"] == 1
+
+def test_fresh_keys_and_eviction():
+    cache = ReplayCache(capacity=50, window=60.0, clock=Clock())
+    keys = [os.urandom(32) for _ in range(100)]
+    assert not any(cache.check_and_add(key) for key in keys)
+    assert len(cache) == 50 and cache.metrics()["evictions"] == 50
+    assert cache.check_and_add(keys[-1])
+    # A Bloom positive is not a replay on its own, even after evictions
+    cache.current.add(keys[0][::-1])
+    assert not cache.seen(keys[0][::-1])
+    assert not cache.check_and_add(keys[0][::-1])
+    assert cache.metrics()["false_positives"] == 2
+
+def test_bloom_filter():
+    bloom = BloomFilter(1000, 0.01)
+    keys = [os.urandom(32) for _ in range(1000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+    assert sum(os.urandom(32) in bloom for _ in range(1000)) < 50
@@ -0,0 +1,107 @@
+import threading
+import pytest
+from utils import setup
+from aaka_net import LEA, XN, UE, make_scheme
+from revocation import (POINT_SIZE, RevocationError, RevocationList, RevocationStore, compress_point,
+                        decompress_point, read_snapshot)
+
+def test_point_compression():
+    (G, o, g1, g2, e) = setup(3)
+    for point in [o.random() * g2 for _ in range(20)] + [g2, -g2, 0 * g2]:
+        data = compress_point(point)
+        assert len(data) == POINT_SIZE[2]
+        assert decompress_point(G, 2, data) == point
+    point = o.random() * g1
+    assert decompress_point(G, 1, compress_point(point)) == point
+    with pytest.raises(RevocationError):
+        decompress_point(G, 2, compress_point(g2)[:-1])
+    with pytest.raises(RevocationError):
+        decompress_point(G, 2, b"\x3f" + b"\xff" * 63)
+
+@pytest.mark.parametrize("scheme", ["ps", "ps_g1"])
+def test_store_deltas(tmp_path, scheme):
+    (G, o, g1, g2, e) = setup(3)
+    base = g1 if scheme == "ps_g1" else g2
+    tms = [o.random() * base for _ in range(6)]
+    directory = str(tmp_path)
+    store = RevocationStore(directory, scheme)
+    view = RevocationList(G, store.group)
+    assert store.update(add=tms[:4]) == 1
+    assert store.add(tms[0]) == 1
+    view.apply(0, *store.delta(0))
+    assert store.update(add=tms[4:], remove=[tms[1]]) == 2
+    assert store.remove(tms[3]) == 3
+    (version, ops) = store.delta(1)
+    assert (version, len(ops)) == (3, 4)
+    view.apply(1, version, ops)
+    assert view.version == 3
+    assert sorted(compress_point(tm) for tm in view) == sorted(compress_point(tm) for tm in [tms[0], tms[2], tms[4], tms[5]])
+    with pytest.raises(RevocationError):
+        view.apply(1, version, ops)
+    # A delta that fails on its last op leaves the view as it was
+    entries = list(view.keys)
+    for bad in [[(1, compress_point(tms[1])), (1, compress_point(tms[0]))],
+                [(0, compress_point(tms[0])), (0, compress_point(tms[0]))]]:
+        with pytest.raises(RevocationError):
+            view.apply(3, 4, bad)
+        assert (view.version, view.keys) == (3, entries)
+
+    # The journal is replayed, a torn update at its end dropped
+    store.close()
+    with open(store.journal_path, "ab") as file:
+        file.write(b"\0\0\0\0\0\0\0\4torn")
+    store = RevocationStore(directory, scheme)
+    assert (store.version, store.delta(1)) == (3, (3, ops))
+    store.compact()
+    assert store.delta(2) is None
+    assert store.add(tms[1]) == 4
+    store.close()
+
+    # A read-only store includes the journal and leaves the files alone
+    reader = RevocationStore(directory, scheme, read_only=True)
+    assert reader.snapshot()[0] == 4
+    with pytest.raises(RevocationError):
+        reader.add(tms[2])
+    store = RevocationStore(directory, scheme)
+    assert read_snapshot(store.snapshot_path)[2] == 3
+    view.apply(3, *store.delta(3))
+    loaded = RevocationList.load(G, store.snapshot_path)
+    loaded.apply(3, *store.delta(3))
+    assert sorted(compress_point(tm) for tm in loaded) == sorted(compress_point(tm) for tm in view)
+    assert len(view) == len(store) == 5
+    store.close()
+
+def test_network_deltas(tmp_path):
+    params = setup(3)
+    (G, o, g1, g2, e) = params
+    issuer = make_scheme("ps", params)
+    (isk, ipk) = issuer.IKeyGen(3)
+    (tsk, tpk) = issuer.LEAKeyGen()
+    (y, Y) = issuer.AsymKeyGen()
+    (m, pm) = (o.random(), o.random())
+    ue = UE("ps", params, ipk, tpk, Y, m, pm, issuer.CredIssue(isk, ipk, m, pm)[0])
+
+    store = RevocationStore(str(tmp_path), "ps")
+    store.update(add=[o.random() * g2 for _ in range(3)])
+    store.compact()
+    lea = LEA("ps", params, tsk, 0, store)
+    threading.Thread(target=lea.serve, daemon=True).start()
+    # The XN starts from the snapshot, then follows the deltas
+    xn = XN("ps", params, ipk, tpk, y, Y, 0, lea.port, rl_refresh=60)
+    threading.Thread(target=xn.serve, daemon=True).start()
+    try:
+        assert (xn.rl_version, len(xn.RL)) == (1, 3)
+        assert ue.attach(xn.port) == "ACCEPT"
+        tm = issuer.Trace(tsk, ue.show((g1, g1, b""))[0])
+        assert lea.revoke(ue.show((g1, g1, b""))[0]) == 2
+        xn.fetch_rl()
+        assert (xn.rl_version, len(xn.RL)) == (2, 4)
+        assert ue.attach(xn.port) == "revoked"
+        assert lea.reinstate(tm) == 3
+        xn.fetch_rl()
+        assert (xn.rl_version, len(xn.RL), len(lea.RL)) == (3, 3, 3)
+        assert ue.attach(xn.port) == "ACCEPT"
+    finally:
+        xn.shutdown()
+        lea.shutdown()
+        store.close()
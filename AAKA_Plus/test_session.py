@@ -0,0 +1,40 @@
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from utils import setup, CocoException
+from aaka_net import make_scheme
+from replay_cache import ReplayCache
+from session import Engine
+
+@pytest.mark.parametrize("scheme", ["ps", "bb"])
+def test_concurrent_sessions(scheme):
+    params = setup(3)
+    (G, o, g1, g2, e) = params
+    issuer = make_scheme(scheme, params)
+    (isk, ipk) = issuer.IKeyGen(3)
+    (tsk, tpk) = issuer.LEAKeyGen()
+    (y, Y) = issuer.AsymKeyGen()
+    (m, pm) = (o.random(), o.random())
+    (cred, pi) = issuer.CredIssue(isk, ipk, m, pm)
+    shared = make_scheme(scheme, params)
+    ue_engine = Engine(shared, ipk, tpk, Y)
+    xn_engine = Engine(shared, ipk, tpk, Y, y, ReplayCache())
+
+    def handshake(_):
+        ue = ue_engine.ue_session()
+        xn = xn_engine.xn_session()
+        (B, tau) = xn.key_exchange(ue.A)
+        k_ue = ue.key_exchange(B, tau)
+        (rejected, k_xn) = xn.verify(ue.show(m, pm, cred))
+        return (rejected, k_ue, k_xn)
+
+    with ThreadPoolExecutor(4) as pool:
+        results = list(pool.map(handshake, range(8)))
+    assert all(rejected is None and k_ue == k_xn for (rejected, k_ue, k_xn) in results)
+    assert len({k_ue for (rejected, k_ue, k_xn) in results}) == 8
+    assert not hasattr(shared, "k_s")
+
+    ue = ue_engine.ue_session()
+    with pytest.raises(CocoException):
+        ue.show(m, pm, cred)
+    with pytest.raises(CocoException):
+        ue_engine.xn_session()
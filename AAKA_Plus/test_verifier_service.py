@@ -0,0 +1,90 @@
+import asyncio
+import pytest
+from codec import CodecError
+from utils import setup
+from aaka_net import make_scheme
+from verifier_service import VerifierService, ServiceOverloaded
+
+def shows(name, n):
+    params = setup(3)
+    (G, o, g1, g2, e) = params
+    scheme = make_scheme(name, params)
+    (isk, ipk) = scheme.IKeyGen(3)
+    (tsk, tpk) = scheme.LEAKeyGen()
+    (m, pm) = (o.random(), o.random())
+    (cred, pi) = scheme.CredIssue(isk, ipk, m, pm)
+    items = []
+    for _ in range(n):
+        keyEx = (o.random() * g1, o.random() * g1, b"tau")
+        (Acred, pi_show, H) = scheme.CredShow(ipk, tpk, m, pm, cred, keyEx)
+        items.append((m, Acred, pi_show, keyEx))
+    forged = list(items[1][1])
+    forged[0] = o.random() * g1
+    items[1] = (m, tuple(forged), items[1][2], items[1][3])
+    return (ipk, tpk, items)
+
+async def exercise(name, executor):
+    (ipk, tpk, items) = shows(name, 6)
+    service = VerifierService(name, ipk, tpk, executor, workers=1, latency_target=10.0, max_batch=4)
+    try:
+        results = await asyncio.gather(*[service.verify(*item) for item in items])
+        assert results == [True, False, True, True, True, True]
+        report = service.report()
+        assert report["verified"] == 5 and report["rejected"] == 1
+        assert report["batched_shows"] == 6 and report["batches"] < 6
+    finally:
+        await service.close()
+
+@pytest.mark.parametrize("scheme,executor", [("ps", "thread"), ("ps_g1", "thread"), ("bb", "process")])
+def test_verifier_service(scheme, executor):
+    asyncio.run(exercise(scheme, executor))
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_malformed_show_in_batch(executor):
+    async def run():
+        (ipk, tpk, items) = shows("ps", 4)
+        (m, Acred, (commit, list_s), keyEx) = items[2]
+        # A proof missing a response, and a show a process worker cannot be sent
+        truncated = (m, Acred, (commit, list_s[:-1]), keyEx)
+        unencodable = (m, Acred, (commit, list_s), (keyEx[0], keyEx[1], 0.5))
+        service = VerifierService("ps", ipk, tpk, executor, workers=1, min_batch=8, max_batch=8, batch_delay=0.1)
+        try:
+            futures = [await service.submit(*item) for item in [items[0], truncated, unencodable, items[2], items[3]]]
+            results = await asyncio.gather(*futures, return_exceptions=True)
+        finally:
+            await service.close()
+        assert results[:2] == [True, False] and results[3:] == [True, True]
+        if executor == "process":
+            assert isinstance(results[2], CodecError)
+            assert service.report()["failed"] == 1
+        else:
+            assert results[2] is False
+        assert service.report()["batches"] == 1
+    asyncio.run(run())
+
+def test_backpressure_and_close():
+    async def run():
+        (ipk, tpk, items) = shows("ps", 3)
+        service = VerifierService("ps", ipk, tpk, "thread", workers=1, max_queue=2)
+        futures = [service.submit_nowait(*items[0]), service.submit_nowait(*items[2])]
+        with pytest.raises(ServiceOverloaded):
+            service.submit_nowait(*items[0])
+        assert service.report()["overloaded"] == 1
+        # close() answers what is queued before stopping
+        await service.close()
+        assert [future.result() for future in futures] == [True, True]
+        with pytest.raises(RuntimeError):
+            await service.submit(*items[0])
+    asyncio.run(run())
+
+def test_batch_size_adapts_to_latency():
+    service = VerifierService("ps", None, None, "thread", workers=1, latency_target=0.05, min_batch=1, max_batch=8)
+    for _ in range(10):
+        service.adapt(service.batch_size, 0.01)
+    assert service.batch_size == 8
+    service.adapt(8, 0.2)
+    assert service.batch_size == 4
+    # A batch that was not full says nothing about larger batches
+    service.adapt(2, 0.01)
+    assert service.batch_size == 4
+    service.executor.shutdown()
@@ -0,0 +1,53 @@
+import pytest
+from utils import setup
+from codec import encode
+from aaka_net import make_scheme
+from replay_cache import ReplayCache
+from verify_pipeline import VerificationPipeline
+
+@pytest.mark.parametrize("scheme", ["ps", "bb"])
+def test_pipeline_stages(scheme):
+    params = setup(3)
+    (G, o, g1, g2, e) = params
+    s = make_scheme(scheme, params)
+    (isk, ipk) = s.IKeyGen(3)
+    (tsk, tpk) = s.LEAKeyGen()
+    (y, Y) = s.AsymKeyGen()
+    (m, pm) = (o.random(), o.random())
+    (cred, _) = s.CredIssue(isk, ipk, m, pm)
+    (a, A) = s.KeyExchange_UE()
+    (B, tau) = s.KeyExchange_XN(A, Y, y)
+    keyEx = (A, B, tau)
+    (Acred, pi, H) = s.CredShow(ipk, tpk, m, pm, cred, keyEx)
+    cache = ReplayCache()
+    pipeline = VerificationPipeline(s, ipk, tpk, cache)
+
+    assert pipeline.verify(encode(("SHOW", Acred, pi)), keyEx) is None
+    assert pipeline.verify((Acred, pi), keyEx) == "replay"
+    assert pipeline.verify(b"\x05garbage", keyEx) == "decode"
+    (commit, list_s) = pi
+    forged = (commit, list_s[:-1] + [list_s[-1] + 1])
+    assert pipeline.verify((Acred, forged), keyEx) == "g2"
+    # Shows that fail to verify are not recorded
+    assert len(cache) == 1
+    (Acred, pi, H) = s.CredShow(ipk, tpk, m, pm, cred, keyEx)
+    assert pipeline.verify((Acred, pi), keyEx, [s.Trace(tsk, Acred)]) == "revocation"
+
+    stats = pipeline.stats()
+    assert stats["accepted"] == 1
+    assert stats["stages"]["decode"]["entered"] == 5
+    assert stats["stages"]["pairing"]["entered"] == 2
+    assert [stats["stages"][name]["rejected"] for name in ("decode", "replay", "g2", "revocation")] == [1, 1, 1, 1]
+
+def test_pipeline_errors():
+    params = setup(3)
+    s = make_scheme("ps", params)
+    (isk, ipk) = s.IKeyGen(3)
+    (tsk, tpk) = s.LEAKeyGen()
+    pipeline = VerificationPipeline(s, ipk, tpk)
+    for show in [encode(("SHOW", 1)), encode(7), (1, 2), ((1,), (2, 3)), ((1,), ((2,), 3))]:
+        assert pipeline.verify(show, None) == "decode"
+    # A bug in a stage is not counted as a rejection
+    pipeline.stages[0] = ("decode", lambda state: state["missing"])
+    with pytest.raises(KeyError):
+        pipeline.verify(b"", None)
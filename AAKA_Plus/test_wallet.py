@@ -0,0 +1,70 @@
+import sys
+import threading
+import pytest
+from utils import setup
+from aaka_net import make_scheme
+from wallet import Wallet, WalletError
+
+@pytest.mark.parametrize("scheme", ["ps", "bb"])
+def test_wallet_roundtrip(tmp_path, scheme):
+    params = setup(3)
+    (G, o, g1, g2, e) = params
+    issuer = make_scheme(scheme, params)
+    (isk, ipk) = issuer.IKeyGen(3)
+    (tsk, tpk) = issuer.LEAKeyGen()
+    (y, Y) = issuer.AsymKeyGen()
+    path = str(tmp_path / "wallet")
+    entries = {}
+    with Wallet(path, params, scheme, capacity=2) as wallet:
+        for device_id in (907, 3, 2 ** 40, 51, 12):
+            (m, pm) = (o.random(), o.random())
+            (cred, pi) = issuer.CredIssue(isk, ipk, m, pm)
+            wallet.put(device_id, m, pm, cred)
+            entries[device_id] = (m, pm, cred)
+            if device_id == 3:
+                wallet.flush()
+        assert wallet.get(51) == entries[51]
+
+    with Wallet(path, params) as wallet:
+        assert wallet.scheme == scheme and len(wallet) == 5
+        assert sorted(wallet.ids()) == sorted(entries)
+        for device_id, entry in entries.items():
+            assert wallet.get(device_id) == entry
+        assert 4 not in wallet
+        (a, A) = issuer.KeyExchange_UE()
+        (B, tau) = issuer.KeyExchange_XN(A, Y, y)
+        keyEx = (A, B, tau)
+        (Acred, pi, H) = wallet.cred_show(issuer, ipk, tpk, 907, keyEx)
+        assert issuer.AcredVer(ipk, tpk, entries[907][0], Acred, pi, keyEx)
+
+    with pytest.raises(WalletError):
+        Wallet(path, params, "bb" if scheme == "ps" else "ps")
+
+def test_wallet_reads_while_growing(tmp_path):
+    params = setup(3)
+    (G, o, g1, g2, e) = params
+    issuer = make_scheme("ps", params)
+    (isk, ipk) = issuer.IKeyGen(3)
+    (m, pm) = (o.random(), o.random())
+    (cred, pi) = issuer.CredIssue(isk, ipk, m, pm)
+    errors = []
+    with Wallet(str(tmp_path / "wallet"), params, "ps", capacity=1) as wallet:
+        def read():
+            # put() remaps the file while growing it, lookups and ids() must not see the old map
+            try:
+                for device_id in range(2000):
+                    device_id in wallet
+                    wallet.ids()
+            except Exception as error:
+                errors.append(error)
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            reader = threading.Thread(target=read)
+            reader.start()
+            for device_id in range(512):
+                wallet.put(device_id, m, pm, cred)
+            reader.join()
+        finally:
+            sys.setswitchinterval(interval)
+        assert errors == [] and sorted(wallet.ids()) == list(range(512))
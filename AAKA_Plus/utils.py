@@ -1,5 +1,6 @@
 """ Utils supporting coconut """
-from bplib.bp import BpGroup
+from bplib.bp import BpGroup, G1Elem, G2Elem, GTElem
+from bplib.bindings import _FFI, _C
 from petlib.bn import Bn
 from hashlib import sha256
 
@@ -17,7 +18,9 @@ def setup(q=1):
 	G = BpGroup()
 	(g1, g2) = G.gen1(), G.gen2()
 	# hs = [G.hashG1(("h%s" % i).encode("utf8")) for i in range(q)]
-	(e, o) = G.pair, G.order()
+	o = G.order()
+	# looked up at every call so that op_counter can count the pairings
+	e = lambda P, Q: G.pair(P, Q)
 	return (G, o, g1, g2, e)
 
 class CocoException(Exception):
@@ -30,26 +33,123 @@ def coco_ensure(cond, message):
 # ==================================================
 # El-Gamal encryption scheme
 # ==================================================
-def elgamal_keygen(params):
-   """ generate an El Gamal key pair """
-   (G, o, g1, hs, g2, e) = params
-   d = o.random()
-   gamma = d * g1
-   return (d, gamma)
-
-def elgamal_enc(params, gamma, m, h):
-    """ encrypts the values of a message (h^m) """
-    (G, o, g1, hs, g2, e) = params
-    k = o.random()
-    a = k * g1
-    b = k * gamma + m * h
-    return (a, b, k)
+def elgamal_keygen(params, base=None):
+	""" generate an El Gamal key pair, gamma = d * base (default g1) """
+	(G, o, g1, g2, e) = params
+	base = g1 if base is None else base
+	d = o.random()
+	gamma = d * base
+	return (d, gamma)
+
+def elgamal_enc(params, gamma, m, h, base=None):
+	""" encrypts the values of a message (h^m) """
+	(G, o, g1, g2, e) = params
+	base = g1 if base is None else base
+	k = o.random()
+	a = k * base
+	b = k * gamma + m * h
+	return (a, b, k)
 
 def elgamal_dec(params, d, c):
-    """ decrypts the message (h^m) """
-    (G, o, g1, hs, g2, e) = params
-    (a, b) = c
-    return b - d*a
+	""" decrypts the message (h^m) """
+	(a, b) = c
+	return b - d * a
+
+def elgamal_tables(params, gamma, h, base=None, window=8):
+	"""
+	Fixed-base tables of base, gamma and h for elgamal_enc_batch.
+
+	Building them costs about as much as a hundred scalar multiplications,
+	so they pay off for large batches or when reused across batches.
+
+	Returns:
+		- tuple: FixedBaseTable of base, gamma and h
+	"""
+	(G, o, g1, g2, e) = params
+	base = g1 if base is None else base
+	return tuple(FixedBaseTable(G, point, window) for point in (base, gamma, h))
+
+def elgamal_enc_batch(params, gamma, ms, h, base=None, tables=None):
+	"""
+	Encrypt h^m for every m in ms.
+
+	Parameters:
+		- `gamma` (G1Elem or G2Elem): the public key
+		- `ms` (list): the messages
+		- `h` (G1Elem or G2Elem): the message base
+		- `base` (G1Elem or G2Elem): the base of the key (default g1)
+		- `tables` (tuple): tables from elgamal_tables, built here if not given
+
+	Returns:
+		- list: (a, b, k) of every message
+	"""
+	(G, o, g1, g2, e) = params
+	if tables is None:
+		tables = elgamal_tables(params, gamma, h, base)
+	(t_base, t_gamma, t_h) = tables
+	ciphertexts = []
+	for m in ms:
+		k = o.random()
+		ciphertexts.append((t_base.mul(k), t_gamma.mul(k) + t_h.mul(m), k))
+	return ciphertexts
+
+def elgamal_dec_batch(params, d, cs):
+	"""
+	Decrypt several ciphertexts under the same key.
+
+	Every ciphertext has its own point a, so no table applies and each
+	one costs a scalar multiplication.
+
+	Parameters:
+		- `d` (Bn): the secret key
+		- `cs` (list): (a, b) ciphertexts
+
+	Returns:
+		- list: h^m of every ciphertext
+	"""
+	return [b - d * a for (a, b) in cs]
+
+class FixedBaseTable:
+	"""
+	Window table of the multiples of a fixed G1 or G2 point.
+
+	Row i holds j * 2^(window * i) * point for every window digit j, so a
+	scalar multiplication by the point is one addition per nonzero digit.
+	"""
+	def __init__(self, G, point, window=8):
+		self.G = G
+		self.point = point
+		self.window = window
+		self.mask = (1 << window) - 1
+		self.order = int(G.order())
+		if isinstance(point, G1Elem):
+			(self.cls, self.add) = (G1Elem, _C.G1_ELEM_add)
+		else:
+			(self.cls, self.add) = (G2Elem, _C.G2_ELEM_add)
+		self.rows = []
+		base = point
+		for _ in range((self.order.bit_length() + window - 1) // window):
+			row = [None]
+			acc = base
+			for _ in range(self.mask):
+				row.append(acc)
+				acc = acc + base
+			self.rows.append(row)
+			base = acc
+
+	def mul(self, x):
+		""" x * point """
+		k = int(x) % self.order
+		ret = self.cls(self.G)
+		i = 0
+		while k:
+			digit = k & self.mask
+			if digit:
+				# accumulate in place, without a new point per addition
+				coco_ensure(self.add(self.G.bpg, ret.elem, ret.elem, self.rows[i][digit].elem, _FFI.NULL) == 1, "addition failed")
+			k >>= self.window
+			i += 1
+		return ret
 
 
 # ==================================================
@@ -63,6 +163,70 @@ def ec_sum(list):
 	return ret
 
 
+def ec_msm(G, points, scalars):
+	""" multi-scalar multiplication: sum of scalars[i] * points[i], all in G1 or all in G2 """
+	o = G.order()
+	# the reduced scalars must stay referenced until the call returns
+	bns = [(x if isinstance(x, Bn) else Bn(x)) % o for x in scalars]
+	if isinstance(points[0], G1Elem):
+		ret = G1Elem(G)
+		pts = _FFI.new("const G1_ELEM *[]", [p.elem for p in points])
+		mul = _C.G1_ELEMs_mul
+	else:
+		ret = G2Elem(G)
+		pts = _FFI.new("const G2_ELEM *[]", [p.elem for p in points])
+		mul = _C.G2_ELEMs_mul
+	scs = _FFI.new("const BIGNUM *[]", [x.bn for x in bns])
+	coco_ensure(mul(G.bpg, ret.elem, _FFI.NULL, len(points), pts, scs, _FFI.NULL) == 1, "multi-scalar multiplication failed")
+	return ret
+
+def random_weights(o, n):
+	""" weights of a random linear combination of n equations, the first one is 1 """
+	return [Bn(1)] + [o.random() for _ in range(n - 1)]
+
+def check_combined(G, terms):
+	"""
+	Check a random linear combination of equations as one identity.
+
+	Parameters:
+		- `G` (BpGroup): the pairing group
+		- `terms` (list): (point, scalar) pairs whose weighted sum must be the identity
+
+	Returns:
+		- bool: whether the sum is the point at infinity
+	"""
+	(points, scalars) = zip(*terms)
+	return ec_msm(G, points, scalars).isinf()
+
+def multi_pairing(G, pairs):
+	""" product of the pairings e(P, Q) over (P, Q) pairs, sharing one final exponentiation """
+	ret = GTElem(G)
+	p1 = _FFI.new("const G1_ELEM *[]", [p.elem for (p, q) in pairs])
+	p2 = _FFI.new("const G2_ELEM *[]", [q.elem for (p, q) in pairs])
+	coco_ensure(_C.GT_ELEMs_pairing(G.bpg, ret.elem, len(pairs), p1, p2, _FFI.NULL) == 1, "multi-pairing failed")
+	return ret
+
+def check_pairings(G, equations):
+	"""
+	Check a random linear combination of pairing equations with one multi-pairing.
+
+	Parameters:
+		- `G` (BpGroup): the pairing group
+		- `equations` (list): lists of (P, Q) pairs, each list meaning prod e(P, Q) == 1
+
+	Returns:
+		- bool: whether every equation holds, up to a negligible error
+	"""
+	weights = random_weights(G.order(), len(equations))
+	# G1 points paired with the same G2 point are folded into one pairing
+	groups = {}
+	for (w, pairs) in zip(weights, equations):
+		for (p, q) in pairs:
+			groups.setdefault(q.export(), (q, []))[1].append((p, w))
+	pairs = [(ec_msm(G, *zip(*terms)), q) for (q, terms) in groups.values()]
+	return multi_pairing(G, pairs).isone()
+
+
 # ===================================================
 # inversion
 # ===================================================
@@ -81,10 +245,16 @@ def inv(a, n):  ### EDITED ###
 # ===================================================
 # ZKP
 # ===================================================
+def to_challenge(x):
+        """ canonical string of a challenge element, points have no stable str() """
+        if isinstance(x, (G1Elem, G2Elem)):
+                return x.export().hex()
+        return str(x)
+
 def challenge(elements):
         """Packages a challenge in a bijective way"""
         elem = [len(elements)] + elements
-        elem_str = map(str, elem)
+        elem_str = map(to_challenge, elem)
         elem_len = map(lambda x: "%s||%s" % (len(x), x), elem_str)
         state = "|".join(elem_len)
         H = sha256()
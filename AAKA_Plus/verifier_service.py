@@ -0,0 +1,291 @@
+""" Streaming show verifier with a bounded queue and adaptive micro-batching """
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from aaka_async import EXECUTORS
+from aaka_net import make_scheme
+from codec import encode, decode
+from utils import setup
+
+_worker = {}
+
+
+def _init_worker(name, keys):
+    # The scheme and the decoded issuer and trustee keys stay in the worker
+    # for its whole life, batches only carry the shows
+    params = setup(3)
+    _worker.update(params=params, scheme=make_scheme(name, params), keys=decode(params[0], keys))
+
+
+def _verify_encoded(data):
+    G = _worker["params"][0]
+    (ipk, tpk) = _worker["keys"]
+    return encode(_worker["scheme"].batch_AcredVer(ipk, tpk, decode(G, data)))
+
+
+class ServiceOverloaded(Exception):
+    pass
+
+
+class VerifierService:
+    def __init__(self, scheme, ipk, tpk, executor="process", workers=2, latency_target=0.05,
+                 max_queue=1024, min_batch=1, max_batch=64, batch_delay=0.002):
+        """
+        Initialize the VerifierService class.
+
+        Shows wait in a bounded queue and a dispatcher groups them into
+        micro-batches verified with batch_AcredVer on warm workers, at most
+        one batch per worker at a time. The batch size is adapted to the
+        latency target: it grows by one after a full batch that was formed
+        and verified in time, and is halved after a batch that took longer.
+
+        Time spent waiting in the queue is not held against the batch size,
+        larger batches drain the queue faster. A full queue is the
+        backpressure instead: submit() waits for room and submit_nowait()
+        raises ServiceOverloaded.
+
+        Parameters:
+            scheme (str): "ps", "bb" or "ps_g1"
+            ipk (list): Issuer public key of every verified show
+            tpk (G1Elem or G2Elem): Trustee public key of every verified show
+            executor (str): "thread" or "process"
+            workers (int): Number of workers, i.e. of batches verified at once
+            latency_target (float): Time in seconds to form and verify a batch the batch size adapts to
+            max_queue (int): Largest number of shows waiting for a batch
+            min_batch (int): Smallest batch size the adaptation goes down to
+            max_batch (int): Largest batch size the adaptation goes up to
+            batch_delay (float): Longest time in seconds a batch waits to fill once a show arrived
+        """
+        if executor not in EXECUTORS:
+            raise ValueError("unknown executor %s" % executor)
+        self.params = setup(3)
+        self.scheme = make_scheme(scheme, self.params)
+        (self.ipk, self.tpk) = (ipk, tpk)
+        self.process = executor == "process"
+        if self.process:
+            self.executor = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(scheme, encode((ipk, tpk))))
+        else:
+            self.executor = ThreadPoolExecutor(workers)
+        self.workers = workers
+        self.latency_target = latency_target
+        self.min_batch = min_batch
+        self.max_batch = max_batch
+        self.batch_delay = batch_delay
+        self.batch_size = min_batch
+        self.queue = asyncio.Queue(max_queue)
+        self.slots = asyncio.Semaphore(workers)
+        self.tasks = set()
+        self.dispatcher = None
+        self.formed = None
+        self.closed = False
+        self.stats = {"submitted": 0, "verified": 0, "rejected": 0, "failed": 0, "cancelled": 0, "overloaded": 0,
+                      "batches": 0, "batched_shows": 0, "late_batches": 0}
+
+    def _entry(self, m, Acred, pi, keyEx):
+        if self.closed:
+            raise RuntimeError("verifier service is closed")
+        loop = asyncio.get_running_loop()
+        if self.dispatcher is None:
+            self.dispatcher = loop.create_task(self._dispatch())
+        return (loop.create_future(), time.monotonic(), (m, Acred, pi, keyEx))
+
+    async def submit(self, m, Acred, pi, keyEx):
+        """
+        Queue a show, waiting for room while the queue is full.
+
+        Returns:
+            asyncio.Future: Resolves to the verification result (bool)
+        """
+        entry = self._entry(m, Acred, pi, keyEx)
+        await self.queue.put(entry)
+        self.stats["submitted"] += 1
+        return entry[0]
+
+    def submit_nowait(self, m, Acred, pi, keyEx):
+        """
+        Queue a show without waiting.
+
+        Returns:
+            asyncio.Future: Resolves to the verification result (bool)
+
+        Raises:
+            ServiceOverloaded: The queue is full
+        """
+        entry = self._entry(m, Acred, pi, keyEx)
+        try:
+            self.queue.put_nowait(entry)
+        except asyncio.QueueFull:
+            self.stats["overloaded"] += 1
+            raise ServiceOverloaded("%d shows waiting" % self.queue.qsize()) from None
+        self.stats["submitted"] += 1
+        return entry[0]
+
+    async def verify(self, m, Acred, pi, keyEx):
+        """
+        Verify a show as part of a micro-batch.
+
+        Returns:
+            bool: Verification result
+        """
+        future = await self.submit(m, Acred, pi, keyEx)
+        try:
+            return await future
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+
+    def adapt(self, size, latency):
+        """
+        Adapt the batch size to the latency of a verified batch.
+
+        Parameters:
+            size (int): Number of shows in the batch
+            latency (float): Time in seconds from taking its first show off the queue to its verdicts
+        """
+        if latency > self.latency_target:
+            self.stats["late_batches"] += 1
+            self.batch_size = max(self.min_batch, self.batch_size // 2)
+        elif size >= self.batch_size:
+            self.batch_size = min(self.max_batch, self.batch_size + 1)
+
+    async def _take(self):
+        # Form one batch: wait for a show, then take what is queued up to the
+        # batch size, waiting at most batch_delay for more
+        entries = [await self.queue.get()]
+        self.formed = time.monotonic()
+        deadline = self.formed + self.batch_delay
+        while len(entries) < self.batch_size:
+            if self.queue.empty():
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    entries.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            else:
+                entries.append(self.queue.get_nowait())
+        live = [entry for entry in entries if not entry[0].cancelled()]
+        self.stats["cancelled"] += len(entries) - len(live)
+        for _ in range(len(entries) - len(live)):
+            self.queue.task_done()
+        return live
+
+    async def _dispatch(self):
+        while True:
+            await self.slots.acquire()
+            entries = await self._take()
+            if not entries:
+                self.slots.release()
+                continue
+            task = asyncio.get_running_loop().create_task(self._verify_batch(entries, self.formed))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def _run(self, items):
+        loop = asyncio.get_running_loop()
+        if self.process:
+            return decode(self.params[0], await loop.run_in_executor(self.executor, _verify_encoded, encode(items)))
+        return await loop.run_in_executor(self.executor, self.scheme.batch_AcredVer, self.ipk, self.tpk, items)
+
+    async def _run_one(self, item):
+        try:
+            return (await self._run([item]))[0]
+        except Exception as error:
+            return error
+
+    async def _verify_batch(self, entries, formed):
+        items = [item for (future, queued, item) in entries]
+        self.stats["batches"] += 1
+        self.stats["batched_shows"] += len(entries)
+        try:
+            try:
+                results = await self._run(items)
+            except Exception:
+                # Verified again one by one, so that a show breaking its batch
+                # only fails its own call
+                results = [await self._run_one(item) for item in items]
+        finally:
+            self.slots.release()
+            for _ in entries:
+                self.queue.task_done()
+        self.adapt(len(entries), time.monotonic() - formed)
+        for ((future, queued, item), result) in zip(entries, results):
+            if isinstance(result, Exception):
+                self.stats["failed"] += 1
+                if not future.done():
+                    future.set_exception(result)
+                continue
+            self.stats["verified" if result else "rejected"] += 1
+            if not future.done():
+                future.set_result(result)
+
+    def report(self):
+        """
+        Report the service counters.
+
+        Returns:
+            dict: Shows submitted, verified, rejected, failed, cancelled and refused, batches, the current batch size and queue length
+        """
+        report = dict(self.stats)
+        report["batch_size"] = self.batch_size
+        report["queued"] = self.queue.qsize()
+        report["mean_batch"] = round(report["batched_shows"] / report["batches"], 2) if report["batches"] else 0.0
+        return report
+
+    async def close(self):
+        """
+        Stop accepting shows, verify the queued ones and shut the workers down.
+        """
+        self.closed = True
+        # Every queued show is marked done once its batch has been answered
+        await self.queue.join()
+        if self.dispatcher is not None:
+            self.dispatcher.cancel()
+            await asyncio.gather(self.dispatcher, return_exceptions=True)
+        self.executor.shutdown(cancel_futures=True)
+
+
+async def _load(args):
+    params = setup(3)
+    (G, o, g1, g2, e) = params
+    scheme = make_scheme(args.scheme, params)
+    (isk, ipk) = scheme.IKeyGen(3)
+    (tsk, tpk) = scheme.LEAKeyGen()
+    (m, pm) = (o.random(), o.random())
+    (cred, pi) = scheme.CredIssue(isk, ipk, m, pm)
+    items = []
+    for _ in range(args.distinct):
+        keyEx = (o.random() * g1, o.random() * g1, b"tau")
+        (Acred, pi_show, H) = scheme.CredShow(ipk, tpk, m, pm, cred, keyEx)
+        items.append((m, Acred, pi_show, keyEx))
+    service = VerifierService(args.scheme, ipk, tpk, args.executor, args.workers, args.latency_target,
+                              args.queue, max_batch=args.max_batch)
+    latencies = []
+
+    async def one(item):
+        start = time.monotonic()
+        assert await service.verify(*item)
+        latencies.append(time.monotonic() - start)
+
+    start = time.monotonic()
+    await asyncio.gather(*[one(items[i % len(items)]) for i in range(args.shows)])
+    elapsed = time.monotonic() - start
+    await service.close()
+    latencies.sort()
+    print(f"{args.shows / elapsed:.1f} shows/s, p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms")
+    print(service.report())
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Verify a burst of shows with the streaming verifier")
+    parser.add_argument("--scheme", choices=["ps", "bb", "ps_g1"], default="ps")
+    parser.add_argument("--executor", choices=EXECUTORS, default="process")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--shows", type=int, default=200, help="number of shows submitted at once")
+    parser.add_argument("--distinct", type=int, default=16, help="number of distinct shows built and cycled through")
+    parser.add_argument("--latency-target", type=float, default=0.1, help="seconds")
+    parser.add_argument("--queue", type=int, default=64, help="largest number of queued shows")
+    parser.add_argument("--max-batch", type=int, default=64)
+    asyncio.run(_load(parser.parse_args()))
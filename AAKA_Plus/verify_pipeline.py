@@ -0,0 +1,140 @@
+""" Cost-ordered, fail-fast verification of credential shows """
+import threading
+import time
+from codec import decode, CodecError
+from replay_cache import show_key
+from utils import CocoException
+
+# Stages in the order they run, cheapest first
+STAGES = ("decode", "replay", "challenge", "g1", "g2", "pairing", "revocation")
+
+# Failures a malformed show can cause, anything else is a bug and propagates
+REJECTED = (CodecError, CocoException, ValueError)
+
+
+def _sequence(value, length=None):
+    return isinstance(value, (tuple, list)) and (length is None or len(value) == length)
+
+
+class VerificationPipeline:
+    def __init__(self, scheme, ipk, tpk, replay_cache=None):
+        """
+        Initialize the VerificationPipeline class.
+
+        A show goes through decode, replay check, challenge recomputation,
+        the G1 equations, the G2 equations, the pairing equation and the
+        revocation check, and stops at the first stage that rejects it.
+        The replay stage only looks the show up; an accepted show is
+        recorded in the replay cache at the end, so shows that fail to
+        verify cannot fill the cache and evict genuine ones.
+        The stage methods of the scheme are stateless, so one pipeline can
+        be shared by every connection.
+
+        Parameters:
+            scheme (AAKA_PS, AAKA_BB or AAKA_PS_G1): Scheme instance
+            ipk (list): Issuer public key
+            tpk (G2Elem): LEA public key
+            replay_cache (ReplayCache): Cache of recent shows, None to skip the replay stage
+        """
+        self.scheme = scheme
+        self.ipk = ipk
+        self.tpk = tpk
+        self.replay_cache = replay_cache
+        self.stages = [(name, getattr(self, "_" + name)) for name in STAGES]
+        self.lock = threading.Lock()
+        self.entered = dict.fromkeys(STAGES, 0)
+        self.rejected = dict.fromkeys(STAGES, 0)
+        self.elapsed_ns = dict.fromkeys(STAGES, 0)
+        self.accepted = 0
+
+    def verify(self, show, keyEx, RL=()):
+        """
+        Verify a show.
+
+        Parameters:
+            show (bytes or tuple): Encoded ("SHOW", Acred, pi) message, or the decoded (Acred, pi)
+            keyEx (tuple): Key exchange data (A, B, tau)
+            RL (list): Revocation list
+
+        Returns:
+            str: Name of the stage that rejected the show, None if it was accepted
+        """
+        state = {"show": show, "keyEx": keyEx, "RL": RL}
+        clock = time.perf_counter_ns
+        for name, stage in self.stages:
+            start = clock()
+            try:
+                ok = stage(state)
+            except REJECTED:
+                ok = False
+            elapsed = clock() - start
+            with self.lock:
+                self.entered[name] += 1
+                self.elapsed_ns[name] += elapsed
+                if not ok:
+                    self.rejected[name] += 1
+            if not ok:
+                return name
+        # Recording checks again, so of two copies of a show verified at once only one is accepted
+        if self.replay_cache is not None and self.replay_cache.check_and_add(state["key"]):
+            with self.lock:
+                self.rejected["replay"] += 1
+            return "replay"
+        with self.lock:
+            self.accepted += 1
+        return None
+
+    def _decode(self, state):
+        show = state["show"]
+        if isinstance(show, (bytes, bytearray)):
+            message = decode(self.scheme.params[0], show)
+            if not _sequence(message, 3) or message[0] != "SHOW":
+                return False
+            show = message[1:]
+        # The shape the scheme check indexes into, its lengths and types are checked there
+        if not (_sequence(show, 2) and _sequence(show[0]) and _sequence(show[1], 2)
+                and _sequence(show[1][0]) and _sequence(show[1][1])):
+            return False
+        (state["Acred"], state["pi"]) = show
+        return self.scheme.AcredVer_wellformed(state["Acred"], state["pi"])
+
+    def _replay(self, state):
+        if self.replay_cache is None:
+            return True
+        state["key"] = show_key(state["Acred"], state["pi"])
+        return not self.replay_cache.seen(state["key"])
+
+    def _challenge(self, state):
+        state["ctx"] = self.scheme.AcredVer_challenge(state["Acred"], state["pi"], state["keyEx"])
+        return True
+
+    def _g1(self, state):
+        return self.scheme.AcredVer_G1(self.ipk, self.tpk, state["Acred"], state["pi"], state["ctx"])
+
+    def _g2(self, state):
+        return self.scheme.AcredVer_G2(self.ipk, self.tpk, state["Acred"], state["pi"], state["ctx"])
+
+    def _pairing(self, state):
+        return self.scheme.AcredVer_pairing(state["Acred"])
+
+    def _revocation(self, state):
+        return not self.scheme.judge(state["Acred"], state["RL"])
+
+    def stats(self):
+        """
+        Report per-stage counters.
+
+        Returns:
+            dict: Accepted shows and, for every stage, shows entered and rejected with total and mean time
+        """
+        with self.lock:
+            stages = {}
+            for name in STAGES:
+                entered = self.entered[name]
+                stages[name] = {
+                    "entered": entered,
+                    "rejected": self.rejected[name],
+                    "total_ms": round(self.elapsed_ns[name] / 1e6, 3),
+                    "mean_us": round(self.elapsed_ns[name] / entered / 1e3, 1) if entered else 0.0,
+                }
+            return {"accepted": self.accepted, "stages": stages}
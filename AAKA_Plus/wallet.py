@@ -0,0 +1,229 @@
+""" Memory-mapped credential wallet holding the secrets of many simulated UEs """
+import mmap
+import os
+import struct
+import threading
+from bplib.bp import G1Elem
+from petlib.bn import Bn
+
+MAGIC = b"AAKAWLT1"
+
+# Credential points per record: PS holds (sigma_1, sigma_2), BB holds (sigma, sigma_0, sigma_1, sigma_2)
+CRED_POINTS = {"ps": 2, "bb": 4, "ps_g1": 2}
+
+# magic, scheme, record count, record capacity
+_HEADER = struct.Struct(">8s8sQQ")
+_ID = struct.Struct(">Q")
+_INDEX = struct.Struct(">QQ")
+
+
+class WalletError(Exception):
+    pass
+
+
+class Wallet:
+    def __init__(self, path, params, scheme=None, capacity=1024):
+        """
+        Open a wallet file, creating it when scheme is given and the file does not exist.
+
+        Each device takes one fixed-size record: its id, m, pm and the
+        compressed credential points, so the file can hold millions of
+        devices while only the records being shown are decoded. A sidecar
+        file path + ".idx" keeps the (id, slot) pairs sorted by id and is
+        searched in place through its own mapping; ids added since the last
+        flush() are looked up in a small in-memory dict.
+
+        Parameters:
+            path (str): Wallet file
+            params (tuple): System parameters
+            scheme (str): "ps", "bb" or "ps_g1", required to create the file
+            capacity (int): Records allocated when creating the file, the file grows as needed
+        """
+        (G, o, g1, g2, e) = params
+        self.path = path
+        self.params = params
+        self.scalar_size = (o.num_bits() + 7) // 8
+        self.point_size = len(g1.export())
+        self.lock = threading.Lock()
+        self.pending = {}
+
+        if not os.path.exists(path):
+            if scheme not in CRED_POINTS:
+                raise WalletError("cannot create %s: unknown scheme %s" % (path, scheme))
+            with open(path, "wb") as file:
+                file.write(_HEADER.pack(MAGIC, scheme.encode("ascii"), 0, capacity))
+                file.truncate(_HEADER.size + capacity * self._record_size(scheme))
+        self.file = open(path, "r+b")
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        (magic, name, self.count, self.capacity) = _HEADER.unpack_from(self.map, 0)
+        self.scheme = name.rstrip(b"\0").decode("ascii", "replace")
+        if magic != MAGIC or (scheme is not None and scheme != self.scheme):
+            self.map.close()
+            self.file.close()
+            if magic != MAGIC:
+                raise WalletError("%s is not a wallet file" % path)
+            raise WalletError("%s holds %s credentials, not %s" % (path, self.scheme, scheme))
+        self.record_size = self._record_size(self.scheme)
+        self._load_index()
+
+    def _record_size(self, scheme):
+        return _ID.size + 2 * self.scalar_size + CRED_POINTS[scheme] * self.point_size
+
+    def _load_index(self):
+        self.index = None
+        self.indexed = 0
+        index_path = self.path + ".idx"
+        if os.path.exists(index_path) and os.path.getsize(index_path) > 0:
+            with open(index_path, "rb") as file:
+                self.index = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.indexed = len(self.index) // _INDEX.size
+        # Records written after the last flush are not in the sidecar yet
+        for slot in range(self.indexed, self.count):
+            self.pending[_ID.unpack_from(self.map, self._offset(slot))[0]] = slot
+
+    def _offset(self, slot):
+        return _HEADER.size + slot * self.record_size
+
+    def _find(self, device_id):
+        slot = self.pending.get(device_id)
+        if slot is not None:
+            return slot
+        (low, high) = (0, self.indexed)
+        while low < high:
+            middle = (low + high) // 2
+            (found, slot) = _INDEX.unpack_from(self.index, middle * _INDEX.size)
+            if found == device_id:
+                return slot
+            if found < device_id:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def _grow(self):
+        self.capacity *= 2
+        self.map.close()
+        self.file.truncate(_HEADER.size + self.capacity * self.record_size)
+        self.map = mmap.mmap(self.file.fileno(), 0)
+
+    def put(self, device_id, m, pm, cred):
+        """
+        Store the secrets of a device, replacing any earlier entry for the same id.
+
+        Parameters:
+            device_id (int): Device id
+            m (Bn): Message
+            pm (Bn): id
+            cred (tuple): Credential
+        """
+        if len(cred) != CRED_POINTS[self.scheme]:
+            raise WalletError("a %s credential has %d points" % (self.scheme, CRED_POINTS[self.scheme]))
+        size = self.scalar_size
+        record = b"".join([_ID.pack(device_id), m.binary().rjust(size, b"\0"), pm.binary().rjust(size, b"\0")] + [point.export() for point in cred])
+        with self.lock:
+            slot = self._find(device_id)
+            if slot is None:
+                if self.count == self.capacity:
+                    self._grow()
+                slot = self.count
+                self.count += 1
+                _HEADER.pack_into(self.map, 0, MAGIC, self.scheme.encode("ascii"), self.count, self.capacity)
+                self.pending[device_id] = slot
+            offset = self._offset(slot)
+            self.map[offset:offset + self.record_size] = record
+
+    def get(self, device_id):
+        """
+        Decode the secrets of a device.
+
+        Parameters:
+            device_id (int): Device id
+
+        Returns:
+            tuple: Message (m), id (pm) and credential (cred)
+        """
+        (G, o, g1, g2, e) = self.params
+        # Copy the record under the lock, put() may remap the file while growing it
+        with self.lock:
+            slot = self._find(device_id)
+            if slot is None:
+                raise KeyError(device_id)
+            offset = self._offset(slot) + _ID.size
+            record = self.map[offset:offset + self.record_size - _ID.size]
+        size = self.scalar_size
+        m = Bn.from_binary(record[:size])
+        pm = Bn.from_binary(record[size:2 * size])
+        points = record[2 * size:]
+        cred = tuple(G1Elem.from_bytes(points[i:i + self.point_size], G) for i in range(0, len(points), self.point_size))
+        return (m, pm, cred)
+
+    def __contains__(self, device_id):
+        with self.lock:
+            return self._find(device_id) is not None
+
+    def __len__(self):
+        return self.count
+
+    def ids(self):
+        """
+        List the device ids in slot order.
+
+        Returns:
+            list: Device ids
+        """
+        with self.lock:
+            return [_ID.unpack_from(self.map, self._offset(slot))[0] for slot in range(self.count)]
+
+    def cred_show(self, scheme, ipk, tpk, device_id, keyEx):
+        """
+        Show the credential of a device straight from its record.
+
+        Parameters:
+            scheme (AAKA_PS, AAKA_BB or AAKA_PS_G1): Scheme instance
+            ipk (list): Issuer public key
+            tpk (G2Elem): LEA public key
+            device_id (int): Device id
+            keyEx (tuple): Key exchange data (A, B, tau)
+
+        Returns:
+            tuple: Anonymous credential (Acred), zero-knowledge proof (pi), and hashed key (H)
+        """
+        (m, pm, cred) = self.get(device_id)
+        return scheme.CredShow(ipk, tpk, m, pm, cred, keyEx)
+
+    def flush(self):
+        """
+        Merge the pending ids into the sorted index file and write everything to disk.
+        """
+        with self.lock:
+            self.map.flush()
+            if not self.pending:
+                return
+            entries = [_INDEX.unpack_from(self.index, i * _INDEX.size) for i in range(self.indexed)]
+            entries = sorted(entries + list(self.pending.items()))
+            index_path = self.path + ".idx"
+            with open(index_path + ".tmp", "wb") as file:
+                file.write(b"".join(_INDEX.pack(device_id, slot) for (device_id, slot) in entries))
+            if self.index is not None:
+                self.index.close()
+            os.replace(index_path + ".tmp", index_path)
+            self.pending = {}
+            with open(index_path, "rb") as file:
+                self.index = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.indexed = len(entries)
+
+    def close(self):
+        """
+        Flush and unmap the wallet.
+        """
+        self.flush()
+        if self.index is not None:
+            self.index.close()
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
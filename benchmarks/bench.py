@@ -0,0 +1,170 @@
+""" Benchmark suite of the AAKA+PS/BB schemes, the G1 variant of PS and the 5G AKA protocol """
+import argparse
+import importlib
+import multiprocessing
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import harness
+
+SUITES = ["ps", "bb", "ps_g1", "5g"]
+
+
+def runSuite(suite, iterations, warmup, seed, pattern):
+    """
+    Build the fixtures of a suite and time every case.
+
+    Parameters:
+        suite (str): Suite name
+        iterations (int): Number of timed calls per case
+        warmup (int): Number of untimed calls per case
+        seed (int): Seed for the fixtures
+        pattern (str): Only run cases whose name contains pattern
+
+    Returns:
+        dict: Results by case name
+    """
+    harness.use_suite_path(suite)
+    module = importlib.import_module(f"suite_{suite}")
+    progress = lambda name, result: print(f"  {name}: {result['median_ns'] / 1e6:.4f} ms", file=sys.stderr)
+    return harness.run_cases(module.cases(seed), iterations, warmup, pattern, progress)
+
+
+def costSuite(suite, iterations, warmup, seed, pattern, timed):
+    """
+    Count the primitives of every case of a suite and time the primitives.
+
+    Parameters:
+        suite (str): Suite name
+        iterations (int): Number of timed calls per primitive
+        warmup (int): Number of untimed calls per primitive
+        seed (int): Seed for the fixtures
+        pattern (str): Only count cases whose name contains pattern
+        timed (bool): Also time every case to check the prediction
+
+    Returns:
+        tuple: Unit costs by primitive, costs by case name
+    """
+    harness.use_suite_path(suite)
+    module = importlib.import_module(f"suite_{suite}")
+    cases = module.cases(seed)
+    units = module.unit_costs(iterations, warmup)
+    costs = {}
+    for name, counts in harness.count_cases(cases, module.counter, pattern).items():
+        costs[name] = {"counts": counts, "predicted_ns": harness.predict(counts, units)}
+    if timed:
+        for name, result in harness.run_cases(cases, iterations, warmup, pattern).items():
+            costs[name]["measured_ns"] = result["median_ns"]
+    return units, costs
+
+
+def costs(suites, iterations, warmup, seed=None, pattern=None, timed=False):
+    """
+    Build the cost table of suites, each in a fresh process.
+
+    Returns:
+        dict: Document with the run metadata, the unit costs by suite and the costs by case name
+    """
+    units, results = {}, {}
+    context = multiprocessing.get_context("spawn")
+    for suite in suites:
+        print(f"[{suite}]", file=sys.stderr)
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            units[suite], suite_costs = pool.submit(costSuite, suite, iterations, warmup, seed, pattern, timed).result()
+        results.update(suite_costs)
+    document = harness.metadata(seed, iterations, warmup)
+    document["suites"] = suites
+    return {"meta": document, "units": units, "costs": results}
+
+
+def run(suites, iterations, warmup, seed=None, pattern=None):
+    """
+    Run suites, each in a fresh process since they ship conflicting crypto modules.
+
+    Returns:
+        dict: Document with the run metadata and the results by case name
+    """
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for suite in suites:
+        print(f"[{suite}]", file=sys.stderr)
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            results.update(pool.submit(runSuite, suite, iterations, warmup, seed, pattern).result())
+    document = harness.metadata(seed, iterations, warmup)
+    document["suites"] = suites
+    return {"meta": document, "results": results}
+
+
+def printComparison(rows, threshold):
+    print(f"{'operation':<34}{'baseline':>12}{'current':>12}{'ratio':>8}  (ms, threshold {threshold:.0%})")
+    for name, before, after, ratio, status in rows:
+        print(f"{name:<34}{before / 1e6:>12.4f}{after / 1e6:>12.4f}{ratio:>8.2f}  {status}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="AAKA+ and 5G AKA benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="time every operation")
+    run_parser.add_argument("--suite", nargs="+", choices=SUITES, default=SUITES)
+    run_parser.add_argument("--iterations", type=int, default=100, help="timed calls per operation")
+    run_parser.add_argument("--warmup", type=int, default=10, help="untimed calls per operation")
+    run_parser.add_argument("--seed", type=int, default=None, help="build deterministic fixtures")
+    run_parser.add_argument("--filter", help="only run operations whose name contains this")
+    run_parser.add_argument("--json", help="write the results to this JSON file")
+
+    compare_parser = commands.add_parser("compare", help="flag regressions against a baseline")
+    compare_parser.add_argument("baseline", help="baseline JSON file")
+    compare_parser.add_argument("current", help="current JSON file")
+    compare_parser.add_argument("--threshold", type=float, default=0.10, help="relative slowdown flagged as a regression")
+    compare_parser.add_argument("--metric", choices=["median_ns", "p95_ns", "mean_ns", "min_ns"], default="median_ns")
+    compare_parser.add_argument("--prefixes", nargs=2, metavar=("BASELINE", "CURRENT"), help="compare the operations of two suites, e.g. ps ps_g1")
+
+    costs_parser = commands.add_parser("costs", help="count the primitives of every operation and predict its time")
+    costs_parser.add_argument("--suite", nargs="+", choices=SUITES, default=SUITES)
+    costs_parser.add_argument("--iterations", type=int, default=100, help="timed calls per primitive")
+    costs_parser.add_argument("--warmup", type=int, default=10, help="untimed calls per primitive")
+    costs_parser.add_argument("--seed", type=int, default=None, help="build deterministic fixtures")
+    costs_parser.add_argument("--filter", help="only count operations whose name contains this")
+    costs_parser.add_argument("--measure", action="store_true", help="also time every operation to check the prediction")
+    costs_parser.add_argument("--json", help="write the cost table to this JSON file")
+
+    diff_parser = commands.add_parser("cost-diff", help="show the primitive counts that changed between two cost tables")
+    diff_parser.add_argument("baseline", help="baseline cost JSON file")
+    diff_parser.add_argument("current", help="current cost JSON file")
+    diff_parser.add_argument("--prefixes", nargs=2, metavar=("BASELINE", "CURRENT"), help="compare the operations of two suites, e.g. ps ps_g1")
+
+    args = parser.parse_args(argv)
+    if args.command == "costs":
+        document = costs(args.suite, args.iterations, args.warmup, args.seed, args.filter, args.measure)
+        print(harness.format_costs(document["costs"]))
+        if args.json:
+            harness.save(document, args.json)
+        return 0
+    if args.command == "cost-diff":
+        rows = harness.diff_costs(harness.load(args.baseline), harness.load(args.current), args.prefixes)
+        print(f"{'operation':<34}{'primitive':<16}{'baseline':>10}{'current':>10}")
+        for name, primitive, before, after in rows:
+            print(f"{name:<34}{primitive:<16}{before:>10}{after:>10}")
+        more = [row for row in rows if row[3] > row[2]]
+        if more:
+            print(f"{len(more)} count(s) went up")
+            return 1
+        return 0
+    if args.command == "run":
+        document = run(args.suite, args.iterations, args.warmup, args.seed, args.filter)
+        print(harness.format_table(document["results"]))
+        if args.json:
+            harness.save(document, args.json)
+        return 0
+
+    rows = harness.compare(harness.load(args.baseline), harness.load(args.current), args.threshold, args.metric, args.prefixes)
+    printComparison(rows, args.threshold)
+    regressions = [row[0] for row in rows if row[4] == "REGRESSION"]
+    if regressions:
+        print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,269 @@
+""" Statistical benchmark harness shared by the benchmark suites """
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SUITE_PATHS = {
+    "ps": os.path.join(ROOT, "AAKA_Plus"),
+    "bb": os.path.join(ROOT, "AAKA_Plus"),
+    "ps_g1": os.path.join(ROOT, "AAKA_Plus"),
+    "5g": os.path.join(ROOT, "5G_AKA"),
+}
+
+
+def use_suite_path(suite):
+    """
+    Make the modules of a suite importable.
+
+    The AAKA_Plus and 5G_AKA directories both ship a module called crypto,
+    so a process only ever loads one of them.
+
+    Parameters:
+        suite (str): Suite name
+    """
+    path = SUITE_PATHS[suite]
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+class Case:
+    def __init__(self, name, func, *args):
+        """
+        Initialize the Case class.
+
+        Parameters:
+            name (str): Name of the benchmarked operation
+            func (function): The operation
+            args: Pre-built arguments passed to every call
+        """
+        self.name = name
+        self.func = func
+        self.args = args
+
+    def __call__(self):
+        return self.func(*self.args)
+
+
+def summarize(samples_ns):
+    """
+    Summarize timing samples.
+
+    Parameters:
+        samples_ns (list): Durations in nanoseconds
+
+    Returns:
+        dict: Iterations, median, p95, mean, stddev, min and max in nanoseconds
+    """
+    ordered = sorted(samples_ns)
+    return {
+        "iterations": len(ordered),
+        "median_ns": statistics.median(ordered),
+        "p95_ns": ordered[min(len(ordered) - 1, math.ceil(0.95 * len(ordered)) - 1)],
+        "mean_ns": statistics.fmean(ordered),
+        "stddev_ns": statistics.pstdev(ordered),
+        "min_ns": ordered[0],
+        "max_ns": ordered[-1],
+    }
+
+
+def measure(case, iterations, warmup):
+    """
+    Time one case call by call after a warmup.
+
+    Parameters:
+        case (Case): The benchmarked operation
+        iterations (int): Number of timed calls
+        warmup (int): Number of untimed calls before measuring
+
+    Returns:
+        dict: Summary statistics of the timed calls
+    """
+    for _ in range(warmup):
+        case()
+    samples = []
+    clock = time.perf_counter_ns
+    for _ in range(iterations):
+        start = clock()
+        case()
+        samples.append(clock() - start)
+    return summarize(samples)
+
+
+def run_cases(cases, iterations, warmup, pattern=None, progress=None):
+    """
+    Run a list of cases.
+
+    Parameters:
+        cases (list): Cases to run
+        iterations (int): Number of timed calls per case
+        warmup (int): Number of untimed calls per case
+        pattern (str): Only run cases whose name contains pattern
+        progress (function): Called with each case name and its result
+
+    Returns:
+        dict: Results by case name
+    """
+    results = {}
+    for case in cases:
+        if pattern and pattern not in case.name:
+            continue
+        results[case.name] = measure(case, iterations, warmup)
+        if progress is not None:
+            progress(case.name, results[case.name])
+    return results
+
+
+def seeded_rng(seed):
+    """
+    Random generator for building fixtures, deterministic when a seed is given.
+
+    Parameters:
+        seed (int): Seed, None for a non-deterministic generator
+
+    Returns:
+        Random: Python random generator
+    """
+    return random.Random(seed) if seed is not None else random.SystemRandom()
+
+
+def metadata(seed, iterations, warmup):
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "seed": seed,
+        "iterations": iterations,
+        "warmup": warmup,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def format_table(results):
+    lines = [f"{'operation':<34}{'median':>12}{'p95':>12}{'stddev':>12}{'n':>7}  (ms)"]
+    for name, r in results.items():
+        lines.append(f"{name:<34}{r['median_ns'] / 1e6:>12.4f}{r['p95_ns'] / 1e6:>12.4f}{r['stddev_ns'] / 1e6:>12.4f}{r['iterations']:>7}")
+    return "\n".join(lines)
+
+
+def load(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def save(document, path):
+    with open(path, 'w') as file:
+        json.dump(document, file, indent=2, sort_keys=True)
+
+
+def compare(baseline, current, threshold=0.10, metric="median_ns", prefixes=None):
+    """
+    Compare two result documents.
+
+    Parameters:
+        baseline (dict): Stored baseline document
+        current (dict): Newly measured document
+        threshold (float): Relative change considered significant
+        metric (str): Statistic to compare
+        prefixes (tuple): Suite prefixes (baseline, current) to match operations across suites, e.g. ("ps", "ps_g1")
+
+    Returns:
+        list: (name, baseline, current, ratio, status) for every common operation
+    """
+    rows = []
+    old, new = baseline["results"], current["results"]
+    if prefixes:
+        strip = lambda results, prefix: {name[len(prefix) + 1:]: stats for name, stats in results.items() if name.startswith(prefix + ".")}
+        old, new = strip(old, prefixes[0]), strip(new, prefixes[1])
+    for name in sorted(set(old) & set(new)):
+        before, after = old[name][metric], new[name][metric]
+        ratio = after / before if before else float("inf")
+        if ratio > 1 + threshold:
+            status = "REGRESSION"
+        elif ratio < 1 - threshold:
+            status = "improved"
+        else:
+            status = "ok"
+        rows.append((name, before, after, ratio, status))
+    return rows
+
+
+def count_cases(cases, counter, pattern=None):
+    """
+    Count the primitives done by one call of every case.
+
+    Parameters:
+        cases (list): Cases to count
+        counter (module): Counter with enable(), disable(), reset() and snapshot()
+        pattern (str): Only count cases whose name contains pattern
+
+    Returns:
+        dict: Count of every primitive by case name
+    """
+    results = {}
+    counter.enable()
+    try:
+        for case in cases:
+            if pattern and pattern not in case.name:
+                continue
+            counter.reset()
+            case()
+            results[case.name] = counter.snapshot()
+    finally:
+        counter.disable()
+    return results
+
+
+def predict(counts, units):
+    """
+    Predict the time of an operation from its primitive counts.
+
+    Parameters:
+        counts (dict): Count of every primitive done by the operation
+        units (dict): Measured time of every primitive in nanoseconds
+
+    Returns:
+        float: Predicted time in nanoseconds, primitives without a unit cost count for nothing
+    """
+    return sum(n * units.get(name, 0.0) for name, n in counts.items())
+
+
+def format_costs(costs):
+    lines = [f"{'operation':<34}{'predicted':>12}{'measured':>12}{'ops/s':>10}  counts (ms)"]
+    for name, c in costs.items():
+        measured = f"{c['measured_ns'] / 1e6:>12.4f}" if "measured_ns" in c else f"{'-':>12}"
+        ops = f"{1e9 / c['predicted_ns']:>10.0f}" if c["predicted_ns"] else f"{'-':>10}"
+        counts = " ".join(f"{primitive}={n}" for primitive, n in c["counts"].items())
+        lines.append(f"{name:<34}{c['predicted_ns'] / 1e6:>12.4f}{measured}{ops}  {counts}")
+    return "\n".join(lines)
+
+
+def diff_costs(baseline, current, prefixes=None):
+    """
+    Compare the primitive counts of two cost documents.
+
+    Parameters:
+        baseline (dict): Stored cost document
+        current (dict): Newly counted cost document
+        prefixes (tuple): Suite prefixes (baseline, current) to match operations across suites, e.g. ("ps", "ps_g1")
+
+    Returns:
+        list: (name, primitive, baseline count, current count) for every count that changed
+    """
+    rows = []
+    old, new = baseline["costs"], current["costs"]
+    if prefixes:
+        strip = lambda costs, prefix: {name[len(prefix) + 1:]: c for name, c in costs.items() if name.startswith(prefix + ".")}
+        old, new = strip(old, prefixes[0]), strip(new, prefixes[1])
+    for name in sorted(set(old) & set(new)):
+        before, after = old[name]["counts"], new[name]["counts"]
+        for primitive in sorted(set(before) | set(after)):
+            if before.get(primitive, 0) != after.get(primitive, 0):
+                rows.append((name, primitive, before.get(primitive, 0), after.get(primitive, 0)))
+    return rows
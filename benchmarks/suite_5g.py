@@ -0,0 +1,83 @@
+""" Benchmark suite of the 5G AKA protocol """
+import types
+from coincurve import PrivateKey
+from ecies import decrypt, encrypt
+import crypto
+import instrumentation
+from harness import Case, measure, seeded_rng
+from homeNetwork import HomeNetwork
+from subscriber import Subscriber
+
+# Same interface as the AAKA_Plus op_counter module
+counter = types.SimpleNamespace(
+    enable=instrumentation.enable_counting,
+    disable=instrumentation.disable_counting,
+    reset=instrumentation.reset_counts,
+    snapshot=instrumentation.counts,
+)
+
+
+def cases(seed=None):
+    """
+    Build pre-computed fixtures and one case per 5G AKA operation.
+
+    Parameters:
+        seed (int): Seed for the fixtures, None for fresh random fixtures
+
+    Returns:
+        list: Cases
+    """
+    rng = seeded_rng(seed)
+    sname = "sname_100"
+    supi = "supi"
+    k = crypto.getKey()
+    secp_k = PrivateKey(rng.randbytes(32))
+    pk_hn = secp_k.public_key.format(True)
+    sqn_hn = 100
+
+    hn = HomeNetwork(k, supi, sqn_hn, None, pk_hn, secp_k.secret)
+    ue = Subscriber(k, supi, sqn_hn - 1, sname, None, pk_hn)
+
+    r = rng.randbytes(256)
+    suci = encrypt(pk_hn, supi.encode('utf-8'))
+    autn = (crypto.getXOR(sqn_hn.to_bytes(256, byteorder='little'), crypto.fun5(k, r)), crypto.fun1(k, sqn_hn, r))
+    res_star = crypto.challenge(k, r, sname)
+    auts = ue.getAUTS(k, ue.sqn_ue, r)
+
+    return [
+        Case("ue.getSUCI", ue.getSUCI),
+        Case("hn.getSUPI", hn.getSUPI, suci),
+        Case("hn.authentication_challenge", hn.challengeSubscriber, supi, sname),
+        Case("ue.verify", ue.verify, k, r, autn),
+        Case("ue.getRES_star", ue.getRES_star, k, r, sname),
+        Case("ue.getAUTS", ue.getAUTS, k, ue.sqn_ue, r),
+        Case("sn.getHXRES_star", crypto.getsha256, r, res_star),
+        Case("hn.verify", hn.verify, k, r, auts),
+    ]
+
+
+def unit_costs(iterations, warmup):
+    """
+    Time every primitive counted by the instrumentation module.
+
+    Parameters:
+        iterations (int): Number of timed calls per primitive
+        warmup (int): Number of untimed calls per primitive
+
+    Returns:
+        dict: Median time of every primitive in nanoseconds
+    """
+    k = crypto.getKey()
+    r = crypto.getRandom(256)
+    secp_k = PrivateKey()
+    pk_hn = secp_k.public_key.format(True)
+    suci = encrypt(pk_hn, b"supi")
+    cases = [
+        Case("sha3_256", crypto.fun1, k, 100, r),
+        Case("shake256", crypto.fun5, k, r),
+        Case("sha256", crypto.getsha256, r, r),
+        Case("kdf", crypto.deriveKey, k, "sname_100"),
+        Case("ecies_encrypt", encrypt, pk_hn, b"supi"),
+        Case("ecies_decrypt", decrypt, secp_k.secret, suci),
+    ]
+    return {case.name: measure(case, iterations, warmup)["median_ns"] for case in cases}
@@ -0,0 +1,11 @@
+""" Benchmark suite of the AAKA+BB scheme """
+from ecies.utils import generate_key
+import crypto
+from aaka_bb import AAKA_BB
+from suite_ps import counter, scheme_cases, unit_costs
+
+
+def cases(seed=None):
+    secp_k = generate_key()
+    k = crypto.getKey()
+    return scheme_cases("bb", lambda params: AAKA_BB(k, "supi", 100, secp_k.public_key.format(True), secp_k.secret, params), seed)
@@ -0,0 +1,151 @@
+""" Benchmark suite of the AAKA+PS scheme """
+from petlib.bn import Bn
+from petlib.bindings import _C
+from harness import Case, measure, seeded_rng
+import crypto
+import op_counter as counter
+from utils import setup, ec_msm, multi_pairing, challenge, FixedBaseTable
+from aaka_ps import AAKA_PS
+
+
+class SeededOrder(Bn):
+    def __init__(self, o, rng):
+        """
+        Group order whose random() draws from a Python generator.
+
+        Only used to build fixtures, the timed operations keep the
+        unseeded parameters.
+
+        Parameters:
+            o (Bn): Group order
+            rng (Random): Python random generator
+        """
+        Bn.__init__(self)
+        _C.BN_copy(self.bn, o.bn)
+        self.rng = rng
+        self.size = len(o.binary()) + 8
+
+    def random(self):
+        return Bn.from_binary(self.rng.randbytes(self.size)) % self
+
+
+def seeded_params(params, seed):
+    """
+    Parameters whose group order draws deterministic scalars when seeded.
+
+    Parameters:
+        params (tuple): System parameters
+        seed (int): Seed, None to keep the parameters
+
+    Returns:
+        tuple: System parameters
+    """
+    if seed is None:
+        return params
+    (G, o, g1, g2, e) = params
+    return (G, SeededOrder(o, seeded_rng(seed)), g1, g2, e)
+
+
+def scheme_cases(prefix, make_scheme, seed):
+    """
+    Build pre-computed fixtures and one case per operation of an AAKA+ scheme.
+
+    Parameters:
+        prefix (str): Prefix of the case names
+        make_scheme (function): Builds a scheme instance from the parameters
+        seed (int): Seed for the fixtures
+
+    Returns:
+        list: Cases
+    """
+    params = setup(3)
+    scheme = make_scheme(params)
+    fixture = make_scheme(seeded_params(params, seed))
+    (G, o, g1, g2, e) = fixture.params
+
+    (isk, ipk) = fixture.IKeyGen(3)
+    (tsk, tpk) = fixture.LEAKeyGen()
+    (y, Y) = fixture.AsymKeyGen()
+    m, pm = o.random(), o.random()
+    (cred, pi_cred) = fixture.CredIssue(isk, ipk, m, pm)
+    (a, A) = fixture.KeyExchange_UE()
+    (B, tau) = fixture.KeyExchange_XN(A, Y, y)
+    keyEx = (A, B, tau)
+    (Acred, pi_show, H) = fixture.CredShow(ipk, tpk, m, pm, cred, keyEx)
+    RL = [fixture.Trace(tsk, Acred)]
+
+    return [
+        Case(f"{prefix}.setup", setup, 3),
+        Case(f"{prefix}.IKeyGen", scheme.IKeyGen, 3),
+        Case(f"{prefix}.LEAKeyGen", scheme.LEAKeyGen),
+        Case(f"{prefix}.AsymKeyGen", scheme.AsymKeyGen),
+        Case(f"{prefix}.CredIssue", scheme.CredIssue, isk, ipk, m, pm),
+        Case(f"{prefix}.CredVer", scheme.CredVer, ipk, m, pm, cred, pi_cred),
+        Case(f"{prefix}.KeyExchange_UE", scheme.KeyExchange_UE),
+        Case(f"{prefix}.KeyExchange_XN", scheme.KeyExchange_XN, A, Y, y),
+        Case(f"{prefix}.KeyExchange_UE_Ver", scheme.KeyExchange_UE_Ver, Y, A, B, a, tau),
+        Case(f"{prefix}.CredShow", scheme.CredShow, ipk, tpk, m, pm, cred, keyEx),
+        Case(f"{prefix}.AcredVer", scheme.AcredVer, ipk, tpk, m, Acred, pi_show, keyEx),
+        Case(f"{prefix}.Trace", scheme.Trace, tsk, Acred),
+        Case(f"{prefix}.judge", scheme.judge, Acred, RL),
+    ]
+
+
+def cases(seed=None):
+    return scheme_cases("ps", lambda params: AAKA_PS("supi", params), seed)
+
+
+def unit_costs(iterations, warmup):
+    """
+    Time every primitive counted by op_counter.
+
+    A pairing is one Miller loop and one final exponentiation, and a
+    multi-pairing of two is two loops sharing one exponentiation, so both
+    are derived from those two timings. A multi-scalar multiplication
+    costs a fixed part per call plus a part per term, derived from
+    multiplications of one and of eight terms.
+
+    Parameters:
+        iterations (int): Number of timed calls per primitive
+        warmup (int): Number of untimed calls per primitive
+
+    Returns:
+        dict: Median time of every primitive in nanoseconds
+    """
+    (G, o, g1, g2, e) = setup(3)
+    (x, y) = (o.random(), o.random())
+    (P, Q) = (x * g1, y * g2)
+    T = e(P, Q)
+    points1 = [o.random() * g1 for _ in range(8)]
+    points2 = [o.random() * g2 for _ in range(8)]
+    scalars = [o.random() for _ in range(8)]
+    r = crypto.getRandom(32)
+    (table1, table2) = (FixedBaseTable(G, P), FixedBaseTable(G, Q))
+    cases = {
+        "g1_mul": Case("g1_mul", P.mul, x),
+        "g1_add": Case("g1_add", P.add, g1),
+        "g2_mul": Case("g2_mul", Q.mul, y),
+        "g2_add": Case("g2_add", Q.add, g2),
+        "g1_table_mul": Case("g1_table_mul", table1.mul, x),
+        "g2_table_mul": Case("g2_table_mul", table2.mul, y),
+        "gt_mul": Case("gt_mul", T.mul, T),
+        "gt_exp": Case("gt_exp", T.exp, x),
+        "pair": Case("pair", G.pair, P, Q),
+        "pair2": Case("pair2", multi_pairing, G, [(P, Q), (g1, g2)]),
+        "g1_msm1": Case("g1_msm1", ec_msm, G, points1[:1], scalars[:1]),
+        "g1_msm8": Case("g1_msm8", ec_msm, G, points1, scalars),
+        "g2_msm1": Case("g2_msm1", ec_msm, G, points2[:1], scalars[:1]),
+        "g2_msm8": Case("g2_msm8", ec_msm, G, points2, scalars),
+        "hash_g1": Case("hash_g1", G.hashG1, r),
+        "challenge_hash": Case("challenge_hash", challenge, [g1, g2, P, Q, x]),
+        "sha256": Case("sha256", crypto.getsha256, r, r),
+    }
+    t = {name: measure(case, iterations, warmup)["median_ns"] for name, case in cases.items()}
+    units = {name: t[name] for name in ["g1_mul", "g1_add", "g1_table_mul", "g2_mul", "g2_add", "g2_table_mul", "gt_mul", "gt_exp", "hash_g1", "challenge_hash", "sha256"]}
+    units["miller_loop"] = max(t["pair2"] - t["pair"], 0.0)
+    units["final_exp"] = max(t["pair"] - units["miller_loop"], 0.0)
+    for group in ("g1", "g2"):
+        per_term = max((t[f"{group}_msm8"] - t[f"{group}_msm1"]) / 7, 0.0)
+        units[f"{group}_msm_terms"] = per_term
+        units[f"{group}_msm"] = max(t[f"{group}_msm1"] - per_term, 0.0)
+    return units
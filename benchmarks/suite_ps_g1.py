@@ -0,0 +1,7 @@
+""" Benchmark suite of the AAKA+PS scheme with the tracing ciphertext in G1 """
+from aaka_ps_g1 import AAKA_PS_G1
+from suite_ps import counter, scheme_cases, unit_costs
+
+
+def cases(seed=None):
+    return scheme_cases("ps_g1", lambda params: AAKA_PS_G1("supi", params), seed)
@@ -0,0 +1,307 @@
+""" Parameter sweeps of the AAKA+ schemes over revocation list size, batch size and attribute count """
+import argparse
+import csv
+import os
+import sys
+import time
+import harness
+
+harness.use_suite_path("ps")
+from bplib.bp import G2Elem
+from codec import encode, decode, read_frames, write_frame
+from utils import setup
+from aaka_net import make_scheme
+from suite_ps import seeded_params
+
+SCHEMES = ["ps", "bb", "ps_g1"]
+SWEEPS = ["rl", "batch", "attributes"]
+# AAKA+BB credentials sign exactly three attributes
+FIXED_ATTRIBUTES = {"bb": 3}
+DATASET_VERSION = 1
+FIELDS = ["sweep", "scheme", "operation", "value", "iterations", "median_ns", "p95_ns", "mean_ns", "stddev_ns", "per_item_ns"]
+
+
+def writeRecords(path, records, append=False):
+    """
+    Write values one length-prefixed codec record after the other.
+
+    Parameters:
+        path (str): File to write
+        records (iterable): Values to encode
+        append (bool): Add to the end of the file instead of replacing it
+    """
+    with open(path, 'ab' if append else 'wb') as file:
+        for record in records:
+            write_frame(file, encode(record))
+
+
+def readRecords(path, G, n=None):
+    """
+    Read the records written by writeRecords().
+
+    Parameters:
+        path (str): File to read
+        G (BpGroup): Pairing group of the encoded points
+        n (int): Largest number of records to read, None for all
+
+    Returns:
+        list: Decoded values
+    """
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path, 'rb') as file:
+        for data in read_frames(file):
+            if n is not None and len(records) >= n:
+                break
+            records.append(decode(G, data))
+    return records
+
+
+class Dataset:
+    def __init__(self, scheme_name, directory, seed=None):
+        """
+        Initialize the Dataset class.
+
+        Keys, issued credentials, shows and a revocation list of a scheme,
+        stored in directory and grown on demand, so every sweep and every
+        later run measures the same inputs.
+
+        Parameters:
+            scheme_name (str): "ps", "bb" or "ps_g1"
+            directory (str): Directory of the dataset files
+            seed (int): Seed for building the dataset, None for random
+        """
+        self.params = setup(3)
+        self.scheme = make_scheme(scheme_name, self.params)
+        self.fixture = make_scheme(scheme_name, seeded_params(self.params, seed))
+        suffix = "" if seed is None else f"-seed{seed}"
+        self.path = os.path.join(directory, f"{scheme_name}{suffix}.bin")
+        self.rl_path = os.path.join(directory, f"{scheme_name}{suffix}_rl.bin")
+        os.makedirs(directory, exist_ok=True)
+        (G, o, g1, g2, e) = self.params
+        stored = readRecords(self.path, G, 1)
+        if stored and stored[0][0] == DATASET_VERSION:
+            (_, self.isk, self.ipk, self.tsk, self.tpk, self.y, self.Y, self.credentials, self.shows, self.rl_start, self.rl_step) = stored[0]
+            return
+        (self.isk, self.ipk) = self.fixture.IKeyGen(3)
+        (self.tsk, self.tpk) = self.fixture.LEAKeyGen()
+        (self.y, self.Y) = self.fixture.AsymKeyGen()
+        (self.credentials, self.shows) = ([], [])
+        # Revoked entries are start + i * step, in the group of the traced messages
+        (G, o, g1, g2, e) = self.fixture.params
+        g = g2 if isinstance(self.fixture.Trace(self.tsk, self.show(0)[1]), G2Elem) else g1
+        (self.rl_start, self.rl_step) = (o.random() * g, o.random() * g)
+        self.save()
+        if os.path.exists(self.rl_path):
+            os.remove(self.rl_path)
+
+    def save(self):
+        writeRecords(self.path, [(DATASET_VERSION, self.isk, self.ipk, self.tsk, self.tpk, self.y, self.Y, self.credentials, self.shows, self.rl_start, self.rl_step)])
+
+    def show(self, i):
+        """
+        Show of the i-th subscriber, issuing its credential first if needed.
+
+        Parameters:
+            i (int): Subscriber index
+
+        Returns:
+            tuple: (m, Acred, pi_3, keyEx)
+        """
+        (G, o, g1, g2, e) = self.fixture.params
+        while len(self.credentials) <= i:
+            (m, pm) = (o.random(), o.random())
+            (cred, pi_cred) = self.fixture.CredIssue(self.isk, self.ipk, m, pm)
+            self.credentials.append((m, pm, cred, pi_cred))
+        while len(self.shows) <= i:
+            (m, pm, cred, pi_cred) = self.credentials[len(self.shows)]
+            (a, A) = self.fixture.KeyExchange_UE()
+            (B, tau) = self.fixture.KeyExchange_XN(A, self.Y, self.y)
+            keyEx = (A, B, tau)
+            (Acred, pi_show, H) = self.fixture.CredShow(self.ipk, self.tpk, m, pm, cred, keyEx)
+            self.shows.append((m, Acred, pi_show, keyEx))
+        return self.shows[i]
+
+    def ensure_shows(self, n):
+        """
+        Make sure the dataset holds at least n shows, saving it if it grew.
+
+        Parameters:
+            n (int): Number of shows
+
+        Returns:
+            list: The first n shows
+        """
+        if len(self.shows) < n:
+            self.show(n - 1)
+            self.save()
+        return self.shows[:n]
+
+    def revocation_list(self, n):
+        """
+        Read the first n revoked entries, appending the missing ones to the file.
+
+        None of the entries traces a show of the dataset, so judge scans the
+        whole list.
+
+        Parameters:
+            n (int): Size of the revocation list
+
+        Returns:
+            list: Revoked entries
+        """
+        (G, o, g1, g2, e) = self.params
+        RL = readRecords(self.rl_path, G, n)
+        if len(RL) < n:
+            entry = self.rl_start + len(RL) * self.rl_step
+            missing = []
+            for _ in range(n - len(RL)):
+                missing.append(entry)
+                entry = entry + self.rl_step
+            writeRecords(self.rl_path, missing, append=True)
+            RL += missing
+        return RL
+
+
+def timePoint(func, args, iterations, warmup, budget):
+    """
+    Time one sweep point, with fewer iterations when a call is slow.
+
+    Parameters:
+        func (function): The operation
+        args (tuple): Arguments of the operation
+        iterations (int): Largest number of timed calls
+        warmup (int): Largest number of untimed calls
+        budget (float): Time in seconds the timed calls should roughly take
+
+    Returns:
+        dict: Summary from harness.measure()
+    """
+    case = harness.Case(func.__name__, func, *args)
+    start = time.perf_counter()
+    case()
+    elapsed = time.perf_counter() - start
+    n = max(1, min(iterations, int(budget / elapsed) if elapsed else iterations))
+    return harness.measure(case, n, max(0, min(warmup, n) - 1))
+
+
+def row(sweep, scheme_name, operation, value, result, items):
+    r = {"sweep": sweep, "scheme": scheme_name, "operation": operation, "value": value}
+    r.update({field: result[field] for field in FIELDS if field in result})
+    r["per_item_ns"] = result["median_ns"] / items
+    return r
+
+
+def sweepRL(dataset, scheme_name, sizes, timing, progress):
+    rows = []
+    m, Acred, pi_show, keyEx = dataset.show(0)
+    for size in sizes:
+        RL = dataset.revocation_list(size)
+        assert not dataset.scheme.judge(Acred, RL)
+        rows.append(progress(row("rl", scheme_name, "judge", size, timePoint(dataset.scheme.judge, (Acred, RL), *timing), size)))
+        del RL
+    return rows
+
+
+def sweepBatch(dataset, scheme_name, sizes, timing, progress):
+    rows = []
+    shows = dataset.ensure_shows(max(sizes))
+    for size in sizes:
+        items = shows[:size]
+        assert all(dataset.scheme.batch_AcredVer(dataset.ipk, dataset.tpk, items))
+        result = timePoint(dataset.scheme.batch_AcredVer, (dataset.ipk, dataset.tpk, items), *timing)
+        rows.append(progress(row("batch", scheme_name, "batch_AcredVer", size, result, size)))
+    return rows
+
+
+def sweepAttributes(scheme_name, counts, timing, progress):
+    rows = []
+    for q in counts:
+        if FIXED_ATTRIBUTES.get(scheme_name, q) != q:
+            print(f"  {scheme_name} supports {FIXED_ATTRIBUTES[scheme_name]} attributes only, skipping {q}", file=sys.stderr)
+            continue
+        params = setup(q)
+        (G, o, g1, g2, e) = params
+        scheme = make_scheme(scheme_name, params)
+        (isk, ipk) = scheme.IKeyGen(q)
+        (m, pm) = (o.random(), o.random())
+        (cred, pi_cred) = scheme.CredIssue(isk, ipk, m, pm)
+        assert scheme.CredVer(ipk, m, pm, cred, pi_cred)
+        for (operation, args) in [("IKeyGen", (q,)), ("CredIssue", (isk, ipk, m, pm)), ("CredVer", (ipk, m, pm, cred, pi_cred))]:
+            result = timePoint(getattr(scheme, operation), args, *timing)
+            rows.append(progress(row("attributes", scheme_name, operation, q, result, 1)))
+    return rows
+
+
+def run(schemes, sweeps, rl_sizes, batch_sizes, attributes, directory, iterations, warmup, budget, seed=None):
+    """
+    Run the sweeps of every scheme.
+
+    Returns:
+        dict: Document with the run metadata and one row per sweep point
+    """
+    timing = (iterations, warmup, budget)
+
+    def progress(r):
+        print(f"  {r['sweep']} {r['operation']} {r['value']}: {r['median_ns'] / 1e6:.4f} ms ({r['per_item_ns'] / 1e6:.4f} ms per item)", file=sys.stderr)
+        return r
+
+    rows = []
+    for scheme_name in schemes:
+        print(f"[{scheme_name}]", file=sys.stderr)
+        if "rl" in sweeps or "batch" in sweeps:
+            dataset = Dataset(scheme_name, directory, seed)
+        if "rl" in sweeps:
+            rows += sweepRL(dataset, scheme_name, rl_sizes, timing, progress)
+        if "batch" in sweeps:
+            rows += sweepBatch(dataset, scheme_name, batch_sizes, timing, progress)
+        if "attributes" in sweeps:
+            rows += sweepAttributes(scheme_name, attributes, timing, progress)
+    document = harness.metadata(seed, iterations, warmup)
+    document.update(schemes=schemes, sweeps=sweeps, budget=budget)
+    return {"meta": document, "rows": rows}
+
+
+def saveCSV(rows, path):
+    with open(path, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def formatRows(rows):
+    lines = [f"{'sweep':<12}{'scheme':<8}{'operation':<16}{'value':>9}{'median':>12}{'per item':>12}{'n':>5}  (ms)"]
+    for r in rows:
+        lines.append(f"{r['sweep']:<12}{r['scheme']:<8}{r['operation']:<16}{r['value']:>9}{r['median_ns'] / 1e6:>12.4f}{r['per_item_ns'] / 1e6:>12.4f}{r['iterations']:>5}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="AAKA+ scaling sweeps")
+    parser.add_argument("--scheme", nargs="+", choices=SCHEMES, default=SCHEMES)
+    parser.add_argument("--sweep", nargs="+", choices=SWEEPS, default=SWEEPS)
+    parser.add_argument("--rl-sizes", type=int, nargs="+", default=[1, 10, 100, 1000], help="revocation list sizes, up to 1000000")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32], help="shows per batch verification")
+    parser.add_argument("--attributes", type=int, nargs="+", default=[3, 4, 8, 16], help="issuer key sizes")
+    parser.add_argument("--data", default=os.path.join(harness.ROOT, "benchmarks", "data"), help="directory of the reusable datasets")
+    parser.add_argument("--iterations", type=int, default=20, help="largest number of timed calls per point")
+    parser.add_argument("--warmup", type=int, default=2, help="untimed calls per point")
+    parser.add_argument("--budget", type=float, default=2.0, help="seconds of timed calls per point, fewer iterations are run for slow points")
+    parser.add_argument("--seed", type=int, default=None, help="build deterministic datasets")
+    parser.add_argument("--csv", help="write the rows to this CSV file")
+    parser.add_argument("--json", help="write the rows and the run metadata to this JSON file")
+    args = parser.parse_args(argv)
+
+    document = run(args.scheme, args.sweep, sorted(args.rl_sizes), sorted(args.batch_sizes), sorted(args.attributes),
+                   args.data, args.iterations, args.warmup, args.budget, args.seed)
+    print(formatRows(document["rows"]))
+    if args.csv:
+        saveCSV(document["rows"], args.csv)
+    if args.json:
+        harness.save(document, args.json)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())